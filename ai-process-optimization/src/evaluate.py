@@ -1,54 +1,118 @@
+"""Evaluation report for the persisted search winners.
+
+Every winner scores each data file once: the cleaned rows' temperature, label,
+holdout flag and predicted defect probability are cached in
+results/predictions/<data digest>-<model digest>.parquet, keyed by the SHA-256
+of the data file and of the model artifact. The plots are rendered from those
+tables in parallel worker processes. results/report.json records the inputs
+each plot was drawn from, so a rerun on unchanged data and models only
+redraws what is stale, and usually nothing.
+
+scikit-learn, matplotlib and seaborn are imported where they are used, so an
+up-to-date report does not pay ~2 s to import them.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
 
-from preprocess import get_feature_names, load_data, remove_outliers_iqr
-from train import DATA_PATH, train_and_evaluate
+from preprocess import DATA_PATH, MODELS_DIR, RESULTS_DIR, TARGET, WINNERS_PATH, file_digest, get_feature_names
 
-RESULTS_DIR = Path("results")
+PREDICTIONS_DIR = RESULTS_DIR / "predictions"
+MANIFEST_PATH = RESULTS_DIR / "report.json"
 
 
-def plot_feature_importance(model_bundle, out_path: Path):
-    """Plot feature importance for a fitted model."""
-    pipeline = model_bundle.pipeline
-    preprocessor = pipeline.named_steps["preprocess"]
-    model = pipeline.named_steps["model"]
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
 
-    feature_names = get_feature_names(preprocessor)
 
+def feature_importance(pipeline) -> pd.DataFrame:
+    """Feature importance (or absolute coefficient) per preprocessed feature, largest first."""
+    model = pipeline.named_steps["model"]
     if hasattr(model, "coef_"):
         importances = abs(model.coef_[0])
     elif hasattr(model, "feature_importances_"):
         importances = model.feature_importances_
     else:
         raise ValueError("Model does not expose feature importances.")
+    fi = pd.DataFrame({"feature": get_feature_names(pipeline.named_steps["preprocess"]), "importance": importances})
+    return fi.sort_values(by="importance", ascending=False)
 
-    fi = pd.DataFrame({"feature": feature_names, "importance": importances})
-    fi = fi.sort_values(by="importance", ascending=False)
+
+def _write(frame: pd.DataFrame, path: Path):
+    # Write next to the target and rename, so an interrupted run never leaves a truncated cache entry.
+    tmp = path.with_name(f".{path.name}.tmp")
+    if path.suffix == ".parquet":
+        frame.to_parquet(tmp, index=False)
+    else:
+        frame.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def cached_predictions(data_path: str, winners: dict) -> dict:
+    """{family: (prediction table, importance table)} paths, scoring only the (data, model) pairs not cached.
+
+    The data is loaded, cleaned and split (as `train.prepare_dataset` does)
+    at most once, however many winners need scoring.
+    """
+    data_digest = file_digest(data_path)
+    paths = {}
+    for family, meta in winners.items():
+        model_digest = file_digest(MODELS_DIR / meta["path"])
+        paths[family] = (PREDICTIONS_DIR / f"{data_digest}-{model_digest}.parquet",
+                         PREDICTIONS_DIR / f"importance-{model_digest}.csv")
+    missing = [family for family, files in paths.items() if not all(path.exists() for path in files)]
+    if not missing:
+        return paths
+
+    import joblib
+    from train import prepare_dataset
+
+    PREDICTIONS_DIR.mkdir(parents=True, exist_ok=True)
+    X_train, X_test, y_train, y_test, _ = prepare_dataset(data_path)
+    X = pd.concat([X_train, X_test])
+    rows = pd.DataFrame({
+        "temperature": X["temperature"].to_numpy(),
+        TARGET: pd.concat([y_train, y_test]).to_numpy(),
+        "holdout": [False] * len(X_train) + [True] * len(X_test),
+    })
+    for family in missing:
+        pipeline = joblib.load(MODELS_DIR / winners[family]["path"])
+        predictions_path, importance_path = paths[family]
+        _write(rows.assign(defect_probability=pipeline.predict_proba(X)[:, 1]), predictions_path)
+        _write(feature_importance(pipeline), importance_path)
+    return paths
+
+
+def plot_feature_importance(importance_path: Path, name: str, out_path: Path):
+    """Plot a cached feature importance table."""
+    plt, sns = _pyplot()
+    fi = pd.read_csv(importance_path)
 
     plt.figure(figsize=(8, 5))
     sns.barplot(data=fi, x="importance", y="feature", palette="viridis")
-    plt.title(f"{model_bundle.name} Feature Importance")
+    plt.title(f"{name} Feature Importance")
     plt.tight_layout()
     plt.savefig(out_path, dpi=150)
     plt.close()
-    return fi
 
 
-def plot_temperature_curve(model_bundle, data_path: str, out_path: Path):
+def plot_temperature_curve(predictions_path: Path, out_path: Path):
     """Plot predicted vs actual defect probability across temperature bins."""
-    df = load_data(data_path)
-    df = remove_outliers_iqr(df, ["temperature", "line_speed", "operator_experience", "machine_age"])
-
-    X = df.drop(columns=["defect"])
-    df["pred_defect_prob"] = model_bundle.pipeline.predict_proba(X)[:, 1]
+    plt, sns = _pyplot()
+    df = pd.read_parquet(predictions_path)
     df["temp_bin"] = pd.cut(df["temperature"], bins=12)
 
     grouped = (
         df.groupby("temp_bin")
-        .agg(pred_prob=("pred_defect_prob", "mean"), actual_rate=("defect", "mean"))
+        .agg(pred_prob=("defect_probability", "mean"), actual_rate=(TARGET, "mean"))
         .reset_index()
     )
     grouped["temp_center"] = grouped["temp_bin"].apply(lambda b: (b.left + b.right) / 2)
@@ -64,22 +128,108 @@ def plot_temperature_curve(model_bundle, data_path: str, out_path: Path):
     plt.close()
 
 
-def run_evaluation(data_path: str = DATA_PATH):
+def _holdout(predictions_path: Path) -> pd.DataFrame:
+    return pd.read_parquet(predictions_path, columns=[TARGET, "holdout", "defect_probability"],
+                           filters=[("holdout", "==", True)])
+
+
+def plot_roc(predictions: dict, out_path: Path):
+    """ROC curve on the holdout split for every {model name: prediction table}."""
+    from sklearn.metrics import roc_auc_score, roc_curve
+
+    plt, _ = _pyplot()
+    plt.figure(figsize=(6, 6))
+    for name, path in predictions.items():
+        df = _holdout(path)
+        fpr, tpr, _ = roc_curve(df[TARGET], df["defect_probability"])
+        plt.plot(fpr, tpr, label=f"{name} (AUC {roc_auc_score(df[TARGET], df['defect_probability']):.3f})")
+    plt.plot([0, 1], [0, 1], color="grey", linestyle="--", label="Chance")
+    plt.xlabel("False positive rate")
+    plt.ylabel("True positive rate")
+    plt.title("ROC on the holdout split")
+    plt.legend(loc="lower right")
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=150)
+    plt.close()
+
+
+def plot_calibration(predictions: dict, out_path: Path, bins: int = 10):
+    """Reliability diagram on the holdout split: observed defect rate per predicted-probability quantile bin."""
+    from sklearn.calibration import calibration_curve
+
+    plt, _ = _pyplot()
+    plt.figure(figsize=(6, 6))
+    for name, path in predictions.items():
+        df = _holdout(path)
+        observed, predicted = calibration_curve(df[TARGET], df["defect_probability"], n_bins=bins,
+                                                strategy="quantile")
+        plt.plot(predicted, observed, marker="o", label=name)
+    plt.plot([0, 1], [0, 1], color="grey", linestyle="--", label="Perfectly calibrated")
+    plt.xlabel("Mean predicted defect probability")
+    plt.ylabel("Observed defect rate")
+    plt.title("Calibration on the holdout split")
+    plt.legend(loc="upper left")
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=150)
+    plt.close()
+
+
+def render_plots(jobs: dict, workers: int = None, force: bool = False) -> list:
+    """Render the stale {file name: (plot function, args)} jobs in parallel; return the names rendered.
+
+    A plot is stale when its file is missing or report.json lists different
+    inputs for it than `args`.
+    """
+    manifest = json.loads(MANIFEST_PATH.read_text()) if MANIFEST_PATH.exists() else {}
+    keys = {name: json.dumps([fn.__name__, args], default=str) for name, (fn, args) in jobs.items()}
+    stale = [name for name in jobs
+             if force or manifest.get(name) != keys[name] or not (RESULTS_DIR / name).exists()]
+    if stale:
+        _pyplot()  # import the plotting stack once; forked workers inherit it
+        with ProcessPoolExecutor(min(workers or os.cpu_count() or 1, len(stale))) as pool:
+            futures = {name: pool.submit(jobs[name][0], *jobs[name][1], RESULTS_DIR / name) for name in stale}
+            for name, future in futures.items():
+                future.result()
+                manifest[name] = keys[name]
+        MANIFEST_PATH.write_text(json.dumps(manifest, indent=2))
+    return stale
+
+
+def run_evaluation(data_path: str = DATA_PATH, workers: int = None, force: bool = False) -> list:
+    """Plot and report the persisted search winners, running the search first if there are none.
+
+    Returns the names of the plots that had to be rendered.
+    """
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
-    lr_bundle, rf_bundle = train_and_evaluate(data_path)
+    if not WINNERS_PATH.exists():
+        from search import run_search
+        run_search(data_path)
+    winners = json.loads(WINNERS_PATH.read_text())
     # Random Forest tends to capture non-linear interactions, so use it for importance.
-    fi = plot_feature_importance(rf_bundle, RESULTS_DIR / "feature_importance.png")
-    plot_temperature_curve(rf_bundle, data_path, RESULTS_DIR / "temperature_vs_defect.png")
-
-    print(f"Logistic Regression AUC: {lr_bundle.auc:.3f}")
-    print(lr_bundle.report)
-    print(f"Random Forest AUC: {rf_bundle.auc:.3f}")
-    print(rf_bundle.report)
-    print("\nTop feature importances (Random Forest):")
-    print(fi.head(10))
-    print("\nSaved plots to results/.")
+    explained = "random_forest" if "random_forest" in winners else max(winners, key=lambda f: winners[f]["test_auc"])
+    paths = cached_predictions(data_path, winners)
+    every_model = {winners[family]["name"]: predictions for family, (predictions, _) in paths.items()}
+    rendered = render_plots({
+        "feature_importance.png": (plot_feature_importance, (paths[explained][1], winners[explained]["name"])),
+        "temperature_vs_defect.png": (plot_temperature_curve, (paths[explained][0],)),
+        "roc.png": (plot_roc, (every_model,)),
+        "calibration.png": (plot_calibration, (every_model,)),
+    }, workers, force)
+
+    for meta in winners.values():
+        print(f"{meta['name']} AUC: {meta['test_auc']:.3f}")
+        print(meta["report"])
+    print(f"\nTop feature importances ({winners[explained]['name']}):")
+    print(pd.read_csv(paths[explained][1]).head(10))
+    print(f"\nPlots in {RESULTS_DIR}/: {', '.join(rendered) if rendered else 'all up to date'}.")
+    return rendered
 
 
 if __name__ == "__main__":
-    run_evaluation()
+    parser = argparse.ArgumentParser(description="Plot and report the persisted search winners")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="plot processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="redraw every plot")
+    args = parser.parse_args()
+    run_evaluation(args.data, args.workers, args.force)
@@ -1,65 +1,49 @@
+import sys
 from pathlib import Path
 
 import pandas as pd
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
 
-
-def load_data(path: str) -> pd.DataFrame:
-    """Load raw production data from CSV, resolving relative to project root if needed."""
+# The feature schema, preprocessor, IQR filter, model budgets and out-of-core trainer are shared with the
+# serving side, so training here and in python-ml prepare data identically. This module is the one place
+# that reaches into python-ml: the other scripts import those names from here, never from python-ml.
+SHARED_DIR = Path(__file__).resolve().parents[2] / "python-ml"
+if str(SHARED_DIR) not in sys.path:
+    sys.path.append(str(SHARED_DIR))
+from feature_schema import NUMERIC_FEATURES, TARGET, make_preprocessor  # noqa: E402,F401  (re-exported)
+from feature_schema import feature_names as get_feature_names  # noqa: E402,F401
+from model_budget import MODEL_FAMILIES, Budget, fit_within_budget, format_table  # noqa: E402,F401
+from model_registry import file_sha256  # noqa: E402
+from out_of_core import CHUNK_ROWS, train_out_of_core  # noqa: E402,F401
+from outliers import remove_outliers_iqr  # noqa: E402,F401  (re-exported for train/evaluate)
+
+DATA_PATH = "data/production_data.csv"
+# Outputs of train / search / evaluate, relative to the working directory.
+RESULTS_DIR = Path("results")
+MODELS_DIR = RESULTS_DIR / "models"
+WINNERS_PATH = MODELS_DIR / "winners.json"
+
+
+def resolve_path(path: str) -> Path:
+    """`path` as given if it exists, else relative to the project root."""
     file_path = Path(path)
-    if not file_path.is_file():
+    if not file_path.exists():
         alt_path = Path(__file__).resolve().parent.parent / path
-        if alt_path.is_file():
+        if alt_path.exists():
             file_path = alt_path
-    return pd.read_csv(file_path)
-
-
-def remove_outliers_iqr(df: pd.DataFrame, numeric_cols, whisker_width: float = 1.5) -> pd.DataFrame:
-    """Remove rows with numeric values outside an IQR-based whisker."""
-    cleaned = df.copy()
-    for col in numeric_cols:
-        q1 = cleaned[col].quantile(0.25)
-        q3 = cleaned[col].quantile(0.75)
-        iqr = q3 - q1
-        lower = q1 - whisker_width * iqr
-        upper = q3 + whisker_width * iqr
-        cleaned = cleaned[(cleaned[col] >= lower) & (cleaned[col] <= upper)]
-    return cleaned.reset_index(drop=True)
-
-
-def make_preprocessor():
-    """Build preprocessing pipeline with scaling for numeric and one-hot for categorical."""
-    numeric_features = ["temperature", "line_speed", "operator_experience", "machine_age"]
-    categorical_features = ["shift"]
+    return file_path
 
-    numeric_pipeline = Pipeline(
-        steps=[
-            ("imputer", SimpleImputer(strategy="median")),
-            ("scaler", StandardScaler()),
-        ]
-    )
 
-    categorical_pipeline = Pipeline(
-        steps=[
-            ("imputer", SimpleImputer(strategy="most_frequent")),
-            ("encoder", OneHotEncoder(handle_unknown="ignore")),
-        ]
-    )
+def file_digest(path) -> str:
+    """Short SHA-256 of a data file or model artifact, for keying caches on its content."""
+    return file_sha256(resolve_path(str(path)))[:16]
 
-    return ColumnTransformer(
-        transformers=[
-            ("num", numeric_pipeline, numeric_features),
-            ("cat", categorical_pipeline, categorical_features),
-        ]
-    )
 
+def load_data(path: str, columns=None) -> pd.DataFrame:
+    """Load raw production data from CSV or Parquet, resolving relative to project root if needed.
 
-def get_feature_names(preprocessor: ColumnTransformer):
-    """Return feature names after preprocessing for downstream importance plots."""
-    cat_features = preprocessor.transformers_[1][2]
-    encoded_cats = list(preprocessor.named_transformers_["cat"]["encoder"].get_feature_names_out(cat_features))
-    num_features = list(preprocessor.transformers_[0][2])
-    return num_features + encoded_cats
+    Only `columns` are read when given; Parquet skips the other columns on disk.
+    """
+    file_path = resolve_path(path)
+    if file_path.suffix == ".parquet":
+        return pd.read_parquet(file_path, columns=columns)
+    return pd.read_csv(file_path, usecols=columns)
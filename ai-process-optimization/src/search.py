@@ -0,0 +1,210 @@
+"""Model search: model families x hyperparameter grids, successive halving over a process pool.
+
+The ColumnTransformer is fitted once per cross-validation fold and the
+resulting design matrices are cached on disk (keyed by the data file's hash),
+so candidates only fit their model. Every rung evaluates the surviving
+candidates on `eta` times more training rows than the last and keeps the best
+1/eta of them. Each (candidate, rung) lands in the leaderboard with mean CV AUC
+and fit/predict timings. The best candidate of each family is refitted on the
+full training split, scored on the holdout split and persisted for
+`evaluate.run_evaluation`.
+"""
+import argparse
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import classification_report, roc_auc_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+from preprocess import DATA_PATH, MODELS_DIR, RESULTS_DIR, WINNERS_PATH, file_digest, make_preprocessor
+from train import ModelBundle, prepare_dataset
+
+CACHE_DIR = RESULTS_DIR / "cache"
+LEADERBOARD_PATH = RESULTS_DIR / "leaderboard.csv"
+
+FAMILIES = {
+    "logistic_regression": (
+        "Logistic Regression",
+        LogisticRegression(max_iter=600, class_weight="balanced", solver="lbfgs"),
+    ),
+    # One core per candidate; the pool provides the parallelism.
+    "random_forest": ("Random Forest", RandomForestClassifier(random_state=42, n_jobs=1)),
+}
+SEARCH_SPACE = {
+    "logistic_regression": {"C": [0.01, 0.1, 1.0, 10.0]},
+    "random_forest": {
+        "n_estimators": [100, 300],
+        "max_depth": [8, 12, None],
+        "min_samples_split": [2, 4, 8],
+    },
+}
+
+
+def candidates(space: dict) -> list[tuple[str, dict]]:
+    """Expand {family: {param: [values]}} into (family, params) pairs."""
+    unknown = set(space) - set(FAMILIES)
+    if unknown:
+        raise ValueError(f"Unknown model families {sorted(unknown)}, expected some of {sorted(FAMILIES)}")
+    return [(family, params) for family, grid in space.items() for params in ParameterGrid(grid)]
+
+
+def make_model(family: str, params: dict):
+    return clone(FAMILIES[family][1]).set_params(**params)
+
+
+def cache_folds(X: pd.DataFrame, y: pd.Series, data_path: str, folds: int = 3, seed: int = 42) -> list[Path]:
+    """Fit the preprocessor per fold and store (X_fit, y_fit, X_val, y_val); reuse earlier runs' cache.
+
+    Fit rows are stored shuffled, so any prefix is a random subsample for the
+    smaller successive-halving rungs.
+    """
+    cache = CACHE_DIR / f"{file_digest(data_path)}-k{folds}-s{seed}"
+    paths = [cache / f"fold{k}.joblib" for k in range(folds)]
+    if all(path.exists() for path in paths):
+        return paths
+    cache.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    for path, (fit_idx, val_idx) in zip(paths, splitter.split(X, y)):
+        fit_idx = rng.permutation(fit_idx)
+        preprocessor = make_preprocessor().fit(X.iloc[fit_idx])
+        joblib.dump(
+            (preprocessor.transform(X.iloc[fit_idx]), y.to_numpy()[fit_idx],
+             preprocessor.transform(X.iloc[val_idx]), y.to_numpy()[val_idx]),
+            path,
+        )
+    return paths
+
+
+# Fold matrices already loaded in this worker process, by path.
+_folds: dict = {}
+
+
+def _fold(path: Path):
+    if path not in _folds:
+        _folds[path] = joblib.load(path, mmap_mode="r")
+    return _folds[path]
+
+
+def _evaluate(family: str, params: dict, fold_paths: list[Path], rows: int) -> dict:
+    """Mean validation AUC of one candidate fitted on the first `rows` fit rows of every fold."""
+    aucs, fit_s, predict_s = [], 0.0, 0.0
+    for path in fold_paths:
+        X_fit, y_fit, X_val, y_val = _fold(path)
+        model = make_model(family, params)
+        start = time.perf_counter()
+        model.fit(X_fit[:rows], y_fit[:rows])
+        fit_s += time.perf_counter() - start
+        start = time.perf_counter()
+        proba = model.predict_proba(X_val)[:, 1]
+        predict_s += time.perf_counter() - start
+        aucs.append(roc_auc_score(y_val, proba))
+    return {
+        "family": family,
+        "params": json.dumps(params, sort_keys=True),
+        "rows": rows,
+        "mean_auc": float(np.mean(aucs)),
+        "std_auc": float(np.std(aucs)),
+        "fit_s": fit_s / len(fold_paths),
+        "predict_s": predict_s / len(fold_paths),
+    }
+
+
+def _refit(family: str, params: dict, X_train, y_train, X_test, y_test) -> tuple[Pipeline, float, str]:
+    pipeline = Pipeline([("preprocess", make_preprocessor()), ("model", make_model(family, params))])
+    pipeline.fit(X_train, y_train)
+    auc = roc_auc_score(y_test, pipeline.predict_proba(X_test)[:, 1])
+    return pipeline, auc, classification_report(y_test, pipeline.predict(X_test), zero_division=0)
+
+
+def successive_halving(pool, pending: list, fold_paths: list[Path], full_rows: int,
+                       min_rows: int = 500, eta: int = 3) -> pd.DataFrame:
+    """Run the rungs and return every evaluation, one row per (candidate, rung)."""
+    rows = min(min_rows, full_rows)
+    results = []
+    while True:
+        futures = [pool.submit(_evaluate, family, params, fold_paths, rows) for family, params in pending]
+        rung = pd.DataFrame([future.result() for future in futures]).assign(rung=len(results))
+        results.append(rung)
+        print(f"rung {len(results) - 1}: {len(pending)} candidates on {rows:,} rows, "
+              f"best AUC {rung['mean_auc'].max():.4f}")
+        if rows >= full_rows or len(pending) == 1:
+            break
+        keep = rung.nlargest(math.ceil(len(pending) / eta), "mean_auc").index
+        pending = [pending[i] for i in keep]
+        rows = min(rows * eta, full_rows)
+    return pd.concat(results, ignore_index=True)
+
+
+def run_search(data_path: str = DATA_PATH, space: dict = None, workers: int = None, folds: int = 3,
+               min_rows: int = 500, eta: int = 3) -> dict:
+    """Search `space` (default SEARCH_SPACE), write the leaderboard and persist one winner per family."""
+    X_train, X_test, y_train, y_test, _ = prepare_dataset(data_path)
+    fold_paths = cache_folds(X_train, y_train, data_path, folds)
+    full_rows = min(len(_fold(path)[1]) for path in fold_paths)
+    pending = candidates(space or SEARCH_SPACE)
+
+    with ProcessPoolExecutor(workers) as pool:
+        board = successive_halving(pool, pending, fold_paths, full_rows, min_rows, eta)
+        # Per family, the candidate that got furthest, then the best score there.
+        best = board.sort_values(["rung", "mean_auc"], ascending=False).drop_duplicates("family")
+        refits = [
+            pool.submit(_refit, row.family, json.loads(row.params), X_train, y_train, X_test, y_test)
+            for row in best.itertuples()
+        ]
+        refits = [future.result() for future in refits]
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    board.sort_values(["rung", "mean_auc"], ascending=False).to_csv(LEADERBOARD_PATH, index=False)
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    winners = {}
+    for row, (pipeline, auc, report) in zip(best.itertuples(), refits):
+        path = MODELS_DIR / f"{row.family}.joblib"
+        joblib.dump(pipeline, path)
+        winners[row.family] = {
+            "name": FAMILIES[row.family][0],
+            "params": json.loads(row.params),
+            "cv_auc": row.mean_auc,
+            "test_auc": auc,
+            "report": report,
+            "path": path.name,
+        }
+    WINNERS_PATH.write_text(json.dumps(winners, indent=2))
+    return winners
+
+
+def load_winners() -> dict[str, ModelBundle]:
+    """The persisted winners as {family: ModelBundle}; empty if no search has run yet."""
+    if not WINNERS_PATH.exists():
+        return {}
+    winners = json.loads(WINNERS_PATH.read_text())
+    return {
+        family: ModelBundle(meta["name"], joblib.load(MODELS_DIR / meta["path"]), meta["test_auc"], meta["report"])
+        for family, meta in winners.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model family / hyperparameter search")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--space", help="JSON file of {family: {param: [values]}}")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--min-rows", type=int, default=500)
+    parser.add_argument("--eta", type=int, default=3)
+    args = parser.parse_args()
+    space = json.loads(Path(args.space).read_text()) if args.space else None
+    winners = run_search(args.data, space, args.workers, args.folds, args.min_rows, args.eta)
+    print(pd.read_csv(LEADERBOARD_PATH).head(10).to_string(index=False))
+    for family, meta in winners.items():
+        print(f"{meta['name']}: CV AUC {meta['cv_auc']:.3f}, holdout AUC {meta['test_auc']:.3f}, {meta['params']}")
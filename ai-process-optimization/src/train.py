@@ -1,16 +1,18 @@
-from dataclasses import dataclass
+import argparse
+import tempfile
+from dataclasses import dataclass, field
 from typing import Tuple
 
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, roc_auc_score
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 
-from preprocess import load_data, make_preprocessor, remove_outliers_iqr
-
-DATA_PATH = "data/production_data.csv"
+from preprocess import (
+    CHUNK_ROWS, DATA_PATH, MODEL_FAMILIES, NUMERIC_FEATURES, TARGET, Budget, fit_within_budget, format_table,
+    load_data, make_preprocessor, remove_outliers_iqr, resolve_path, train_out_of_core,
+)
 
 
 @dataclass
@@ -19,16 +21,17 @@ class ModelBundle:
     pipeline: Pipeline
     auc: float
     report: str
+    # AUC / latency / size of every candidate considered, when trained under a budget.
+    candidates: list = field(default_factory=list)
 
 
 def prepare_dataset(path: str) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series, Pipeline]:
     """Load, clean, encode, and split the dataset."""
     df = load_data(path)
-    numeric_cols = ["temperature", "line_speed", "operator_experience", "machine_age"]
-    df_clean = remove_outliers_iqr(df, numeric_cols)
+    df_clean = remove_outliers_iqr(df, NUMERIC_FEATURES)
 
-    X = df_clean.drop(columns=["defect"])
-    y = df_clean["defect"]
+    X = df_clean.drop(columns=[TARGET])
+    y = df_clean[TARGET]
 
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42, stratify=y
@@ -38,7 +41,13 @@ def prepare_dataset(path: str) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, p
     return X_train, X_test, y_train, y_test, preprocessor
 
 
-def train_and_evaluate(path: str = DATA_PATH) -> Tuple[ModelBundle, ModelBundle]:
+def train_and_evaluate(path: str = DATA_PATH, model: str = "random_forest",
+                       budget: Budget = None) -> Tuple[ModelBundle, ModelBundle]:
+    """Fit the logistic baseline and the best `model` candidate within `budget`.
+
+    For a compact model family the default Random Forest is profiled as well,
+    so its candidates can be compared against it.
+    """
     X_train, X_test, y_train, y_test, preprocessor = prepare_dataset(path)
 
     log_reg = Pipeline(
@@ -55,44 +64,65 @@ def train_and_evaluate(path: str = DATA_PATH) -> Tuple[ModelBundle, ModelBundle]
             ),
         ]
     )
-
-    rf = Pipeline(
-        steps=[
-            ("preprocess", make_preprocessor()),
-            (
-                "model",
-                RandomForestClassifier(
-                    n_estimators=300,
-                    max_depth=12,
-                    min_samples_split=4,
-                    random_state=42,
-                    n_jobs=-1,
-                ),
-            ),
-        ]
-    )
-
     log_reg.fit(X_train, y_train)
-    rf.fit(X_train, y_train)
-
     lr_proba = log_reg.predict_proba(X_test)[:, 1]
-    rf_proba = rf.predict_proba(X_test)[:, 1]
-
     lr_auc = roc_auc_score(y_test, lr_proba)
-    rf_auc = roc_auc_score(y_test, rf_proba)
-
     lr_report = classification_report(y_test, log_reg.predict(X_test))
-    rf_report = classification_report(y_test, rf.predict(X_test))
+
+    pipeline, stats, candidates = fit_within_budget(
+        model, make_preprocessor, X_train, y_train, X_test, y_test, budget
+    )
+    if model != "random_forest":
+        reference = fit_within_budget("random_forest", make_preprocessor, X_train, y_train, X_test, y_test)[2]
+        candidates += [{**row, "candidate": f"{row['candidate']} (reference)"} for row in reference]
+    report = classification_report(y_test, pipeline.predict(X_test))
+    name = model.replace("_", " ").title()
 
     return (
         ModelBundle("Logistic Regression", log_reg, lr_auc, lr_report),
-        ModelBundle("Random Forest", rf, rf_auc, rf_report),
+        ModelBundle(f"{name} ({stats['candidate']})", pipeline, stats["auc"], report, candidates),
+    )
+
+
+def train_streaming(path: str = DATA_PATH, chunk_rows: int = CHUNK_ROWS, key: str = None) -> ModelBundle:
+    """Bagged Random Forest trained out of core, for histories that do not fit in memory.
+
+    The train/test split is written to a temporary directory and removed once the model is evaluated.
+    """
+    with tempfile.TemporaryDirectory(prefix="split-") as split_dir:
+        pipeline, stats, _ = train_out_of_core(resolve_path(path), make_preprocessor, split_dir, chunk_rows, key=key)
+    del stats["split"]  # removed with split_dir
+    report = (
+        f"accuracy {stats['accuracy']:.3f}, defect precision {stats['precision']:.3f}, "
+        f"recall {stats['recall']:.3f} on {stats['test_rows']:,} holdout rows\n"
+        f"{stats['source_rows']:,} rows, {stats['trees']} trees, wall {stats['wall_s']:.1f} s "
+        f"(split {stats['split_s']:.1f}, preprocess {stats['preprocess_s']:.1f}, fit {stats['fit_s']:.1f}, "
+        f"evaluate {stats['evaluate_s']:.1f}), peak RSS {stats['peak_rss_bytes'] / 2**20:,.0f} MiB"
     )
+    return ModelBundle("Streaming Random Forest", pipeline, stats["auc"], report, [stats])
 
 
 if __name__ == "__main__":
-    lr_bundle, rf_bundle = train_and_evaluate()
+    parser = argparse.ArgumentParser(description="Train the baseline and one model family under a budget")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--model", choices=sorted(MODEL_FAMILIES), default="random_forest")
+    parser.add_argument("--p99-ms", type=float, help="single-row predict_proba p99 limit")
+    parser.add_argument("--max-mb", type=float, help="model artifact size limit")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="stream --data in chunks into a bagged forest instead (ignores --model and budget)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--split-key", help="column to hash for the train/test split (default: whole row)")
+    args = parser.parse_args()
+    if args.out_of_core:
+        bundle = train_streaming(args.data, args.chunk_rows, key=args.split_key)
+        print(f"{bundle.name} AUC: {bundle.auc:.3f}")
+        print(bundle.report)
+        raise SystemExit
+    budget = Budget(args.p99_ms, int(args.max_mb * 2**20) if args.max_mb is not None else None)
+
+    lr_bundle, model_bundle = train_and_evaluate(args.data, args.model, budget)
     print(f"{lr_bundle.name} AUC: {lr_bundle.auc:.3f}")
     print(lr_bundle.report)
-    print(f"{rf_bundle.name} AUC: {rf_bundle.auc:.3f}")
-    print(rf_bundle.report)
+    print(f"{model_bundle.name} AUC: {model_bundle.auc:.3f}")
+    print(model_bundle.report)
+    print(format_table(model_bundle.candidates))
@@ -0,0 +1,487 @@
+import argparse
+import multiprocessing
+import queue
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from load import CHUNK_ROWS
+
+
+def _synthetic_orders(rng, start: int, n: int, splits: float = 0.0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """ERP and MES rows for orders ORD-<start> .. ORD-<start + n - 1>, one every 15 minutes.
+
+    A `splits` share of the orders runs as two MES executions, each with about half the quantities.
+    """
+    base = np.datetime64("2024-09-01T00:00:00")
+    ids = np.char.add("ORD-", np.arange(start, start + n).astype(str))
+    planned_start = base + (np.arange(start, start + n) * 3600 // 4).astype("timedelta64[s]")
+    duration = rng.integers(4, 12, n).astype("timedelta64[h]")
+    planned_qty = rng.integers(800, 1300, n)
+    erp = pd.DataFrame({
+        "order_id": ids,
+        "planned_qty": planned_qty,
+        "planned_start": np.datetime_as_string(planned_start, unit="s"),
+        "planned_end": np.datetime_as_string(planned_start + duration, unit="s"),
+    })
+    start_time = planned_start + rng.integers(-2, 3, n).astype("timedelta64[h]")
+    mes = pd.DataFrame({
+        "order_id": ids,
+        "produced_qty": (planned_qty * rng.normal(1.0, 0.05, n)).astype(int),
+        "defect_qty": rng.integers(0, 40, n),
+        "start_time": start_time,
+        "end_time": start_time + duration + rng.integers(-1, 4, n).astype("timedelta64[h]"),
+    })
+    if splits:
+        split = rng.random(n) < splits
+        first, second = mes[split].copy(), mes[split].copy()
+        middle = first["start_time"] + (first["end_time"] - first["start_time"]) // 2
+        first["produced_qty"] //= 2
+        first["defect_qty"] //= 2
+        first["end_time"] = middle
+        second["produced_qty"] -= first["produced_qty"]
+        second["defect_qty"] -= first["defect_qty"]
+        second["start_time"] = middle
+        # Splits and reworks are booked after the slice's other executions.
+        mes = pd.concat([mes[~split], first, second], ignore_index=True)
+    for col in ("start_time", "end_time"):
+        mes[col] = np.datetime_as_string(mes[col].to_numpy("datetime64[s]"), unit="s")
+    return erp, mes
+
+
+def make_synthetic(out_dir: Path, n_orders: int, seed: int = 0, splits: float = 0.0) -> tuple[Path, Path]:
+    """Write mes.csv / erp.csv for `n_orders` orders, in 1M-order slices (see _synthetic_orders for `splits`)."""
+    rng = np.random.default_rng(seed)
+    mes_path, erp_path = out_dir / "mes.csv", out_dir / "erp.csv"
+    for start in range(0, n_orders, 1_000_000):
+        erp, mes = _synthetic_orders(rng, start, min(1_000_000, n_orders - start), splits)
+        mode, header = ("w", True) if start == 0 else ("a", False)
+        erp.to_csv(erp_path, index=False, mode=mode, header=header)
+        mes.to_csv(mes_path, index=False, mode=mode, header=header)
+    return mes_path, erp_path
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss (KiB on Linux) carries over from the parent through fork + exec; VmHWM starts afresh.
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(fn, args, results):
+    start = time.perf_counter()
+    rows = fn(*args)
+    elapsed = time.perf_counter() - start
+    results.put((rows, elapsed, _peak_rss_mib()))
+
+
+def run_isolated(fn, *args) -> tuple[int, float, float]:
+    """Run fn in a fresh process so its peak RSS is not polluted by earlier runs.
+
+    Returns None if the process dies, e.g. when the OOM killer takes it.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(fn, args, results))
+    proc.start()
+    while proc.is_alive() or not results.empty():
+        try:
+            out = results.get(timeout=1)
+        except queue.Empty:
+            continue
+        proc.join()
+        return out
+    return None
+
+
+def _full_integration(mes_path, erp_path) -> int:
+    from integrate import build_unified_table, save_unified
+
+    unified = build_unified_table(mes_path, erp_path)
+    save_unified(unified, Path(mes_path).parent / "unified_full.csv")
+    return len(unified)
+
+
+def _streamed_integration(mes_path, erp_path, chunksize) -> int:
+    from integrate import iter_unified, save_unified_stream
+
+    rows = 0
+
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+
+    save_unified_stream(counted(iter_unified(mes_path, erp_path, chunksize)), Path(mes_path).parent / "unified.csv")
+    return rows
+
+
+def bench_stream(rows: int = 10_000_000, chunksize: int = CHUNK_ROWS, skip_full: bool = False):
+    """Peak RSS and wall time of full-file vs chunked load + validate + integrate + save."""
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        mes_path, erp_path = make_synthetic(Path(tmp), rows)
+        print(f"generated {rows:,} orders in {time.perf_counter() - start:.1f}s")
+        print(f"{'mode':>10} {'rows':>12} {'wall s':>8} {'peak RSS MiB':>13}")
+        modes = [("streamed", _streamed_integration, (mes_path, erp_path, chunksize))]
+        if not skip_full:
+            modes.insert(0, ("full", _full_integration, (mes_path, erp_path)))
+        for name, fn, args in modes:
+            out = run_isolated(fn, *args)
+            if out is None:
+                print(f"{name:>10} {'killed (out of memory?)':>35}")
+                continue
+            n, elapsed, rss = out
+            print(f"{name:>10} {n:>12,} {elapsed:>8.1f} {rss:>13,.0f}")
+
+
+def _streamed_validation(mes_path, erp_path, chunksize) -> tuple[int, dict]:
+    from load import iter_erp, iter_mes
+    from validate import RuleEngine, ViolationLog
+
+    violations = ViolationLog(Path(mes_path).parent / "violations.parquet")
+    erp_engine = RuleEngine("erp", violations=violations)
+    # Only the ERP keys are kept, as the orphan check needs them.
+    erp_ids = pd.Index(pd.concat(erp_engine.check(chunk)["order_id"].astype(str) for chunk in iter_erp(erp_path, chunksize)))
+    mes_engine = RuleEngine("mes", violations=violations, known_ids=erp_ids)
+    for chunk in iter_mes(mes_path, chunksize):
+        mes_engine.check(chunk)
+    violations.close()
+    stats = {f"{engine.source} {rule}": stat for engine in (erp_engine, mes_engine) for rule, stat in engine.stats().items()}
+    return erp_engine.rows + mes_engine.rows, stats
+
+
+def bench_validate(rows: int = 10_000_000, chunksize: int = CHUNK_ROWS):
+    """Peak RSS and per-rule time of streamed rule-engine validation of both exports."""
+    with tempfile.TemporaryDirectory() as tmp:
+        mes_path, erp_path = make_synthetic(Path(tmp), rows)
+        out = run_isolated(_streamed_validation, mes_path, erp_path, chunksize)
+    if out is None:
+        print("validation process was killed (out of memory?)")
+        return
+    (n, stats), elapsed, rss = out
+    print(f"{n:,} rows validated in {elapsed:.1f}s, peak RSS {rss:,.0f} MiB")
+    print(f"{'rule':>28} {'violations':>11} {'seconds':>8}")
+    for rule, stat in stats.items():
+        print(f"{rule:>28} {stat['violations']:>11,} {stat['seconds']:>8.2f}")
+
+
+def _size_mib(path: Path) -> float:
+    files = [path] if path.is_file() else [p for p in path.rglob("*") if p.is_file()]
+    return sum(p.stat().st_size for p in files) / 2**20
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def bench_storage(rows: int = 1_000_000):
+    """Write/read time and size of the unified table, CSV vs partitioned Parquet."""
+    from integrate import iter_unified
+    from kpi import KPI_COLUMNS
+    from storage import get_store
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        unified = pd.concat(iter_unified(*make_synthetic(tmp, rows)), ignore_index=True)
+        week_start = unified["planned_end"].min() + pd.Timedelta(days=7)
+        week = dict(start=week_start, end=week_start + pd.Timedelta(days=7))
+
+        print(f"{rows:,} unified orders")
+        print(f"{'backend':>8} {'size MiB':>9} {'write s':>8} {'read all s':>11} "
+              f"{'KPI cols s':>11} {'KPI cols, 1 week s':>19}")
+        for name, partition in (("unified.csv", None), ("day.parquet", "day"), ("month.parquet", "month")):
+            store = get_store(tmp / name, partition)
+            _, write_s = _timed(store.write, unified)
+            _, read_all = _timed(store.read)
+            _, read_cols = _timed(store.read, KPI_COLUMNS)
+            sliced, read_week = _timed(store.read, KPI_COLUMNS, **week)
+            label = "csv" if partition is None else f"pq/{partition}"
+            print(f"{label:>8} {_size_mib(store.path if partition is None else store.root):>9.1f} "
+                  f"{write_s:>8.2f} {read_all:>11.2f} {read_cols:>11.2f} {read_week:>19.3f}")
+
+
+def bench_incremental(rows: int = 1_000_000, new_orders: int = 500, reworks: int = 500, corrected: int = 50,
+                      splits: float = 0.2):
+    """Full rebuild vs incremental runs: first load, no new input, appended orders, appended executions of
+    existing orders, corrected orders. A `splits` share of the orders runs as two MES executions."""
+    from incremental import current_kpis, update_unified
+    from integrate import build_unified_table, load_unified, save_unified
+    from kpi import compute_kpis
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        mes_path, erp_path = make_synthetic(tmp, rows, splits=splits)
+        store, state = tmp / "unified.parquet", tmp / "state"
+        _, full_s = _timed(lambda: save_unified(build_unified_table(mes_path, erp_path), tmp / "full.parquet"))
+
+        def run(label):
+            summary, seconds = _timed(update_unified, mes_path, erp_path, store, state)
+            print(f"{label:>30} {summary['erp_rows'] + summary['mes_rows']:>10,} "
+                  f"{summary['changed_orders']:>9,} {seconds:>7.3f}")
+
+        print(f"{rows:,} orders, {splits:.0%} split into two executions; full rebuild + save: {full_s:.2f}s")
+        print(f"{'incremental run':>30} {'rows read':>10} {'changed':>9} {'wall s':>7}")
+        run("first (cold state)")
+        run("no new input")
+        erp, mes = _synthetic_orders(np.random.default_rng(1), rows, new_orders, splits)
+        erp.to_csv(erp_path, index=False, mode="a", header=False)
+        mes.to_csv(mes_path, index=False, mode="a", header=False)
+        run(f"{new_orders} appended orders")
+        # Reworks: one more execution for each of the first orders, booked after everything else.
+        mes = _synthetic_orders(np.random.default_rng(2), 0, reworks)[1]
+        mes.to_csv(mes_path, index=False, mode="a", header=False)
+        run(f"{reworks} reworked orders")
+        # A corrected export is a rewrite: everything is re-parsed, only the recent rows are compared.
+        mes = pd.read_csv(mes_path)
+        mes.loc[pd.to_datetime(mes["start_time"]).nlargest(corrected).index, "defect_qty"] += 1
+        mes.to_csv(mes_path, index=False)
+        run(f"{corrected} corrected executions")
+
+        # The maintained table must match a rebuild from the final exports, order for order.
+        rebuilt = build_unified_table(mes_path, erp_path).astype({"order_id": str}).set_index("order_id")
+        kept = load_unified(store).astype({"order_id": str}).set_index("order_id").reindex(rebuilt.index)
+        for col in ("produced_qty", "defect_qty"):
+            assert (kept[col].to_numpy() == rebuilt[col].to_numpy()).all(), col
+        assert current_kpis(state) == compute_kpis(rebuilt), "running KPIs differ from the rebuild"
+
+
+def bench_kpi(rows: int = 1_000_000, delta: int = 500):
+    """Batch compute_kpis vs a running KpiState: update with a small delta, then query."""
+    from integrate import iter_unified
+    from kpi import KPI_COLUMNS, compute_kpis
+    from kpi_engine import KpiState
+
+    with tempfile.TemporaryDirectory() as tmp:
+        unified = pd.concat(iter_unified(*make_synthetic(Path(tmp), rows)), ignore_index=True)[KPI_COLUMNS]
+    head, tail = unified.iloc[:-delta], unified.iloc[-delta:]
+    kpis, batch_s = _timed(compute_kpis, unified)
+    state, build_s = _timed(KpiState().update, head)
+    _, update_s = _timed(state.update, tail)
+    current, query_s = _timed(state.kpis)
+    assert current == kpis
+    week_start = unified["planned_end"].min().normalize() + pd.Timedelta(days=7)
+    _, window_s = _timed(state.kpis, week_start, week_start + pd.Timedelta(days=7))
+    _, daily_s = _timed(state.kpis_by, "day")
+
+    print(f"{rows:,} orders, {len(state.counts):,} state rows")
+    print(f"{'compute_kpis (batch)':>28} {batch_s:>8.3f}s")
+    print(f"{'KpiState build':>28} {build_s:>8.3f}s")
+    print(f"{f'update with {delta} orders':>28} {update_s:>8.3f}s")
+    print(f"{'current KPIs':>28} {query_s:>8.3f}s")
+    print(f"{'one-week window':>28} {window_s:>8.3f}s")
+    print(f"{'per-day table':>28} {daily_s:>8.3f}s")
+
+
+def _best(fn, *args, repeat: int = 5, **kwargs):
+    """Result and fastest of `repeat` timed calls."""
+    times = []
+    for _ in range(repeat):
+        out, seconds = _timed(fn, *args, **kwargs)
+        times.append(seconds)
+    return out, min(times)
+
+
+def _pandas_buckets(frame: pd.DataFrame, freq: str) -> pd.DataFrame:
+    planned_end = frame["planned_end"]
+    if freq == "week":
+        key = planned_end.dt.normalize() - pd.to_timedelta(planned_end.dt.weekday, unit="D")
+    else:
+        key = planned_end.dt.floor({"hour": "h", "day": "D"}[freq])
+    return frame.groupby(key).agg(
+        orders=("order_id", "size"), planned_qty=("planned_qty", "sum"), produced_qty=("produced_qty", "sum"),
+        defect_qty=("defect_qty", "sum"), plan_fulfillment=("plan_fulfillment", "mean"),
+        delay_hours=("delay_hours", "mean"), scrap_rate=("scrap_rate", "mean"),
+    )
+
+
+def bench_query(rows: int = 10_000_000, top_n: int = 20, lookups: int = 1000):
+    """OrderIndex queries vs the same answers from a pandas scan of the unified table."""
+    from integrate import iter_unified
+    from order_index import OrderIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        paths = make_synthetic(tmp, rows)
+        built, build_s = _timed(OrderIndex.build, iter_unified(*paths))
+        _, save_s = _timed(built.save, tmp / "index")
+        del built
+        index, load_s = _timed(OrderIndex.load, tmp / "index")
+        columns = ["order_id", "planned_qty", "produced_qty", "defect_qty", "planned_end",
+                   "plan_fulfillment", "delay_hours", "scrap_rate"]
+        frame, frame_s = _timed(lambda: pd.concat((chunk[columns] for chunk in iter_unified(*paths)),
+                                                  ignore_index=True))
+        frame["scrap_rate"] = frame["scrap_rate"].astype(float)
+        planned_end = frame["planned_end"]
+
+        first, last = index.span()
+        middle = (first + (last - first) / 2).normalize()
+        windows = {"1 day": pd.Timedelta(days=1), "1 week": pd.Timedelta(days=7), "30 days": pd.Timedelta(days=30)}
+        results = []
+
+        def compare(label, query, baseline, check):
+            out, index_s = _best(query)
+            expected, pandas_s = _best(baseline, repeat=1)
+            check(out, expected)
+            results.append((label, index_s, pandas_s))
+
+        def window(start, end):
+            return frame[(planned_end >= start) & (planned_end < end)]
+
+        def same_rows(out, expected):
+            assert len(out) == len(expected)
+            assert out["planned_qty"].sum() == expected["planned_qty"].sum()
+
+        for label, width in windows.items():
+            compare(f"range, {label}", lambda: index.range(middle, middle + width),
+                    lambda: window(middle, middle + width).sort_values("planned_end", kind="stable"), same_rows)
+
+        def same_buckets(out, expected):
+            out = out[out["orders"] > 0].set_index("bucket")
+            assert out.index.equals(expected.index.as_unit("us"))
+            for col in ["orders", "planned_qty", "produced_qty", "defect_qty"]:
+                assert (out[col].to_numpy() == expected[col].to_numpy()).all(), col
+            for col in ["plan_fulfillment", "delay_hours", "scrap_rate"]:
+                assert np.allclose(out[col], expected[col], rtol=1e-9, equal_nan=True), col
+
+        month = (middle, middle + windows["30 days"])
+        for freq in ("hour", "day", "week"):
+            compare(f"{freq} buckets, 30 days", lambda: index.buckets(freq, *month),
+                    lambda: _pandas_buckets(window(*month), freq), same_buckets)
+        for freq in ("day", "week"):
+            compare(f"{freq} buckets, all", lambda: index.buckets(freq), lambda: _pandas_buckets(frame, freq),
+                    same_buckets)
+
+        def same_top(col):
+            def check(out, expected):
+                assert np.allclose(out[col].astype(float), expected[col])
+            return check
+
+        for by, col in (("delay", "delay_hours"), ("scrap", "scrap_rate")):
+            compare(f"top {top_n} by {by}, all", lambda: index.top(top_n, by), lambda: frame.nlargest(top_n, col),
+                    same_top(col))
+        for label in ("1 week", "1 day"):
+            bounds = (middle, middle + windows[label])
+            compare(f"top {top_n} by delay, {label}", lambda: index.top(top_n, "delay", *bounds),
+                    lambda: window(*bounds).nlargest(top_n, "delay_hours"), same_top("delay_hours"))
+
+        ids = frame["order_id"].sample(lookups, random_state=0).tolist()
+
+        def same_orders(out, expected):
+            assert sorted(out["order_id"]) == sorted(expected["order_id"])
+            assert out["planned_qty"].sum() == expected["planned_qty"].sum()
+
+        compare(f"{lookups:,} order_id lookups", lambda: index.orders(ids),
+                lambda: frame[frame["order_id"].isin(ids)], same_orders)
+
+    print(f"{len(index):,} unified orders, {first:%Y-%m-%d} .. {last:%Y-%m-%d}")
+    print(f"OrderIndex build from iter_unified {build_s:.1f}s, save {save_s:.1f}s, load {load_s:.3f}s; "
+          f"pandas frame from iter_unified {frame_s:.1f}s")
+    print(f"{'query':>32} {'OrderIndex s':>13} {'pandas s':>9} {'speedup':>8}")
+    for label, index_s, pandas_s in results:
+        print(f"{label:>32} {index_s:>13.5f} {pandas_s:>9.3f} {pandas_s / index_s:>7.0f}x")
+
+
+def _merge_join(mes_path, erp_path) -> tuple[int, float]:
+    from integrate import add_derived_columns
+    from load import load_erp, load_mes
+
+    erp, mes = load_erp(erp_path), load_mes(mes_path)
+    start = time.perf_counter()
+    unified = add_derived_columns(pd.merge(erp, mes, on="order_id", how="inner", suffixes=("_plan", "_actual")))
+    return len(unified), time.perf_counter() - start
+
+
+def _engine_join(mes_path, erp_path) -> tuple[int, float]:
+    from join_engine import join_orders
+    from load import load_erp, load_mes
+
+    erp, mes = load_erp(erp_path), load_mes(mes_path)
+    start = time.perf_counter()
+    unified, _ = join_orders(erp, mes)
+    return len(unified), time.perf_counter() - start
+
+
+def _streamed_join(mes_path, erp_path, chunksize) -> tuple[int, float]:
+    from join_engine import ExecutionJoin
+    from load import iter_erp, iter_mes
+
+    erp = pd.concat(iter_erp(erp_path, chunksize), ignore_index=True)
+    join, join_s = _timed(ExecutionJoin, erp)
+    for chunk in iter_mes(mes_path, chunksize):
+        join_s += _timed(join.add, chunk)[1]
+    start, rows = time.perf_counter(), 0
+    for chunk in join.iter_result(chunksize):
+        rows += len(chunk)
+    return rows, join_s + time.perf_counter() - start
+
+
+def _check_join(mes_path, erp_path):
+    """The engine's unified table equals a merge onto MES executions pre-aggregated by pandas."""
+    from join_engine import join_orders
+    from load import load_erp, load_mes
+
+    erp, mes = load_erp(erp_path), load_mes(mes_path)
+    unified, report = join_orders(erp, mes)
+    totals = mes.groupby("order_id", observed=True).agg(
+        produced_qty=("produced_qty", "sum"), defect_qty=("defect_qty", "sum"),
+        start_time=("start_time", "min"), end_time=("end_time", "max"),
+    )
+    expected = totals.reindex(unified["order_id"])
+    for col in ["produced_qty", "defect_qty", "start_time", "end_time"]:
+        assert (unified[col].to_numpy() == expected[col].to_numpy()).all(), col
+    assert report.orders == len(totals) and report.executions == len(mes)
+    return report
+
+
+def bench_join(rows: int = 1_000_000, splits: float = 0.2, chunksize: int = CHUNK_ROWS):
+    """pd.merge on order_id vs join_engine (whole frames, and MES streamed), with split executions."""
+    with tempfile.TemporaryDirectory() as tmp:
+        mes_path, erp_path = make_synthetic(Path(tmp), rows, splits=splits)
+        if rows <= 2_000_000:
+            print("join report:", _check_join(mes_path, erp_path).summary())
+        print(f"{rows:,} orders, {splits:.0%} split into two executions")
+        print(f"{'join':>22} {'rows out':>12} {'join s':>8} {'wall s':>8} {'peak RSS MiB':>13}")
+        for name, fn, args in (
+            ("pd.merge", _merge_join, (mes_path, erp_path)),
+            ("join_orders", _engine_join, (mes_path, erp_path)),
+            ("ExecutionJoin, streamed", _streamed_join, (mes_path, erp_path, chunksize)),
+        ):
+            out = run_isolated(fn, *args)
+            if out is None:
+                print(f"{name:>22} {'killed (out of memory?)':>35}")
+                continue
+            (n, join_s), elapsed, rss = out
+            print(f"{name:>22} {n:>12,} {join_s:>8.2f} {elapsed:>8.1f} {rss:>13,.0f}")
+
+
+BENCHMARKS = {
+    "incremental": bench_incremental,
+    "join": bench_join,
+    "kpi": bench_kpi,
+    "query": bench_query,
+    "storage": bench_storage,
+    "stream": bench_stream,
+    "validate": bench_validate,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MES/ERP integration benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=None)
+    args = parser.parse_args()
+    kwargs = {"rows": args.rows} if args.rows else {}
+    BENCHMARKS[args.name](**kwargs)
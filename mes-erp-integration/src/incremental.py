@@ -0,0 +1,280 @@
+"""Incremental integration: re-join only the orders that changed since the last run.
+
+State lives in `state_dir`:
+
+- state.json: per source file its size/mtime, how many bytes were consumed and
+  a digest of the last consumed bytes, plus a watermark (latest start_time for
+  MES, planned_start for ERP).
+- orders.parquet: per order_id a content hash of its ERP row and of its set
+  of MES executions, and its planned_end, which locates the order's partition
+  in the unified store.
+- executions.parquet: every MES execution, several per order for splits and
+  reworks. When an order's executions change, all of them are folded again
+  (see join_engine), so the order's totals match a full rebuild.
+- pending_erp.parquet: ERP plans still waiting for their first execution.
+- kpi/: the running `KpiState` of the unified table, so dashboards can read
+  current or windowed KPIs without touching the table itself.
+
+An untouched export is skipped from its fingerprint alone. An export that
+only grew is read from the last consumed byte: its MES rows are further
+executions. A rewritten export is read in chunks and rows older than the
+watermark minus `lookback` are taken as settled; the MES rows read replace
+the stored executions of their orders from that point on. Orders whose hashes
+match the stored ones are dropped, and only the remaining orders are joined,
+get their derived columns and are upserted into the unified store.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from integrate import RESULTS_DIR, _join
+from kpi_engine import KpiState
+from load import DATA_DIR, ERP_DTYPES, ERP_TIME_COLS, MES_DTYPES, MES_TIME_COLS, iter_erp, iter_mes, parse_times
+from storage import get_store
+from validate import UNIQUE_ORDER_IDS, log_errors, validate_erp, validate_mes
+
+STATE_DIR = RESULTS_DIR / "incremental"
+# Version 1 kept one MES row per order; its state cannot be carried over.
+STATE_VERSION = 2
+STATE_FILE = "state.json"
+ORDERS_FILE = "orders.parquet"
+EXECUTIONS_FILE = "executions.parquet"
+KPI_DIR = "kpi"
+# Corrections to orders older than this behind the watermark are not picked up from rewritten exports.
+LOOKBACK = pd.Timedelta(days=7)
+TAIL_BYTES = 4096
+
+ERP_COLUMNS = ["order_id", "planned_qty", "planned_start", "planned_end"]
+MES_COLUMNS = ["order_id", "produced_qty", "defect_qty", "start_time", "end_time"]
+# Executions are hashed in one set of dtypes, however they were read.
+EXECUTION_DTYPES = {"order_id": str, "produced_qty": "int64", "defect_qty": "int64",
+                    "start_time": "datetime64[ns]", "end_time": "datetime64[ns]"}
+# name -> (chunk reader, dtypes, time columns, watermark column, columns)
+SOURCES = {
+    "erp": (iter_erp, ERP_DTYPES, ERP_TIME_COLS, "planned_start", ERP_COLUMNS),
+    "mes": (iter_mes, MES_DTYPES, MES_TIME_COLS, "start_time", MES_COLUMNS),
+}
+
+
+def _load_state(state_dir: Path) -> dict:
+    path = state_dir / STATE_FILE
+    if not path.exists():
+        return {"version": STATE_VERSION, "sources": {}, "watermarks": {}}
+    state = json.loads(path.read_text())
+    if state.get("version", 1) != STATE_VERSION:
+        raise ValueError(f"{state_dir} holds state version {state.get('version', 1)}, not {STATE_VERSION}; "
+                         "remove it (and the store) to rebuild")
+    return state
+
+
+def _save_state(state_dir: Path, state: dict):
+    tmp = state_dir / f".{STATE_FILE}.tmp"
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, state_dir / STATE_FILE)
+
+
+def _tail_digest(path: Path, offset: int) -> str:
+    with open(path, "rb") as fh:
+        fh.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.sha256(fh.read(offset - fh.tell())).hexdigest()
+
+
+def _read_table(path: Path, columns: list[str]) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=columns)
+
+
+def _read_orders(state_dir: Path) -> pd.DataFrame:
+    path = state_dir / ORDERS_FILE
+    # Nullable dtypes keep the uint64 hashes exact for orders seen in only one system.
+    orders = pd.read_parquet(path, dtype_backend="numpy_nullable") if path.exists() else pd.DataFrame(
+        columns=["order_id", "erp_hash", "mes_hash", "planned_end"]
+    )
+    orders = orders.astype({"order_id": str, "erp_hash": "UInt64", "mes_hash": "UInt64", "planned_end": "datetime64[ns]"})
+    return orders.set_index("order_id")
+
+
+def _empty(name: str) -> pd.DataFrame:
+    _, dtypes, time_cols, _, columns = SOURCES[name]
+    return pd.DataFrame({
+        col: pd.Series(dtype="datetime64[ns]" if col in time_cols else dtypes.get(col, object))
+        for col in columns
+    }).astype({"order_id": str})
+
+
+def _read_delta(path: Path, name: str, state: dict, lookback: pd.Timedelta) -> tuple[pd.DataFrame, dict, pd.Timestamp]:
+    """Rows of `path` that may be new or changed since the last run, the source's new state, and `since`.
+
+    `since` is None if the rows were appended to what was read before. For a
+    rewritten export it is the time from which rows were re-read (the earliest
+    timestamp if the whole export was), so the rows read supersede the stored
+    ones of their orders from `since` on.
+    """
+    reader, dtypes, time_cols, watermark_col, columns = SOURCES[name]
+    previous = state["sources"].get(name)
+    stat = path.stat()
+    source = {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "offset": stat.st_size}
+    source["tail"] = _tail_digest(path, stat.st_size)
+    if previous and all(previous[key] == source[key] for key in ("path", "size", "mtime_ns")):
+        return _empty(name), previous, None
+
+    appended = (
+        previous is not None
+        and previous["path"] == source["path"]
+        and stat.st_size >= previous["offset"]
+        and _tail_digest(path, previous["offset"]) == previous["tail"]
+    )
+    if appended:
+        with open(path, "rb") as fh:
+            fh.seek(previous["offset"])
+            header = pd.read_csv(path, nrows=0).columns.tolist()
+            delta = pd.read_csv(fh, header=None, names=header, dtype=dtypes)
+        delta = parse_times(delta, time_cols)
+        since = None
+    else:
+        watermark = state["watermarks"].get(name)
+        settled = pd.Timestamp(watermark) - lookback if watermark else None
+        chunks = (chunk if settled is None else chunk[chunk[watermark_col] >= settled] for chunk in reader(path))
+        delta = pd.concat(chunks, ignore_index=True)
+        since = pd.Timestamp.min if settled is None else settled
+    delta["order_id"] = delta["order_id"].astype(str)
+    delta = delta[columns]
+    if name in UNIQUE_ORDER_IDS:
+        # A plan's later row is its revision; MES rows are all executions.
+        delta = delta.drop_duplicates("order_id", keep="last")
+    return delta, source, since
+
+
+def _changed(delta: pd.DataFrame, orders: pd.DataFrame, hash_col: str) -> pd.DataFrame:
+    """Rows of `delta` whose content hash differs from the stored one, with the new hash."""
+    hashes = pd.util.hash_pandas_object(delta, index=False).to_numpy()
+    stored = orders[hash_col].reindex(delta["order_id"]).fillna(0).to_numpy("uint64")
+    return delta[hashes != stored].assign(**{hash_col: hashes[hashes != stored]})
+
+
+def _fold_executions(delta: pd.DataFrame, stored: pd.DataFrame, since, orders: pd.DataFrame) -> tuple:
+    """All executions after applying the MES `delta`, and its orders whose set of executions changed.
+
+    The hash of an order's executions is the sum of their row hashes, so it
+    does not depend on their order in the exports.
+    """
+    touched = _isin(stored["order_id"], delta["order_id"])
+    replaced = touched if since is not None else pd.Series(False, index=stored.index)
+    if since is not None and since > pd.Timestamp.min:
+        replaced &= stored["start_time"] >= since
+    executions = pd.concat([stored[~replaced], delta], ignore_index=True).astype(EXECUTION_DTYPES)
+
+    rows = executions[_isin(executions["order_id"], delta["order_id"])]
+    codes, order_ids = pd.factorize(rows["order_id"])
+    hashes = np.zeros(len(order_ids), dtype=np.uint64)
+    np.add.at(hashes, codes, pd.util.hash_pandas_object(rows, index=False).to_numpy())
+    stored_hashes = orders["mes_hash"].reindex(order_ids).fillna(0).to_numpy("uint64")
+    changed = hashes != stored_hashes
+    return executions, pd.DataFrame({"order_id": order_ids[changed], "mes_hash": hashes[changed]})
+
+
+def _isin(order_ids: pd.Series, values) -> pd.Series:
+    # Series.isin on the Arrow-backed str dtype converts `values` one scalar at a time.
+    return pd.Series(pd.Index(values).unique().get_indexer(order_ids) >= 0, index=order_ids.index)
+
+
+def _side(changed: pd.DataFrame, previous: pd.DataFrame, pending: pd.DataFrame, columns, affected) -> pd.DataFrame:
+    """Current rows of one system for the affected orders: new rows first, else stored ones."""
+    rest = affected.difference(changed["order_id"])
+    parts = [changed[columns]]
+    for stored in (previous, pending):
+        if len(stored):
+            parts.append(stored.loc[_isin(stored["order_id"], rest), columns])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _apply(erp: pd.DataFrame, mes: pd.DataFrame, mes_since, store, state_dir: Path) -> dict:
+    orders = _read_orders(state_dir)
+    erp_changed = _changed(erp, orders, "erp_hash")
+    executions = _read_table(state_dir / EXECUTIONS_FILE, MES_COLUMNS).astype(EXECUTION_DTYPES)
+    mes_changed = pd.DataFrame({"order_id": pd.Series(dtype=str), "mes_hash": pd.Series(dtype="uint64")})
+    if len(mes):
+        executions, mes_changed = _fold_executions(mes, executions, mes_since, orders)
+    affected = pd.Index(erp_changed["order_id"]).union(pd.Index(mes_changed["order_id"]))
+    if affected.empty:
+        return {"changed_orders": 0, "upserted": 0}
+
+    known = orders.reindex(affected)
+    joined = known["erp_hash"].notna() & known["mes_hash"].notna()
+    previous = store.read_orders(affected[joined.to_numpy()], known.loc[joined, "planned_end"])
+    if len(previous):
+        previous["order_id"] = previous["order_id"].astype(str)
+    pending_erp = _read_table(state_dir / "pending_erp.parquet", ERP_COLUMNS)
+
+    erp_rows = _side(erp_changed, previous, pending_erp, ERP_COLUMNS, affected)
+    # Every execution of an affected order, so its totals are folded afresh.
+    mes_rows = executions[_isin(executions["order_id"], affected)]
+    unified = _join(erp_rows, mes_rows)
+    replaced = previous[["order_id", "planned_end"]] if len(previous) else pd.DataFrame(
+        {"order_id": pd.Series(dtype=str), "planned_end": pd.Series(dtype="datetime64[ns]")}
+    )
+    store.upsert(unified, replaced)
+    kpi_dir = state_dir / KPI_DIR
+    kpis = KpiState.load(kpi_dir) if kpi_dir.exists() else KpiState()
+    kpis.remove(previous).update(unified).save(kpi_dir)
+
+    waiting = erp_rows[~_isin(erp_rows["order_id"], mes_rows["order_id"])]
+    pending_erp = pd.concat([pending_erp[~_isin(pending_erp["order_id"], affected)], waiting], ignore_index=True)
+    pending_erp.to_parquet(state_dir / "pending_erp.parquet", index=False)
+    if len(mes_changed):
+        executions.to_parquet(state_dir / EXECUTIONS_FILE, index=False)
+
+    orders = orders.reindex(orders.index.union(affected))
+    orders.loc[erp_changed["order_id"], "erp_hash"] = erp_changed["erp_hash"].to_numpy()
+    orders.loc[erp_changed["order_id"], "planned_end"] = erp_changed["planned_end"].to_numpy()
+    orders.loc[mes_changed["order_id"], "mes_hash"] = mes_changed["mes_hash"].to_numpy()
+    orders.rename_axis("order_id").reset_index().to_parquet(state_dir / ORDERS_FILE, index=False)
+    return {"changed_orders": len(affected), "upserted": len(unified)}
+
+
+def update_unified(
+    mes_path: str | Path = DATA_DIR / "mes.csv",
+    erp_path: str | Path = DATA_DIR / "erp.csv",
+    store_path: str | Path = RESULTS_DIR / "unified.parquet",
+    state_dir: str | Path = STATE_DIR,
+    lookback: pd.Timedelta = LOOKBACK,
+) -> dict:
+    """Bring the unified table at `store_path` up to date with the exports and return a run summary."""
+    start = time.perf_counter()
+    state_dir = Path(state_dir)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    state = _load_state(state_dir)
+    if state.get("store", str(store_path)) != str(store_path):
+        raise ValueError(f"{state_dir} tracks {state['store']}, not {store_path}")
+
+    erp, erp_source, _ = _read_delta(Path(erp_path), "erp", state, lookback)
+    mes, mes_source, mes_since = _read_delta(Path(mes_path), "mes", state, lookback)
+    summary = {"erp_rows": len(erp), "mes_rows": len(mes), "changed_orders": 0, "upserted": 0}
+    if len(erp) or len(mes):
+        log_errors((validate_erp(erp) if len(erp) else []) + (validate_mes(mes) if len(mes) else []))
+        summary.update(_apply(erp, mes, mes_since, get_store(store_path), state_dir))
+
+    state["store"] = str(store_path)
+    state["sources"] = {"erp": erp_source, "mes": mes_source}
+    for name, delta in (("erp", erp), ("mes", mes)):
+        col = SOURCES[name][3]
+        if len(delta):
+            latest = delta[col].max()
+            current = state["watermarks"].get(name)
+            state["watermarks"][name] = max(latest, pd.Timestamp(current)).isoformat() if current else latest.isoformat()
+    _save_state(state_dir, state)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def current_kpis(state_dir: str | Path = STATE_DIR, start=None, end=None) -> dict:
+    """KPIs of the incrementally maintained table, optionally for whole planned_end days [start, end)."""
+    return KpiState.load(Path(state_dir) / KPI_DIR).kpis(start, end)
+
+
+if __name__ == "__main__":
+    print(update_unified())
@@ -1,35 +1,120 @@
 from pathlib import Path
+from typing import Iterator
 import pandas as pd
 
-from load import load_mes, load_erp
-from validate import log_errors, validate_mes, validate_erp
+from join_engine import ExecutionJoin, add_derived_columns, join_orders
+from load import CHUNK_ROWS, iter_erp, iter_mes, load_mes, load_erp
+from storage import get_store
+from validate import RuleEngine, ViolationLog, log_engines
 
 RESULTS_DIR = Path(__file__).resolve().parent.parent / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def build_unified_table(mes_path: str | Path = None, erp_path: str | Path = None) -> pd.DataFrame:
+def _join(erp: pd.DataFrame, mes: pd.DataFrame) -> pd.DataFrame:
+    return join_orders(erp, mes)[0]
+
+
+def _report(join: ExecutionJoin, unmatched_path: str | Path = None):
+    report = join.report()
+    report.log()
+    if unmatched_path:
+        report.write(unmatched_path)
+
+
+def _engine(source: str, on_invalid: str, violations: ViolationLog, known_ids: pd.Index = None) -> RuleEngine:
+    quarantine = RESULTS_DIR / f"quarantine_{source}.parquet" if on_invalid == "quarantine" else None
+    return RuleEngine(source, on_invalid, violations, quarantine, known_ids)
+
+
+def build_unified_table(
+    mes_path: str | Path = None, erp_path: str | Path = None, start=None, end=None,
+    on_invalid: str = "report", violations_path: str | Path = None, unmatched_path: str | Path = None,
+) -> pd.DataFrame:
+    """Join MES onto ERP; `start`/`end` restrict to orders with start <= planned_end < end.
+
+    Each order is one row, its MES executions summed (see join_engine). Join
+    counts go to the log, and order_ids found in only one export to
+    `unmatched_path` (Parquet) if given. With a window, MES orders planned
+    outside it count as unmatched.
+
+    `on_invalid` is the RuleEngine mode for rows that break a validation rule;
+    row-level violations go to `violations_path` (Parquet) if given.
+    """
     mes = load_mes(mes_path) if mes_path else load_mes()
-    erp = load_erp(erp_path) if erp_path else load_erp()
+    erp = load_erp(erp_path, start=start, end=end) if erp_path else load_erp(start=start, end=end)
 
-    errors = validate_mes(mes) + validate_erp(erp)
-    log_errors(errors)
+    violations = ViolationLog(violations_path) if violations_path else None
+    erp_engine = _engine("erp", on_invalid, violations)
+    mes_engine = None
+    try:
+        erp = erp_engine.check(erp)
+        # A planned_end window leaves out plans whose executions are still in the MES file.
+        windowed = start is not None or end is not None
+        mes_engine = _engine("mes", on_invalid, violations, None if windowed else pd.Index(erp["order_id"]))
+        mes = mes_engine.check(mes)
+    finally:
+        for closable in (erp_engine, mes_engine, violations):
+            if closable is not None:
+                closable.close()
+    log_engines(erp_engine, mes_engine)
 
-    unified = pd.merge(
-        erp,
-        mes,
-        on="order_id",
-        how="inner",
-        suffixes=("_plan", "_actual"),
-    )
-    unified["plan_fulfillment"] = unified["produced_qty"] / unified["planned_qty"]
-    unified["delay_hours"] = (unified["end_time"] - unified["planned_end"]).dt.total_seconds() / 3600
-    unified["scrap_rate"] = unified["defect_qty"] / unified["produced_qty"].replace(0, pd.NA)
-    return unified
+    join = ExecutionJoin(erp).add(mes)
+    _report(join, unmatched_path)
+    return join.result()[0]
+
+
+def iter_unified(
+    mes_path: str | Path = None, erp_path: str | Path = None, chunksize: int = CHUNK_ROWS,
+    on_invalid: str = "report", violations_path: str | Path = None, unmatched_path: str | Path = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream the unified table: ERP plans are held in memory, MES executions are folded in chunk by chunk.
+
+    An order's executions may be anywhere in the MES export, so the unified
+    chunks (in ERP order) follow once the MES stream is exhausted.
+    Validation runs on every chunk as it passes (see build_unified_table for
+    `on_invalid` / `violations_path` / `unmatched_path`); the summaries are
+    logged after the MES stream.
+    """
+    violations = ViolationLog(violations_path) if violations_path else None
+    erp_engine = _engine("erp", on_invalid, violations)
+    mes_engine = None
+    try:
+        erp_chunks = iter_erp(erp_path, chunksize) if erp_path else iter_erp(chunksize=chunksize)
+        erp = pd.concat((erp_engine.check(chunk) for chunk in erp_chunks), ignore_index=True)
+        mes_engine = _engine("mes", on_invalid, violations, pd.Index(erp["order_id"]))
+        join = ExecutionJoin(erp)
+        del erp
+
+        mes_chunks = iter_mes(mes_path, chunksize) if mes_path else iter_mes(chunksize=chunksize)
+        for mes in mes_chunks:
+            join.add(mes_engine.check(mes))
+    finally:
+        for closable in (erp_engine, mes_engine, violations):
+            if closable is not None:
+                closable.close()
+    log_engines(erp_engine, mes_engine)
+    _report(join, unmatched_path)
+    yield from join.iter_result(chunksize)
 
 
 def save_unified(unified: pd.DataFrame, path: str | Path = RESULTS_DIR / "unified.csv") -> Path:
-    unified.to_csv(path, index=False)
+    """Save to CSV, or to a date-partitioned Parquet dataset for any non-.csv path."""
+    return get_store(path).write(unified)
+
+
+def load_unified(
+    path: str | Path = RESULTS_DIR / "unified.csv", columns: list[str] = None, start=None, end=None
+) -> pd.DataFrame:
+    """Read saved unified orders, only `columns` and start <= planned_end < end if given."""
+    return get_store(path).read(columns, start, end)
+
+
+def save_unified_stream(chunks: Iterator[pd.DataFrame], path: str | Path = RESULTS_DIR / "unified.csv") -> Path:
+    """Write unified chunks to one CSV without holding more than a chunk in memory."""
+    with open(path, "w", newline="") as fh:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(fh, index=False, header=i == 0)
     return Path(path)
 
 
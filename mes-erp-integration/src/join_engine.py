@@ -0,0 +1,184 @@
+"""MES↔ERP join with one unified row per planned order, however many MES executions it has.
+
+An order can run as several MES executions (splits, reworks). A plain merge
+on order_id repeats the plan once per execution and skews plan_fulfillment.
+`ExecutionJoin` instead folds the executions of each order into one:
+
+- ERP order_ids are encoded once: an order's integer code is its plan's
+  position in an Arrow array of the ids. MES ids are looked up in it with
+  Arrow's hash table (`pyarrow.compute.index_in`). For categorical chunks
+  (as `load.iter_mes` reads them) only the distinct ids are looked up.
+- Each MES chunk is sorted by code and reduced run by run: produced and
+  defect quantities are summed, start_time is the earliest start and
+  end_time the latest end. The results accumulate in arrays indexed by code,
+  so memory is the ERP plans plus 40 bytes per plan, whatever the MES size.
+- The unified table is every plan with at least one execution, in ERP order.
+
+Orders on one side only are reported in a `JoinReport`, not dropped silently.
+
+    join = ExecutionJoin(load_erp())
+    for chunk in iter_mes():
+        join.add(chunk)
+    unified, report = join.result()
+"""
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from load import CHUNK_ROWS
+
+NAT = np.iinfo(np.int64).min
+NEVER = np.iinfo(np.int64).max
+
+
+def add_derived_columns(unified: pd.DataFrame) -> pd.DataFrame:
+    unified["plan_fulfillment"] = unified["produced_qty"] / unified["planned_qty"]
+    unified["delay_hours"] = (unified["end_time"] - unified["planned_end"]).dt.total_seconds() / 3600
+    unified["scrap_rate"] = unified["defect_qty"] / unified["produced_qty"].replace(0, pd.NA)
+    return unified
+
+
+def _us(values: pd.Series) -> np.ndarray:
+    return values.to_numpy("datetime64[us]").view(np.int64)
+
+
+def _arrow_ids(order_ids) -> pa.Array:
+    return pa.array(pd.Series(order_ids).astype(str), type=pa.large_string(), from_pandas=True)
+
+
+@dataclass
+class JoinReport:
+    """Counts of a join, and the order_ids found on one side only."""
+    plans: int
+    executions: int
+    orders: int
+    multi_execution_orders: int
+    duplicate_plans: int
+    unmatched_erp: np.ndarray
+    unmatched_mes: np.ndarray
+
+    def summary(self) -> dict:
+        return {
+            "plans": self.plans,
+            "executions": self.executions,
+            "orders": self.orders,
+            "multi_execution_orders": self.multi_execution_orders,
+            "duplicate_plans": self.duplicate_plans,
+            "unmatched_erp": len(self.unmatched_erp),
+            "unmatched_mes": len(self.unmatched_mes),
+        }
+
+    def log(self):
+        logging.info("join: %s", ", ".join(f"{name} {count}" for name, count in self.summary().items()))
+
+    def write(self, path: str | Path) -> Path:
+        """Unmatched order_ids as (source, order_id) rows in one Parquet file."""
+        pd.DataFrame({
+            "source": ["erp"] * len(self.unmatched_erp) + ["mes"] * len(self.unmatched_mes),
+            "order_id": np.concatenate([self.unmatched_erp, self.unmatched_mes]).astype(str),
+        }).to_parquet(path, index=False)
+        return Path(path)
+
+
+class ExecutionJoin:
+    """Per-plan totals of the MES executions added so far; see the module docstring."""
+
+    def __init__(self, erp: pd.DataFrame):
+        erp = erp[erp["order_id"].notna()]
+        ids = _arrow_ids(erp["order_id"])
+        # One plan per order: a repeated order_id keeps its last plan, like a later ERP revision would.
+        # index_in finds first occurrences, so looking the ids up in reverse finds the last ones.
+        last = len(ids) - 1 - pc.index_in(ids, value_set=ids[::-1]).to_numpy(zero_copy_only=False)
+        keep = last == np.arange(len(ids))
+        self.duplicate_plans = int(len(keep) - keep.sum())
+        if self.duplicate_plans:
+            erp, ids = erp[keep], ids.filter(pa.array(keep))
+        self.plans = erp.reset_index(drop=True).astype({"order_id": str})
+        self.ids = ids
+        n = len(self.plans)
+        self.produced = np.zeros(n, dtype=np.int64)
+        self.defects = np.zeros(n, dtype=np.int64)
+        self.first_start = np.full(n, NEVER, dtype=np.int64)
+        self.last_end = np.full(n, NAT, dtype=np.int64)
+        self.executions = np.zeros(n, dtype=np.int64)
+        self.execution_rows = 0
+        self._orphans = []
+
+    def codes(self, order_ids: pd.Series) -> np.ndarray:
+        """The plan position of each order_id, -1 for ids without a plan."""
+        if isinstance(order_ids.dtype, pd.CategoricalDtype):
+            lookup = self.codes(pd.Series(order_ids.cat.categories))
+            raw = order_ids.cat.codes.to_numpy()
+            return np.where(raw >= 0, lookup[raw], -1)
+        found = pc.index_in(_arrow_ids(order_ids), value_set=self.ids)
+        return found.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+
+    def add(self, mes: pd.DataFrame) -> "ExecutionJoin":
+        """Fold a chunk of MES executions into the per-plan totals."""
+        codes = self.codes(mes["order_id"])
+        self.execution_rows += len(mes)
+        matched = codes >= 0
+        orphans = ~matched & mes["order_id"].notna().to_numpy()
+        if orphans.any():
+            self._orphans.append(pd.unique(mes["order_id"][orphans].astype(str).to_numpy()))
+        if not matched.any():
+            return self
+
+        order = np.argsort(codes[matched], kind="stable")
+        rows = np.flatnonzero(matched)[order]
+        sorted_codes = codes[rows]
+        runs = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        plans = sorted_codes[runs]
+        start = _us(mes["start_time"])[rows]
+        start[start == NAT] = NEVER  # an unknown start never wins the minimum
+
+        self.produced[plans] += np.add.reduceat(mes["produced_qty"].to_numpy(np.int64)[rows], runs)
+        self.defects[plans] += np.add.reduceat(mes["defect_qty"].to_numpy(np.int64)[rows], runs)
+        self.first_start[plans] = np.minimum(self.first_start[plans], np.minimum.reduceat(start, runs))
+        self.last_end[plans] = np.maximum(self.last_end[plans], np.maximum.reduceat(_us(mes["end_time"])[rows], runs))
+        self.executions[plans] += np.diff(np.r_[runs, len(rows)])
+        return self
+
+    def _unified(self, rows: np.ndarray) -> pd.DataFrame:
+        start = self.first_start[rows]
+        unified = self.plans.iloc[rows].reset_index(drop=True)
+        unified["produced_qty"] = self.produced[rows]
+        unified["defect_qty"] = self.defects[rows]
+        unified["start_time"] = np.where(start == NEVER, NAT, start).view("datetime64[us]")
+        unified["end_time"] = self.last_end[rows].view("datetime64[us]")
+        return add_derived_columns(unified)
+
+    def report(self) -> JoinReport:
+        matched = self.executions > 0
+        orphans = pd.unique(np.concatenate(self._orphans)) if self._orphans else np.empty(0, dtype=object)
+        return JoinReport(
+            plans=len(self.plans),
+            executions=self.execution_rows,
+            orders=int(matched.sum()),
+            multi_execution_orders=int((self.executions > 1).sum()),
+            duplicate_plans=self.duplicate_plans,
+            unmatched_erp=self.plans["order_id"].to_numpy()[~matched].astype(str),
+            unmatched_mes=np.asarray(orphans, dtype=str),
+        )
+
+    def result(self) -> tuple[pd.DataFrame, JoinReport]:
+        """The unified table (one row per order with a plan and an execution, in ERP order) and the report."""
+        return self._unified(np.flatnonzero(self.executions > 0)), self.report()
+
+    def iter_result(self, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """The unified table of `result`, in chunks of up to `chunksize` plans."""
+        for start in range(0, len(self.plans), chunksize):
+            rows = start + np.flatnonzero(self.executions[start:start + chunksize] > 0)
+            if len(rows):
+                yield self._unified(rows)
+
+
+def join_orders(erp: pd.DataFrame, mes: pd.DataFrame) -> tuple[pd.DataFrame, JoinReport]:
+    """Unified table of `erp` plans and `mes` executions, with the join report."""
+    return ExecutionJoin(erp).add(mes).result()
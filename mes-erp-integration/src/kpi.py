@@ -4,29 +4,33 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
-from integrate import build_unified_table, save_unified
+from integrate import build_unified_table, load_unified, save_unified
+from kpi_engine import KpiState
+from order_index import COLUMNS as INDEX_COLUMNS, OrderIndex
 
 RESULTS_DIR = Path(__file__).resolve().parent.parent / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 PLOT_PATH = RESULTS_DIR / "plan_vs_actual.png"
+UNIFIED_PATH = RESULTS_DIR / "unified.csv"
+# Everything compute_kpis touches; the plot's daily buckets come from an OrderIndex, which needs INDEX_COLUMNS.
+KPI_COLUMNS = ["planned_qty", "produced_qty", "defect_qty", "planned_end", "end_time"]
 
 
 def compute_kpis(unified: pd.DataFrame) -> dict:
-    kpis = {
-        "plan_fulfillment_mean": (unified["produced_qty"] / unified["planned_qty"]).mean(),
-        "delay_hours_mean": (unified["end_time"] - unified["planned_end"]).dt.total_seconds().mean() / 3600,
-        "scrap_rate_mean": (unified["defect_qty"] / unified["produced_qty"].replace(0, pd.NA)).mean(),
-    }
-    return kpis
+    """Plan fulfillment, delay (hours) and scrap rate means, exactly as a `KpiState` reports them."""
+    return KpiState().update(unified).kpis()
 
 
-def plot_plan_vs_actual(unified: pd.DataFrame, out_path: Path = PLOT_PATH) -> Path:
-    sample = unified.copy()
-    sample["planned_end_date"] = sample["planned_end"].dt.date
+def plot_plan_vs_actual(daily: pd.DataFrame, out_path: Path = PLOT_PATH) -> Path:
+    """Mean planned vs produced quantity per order, per `OrderIndex.buckets("day")` row."""
+    daily = daily[daily["orders"] > 0]
+    daily = daily.assign(planned_end_date=daily["bucket"].dt.date,
+                         planned_qty=daily["planned_qty"] / daily["orders"],
+                         produced_qty=daily["produced_qty"] / daily["orders"])
 
     plt.figure(figsize=(9, 5))
-    sns.lineplot(data=sample, x="planned_end_date", y="planned_qty", label="Planned qty")
-    sns.lineplot(data=sample, x="planned_end_date", y="produced_qty", label="Produced qty")
+    sns.lineplot(data=daily, x="planned_end_date", y="planned_qty", label="Planned qty")
+    sns.lineplot(data=daily, x="planned_end_date", y="produced_qty", label="Produced qty")
     plt.title("Planned vs Actual Production")
     plt.xlabel("Planned end date")
     plt.ylabel("Quantity")
@@ -37,11 +41,19 @@ def plot_plan_vs_actual(unified: pd.DataFrame, out_path: Path = PLOT_PATH) -> Pa
     return out_path
 
 
-def run_pipeline():
-    unified = build_unified_table()
-    save_unified(unified)
+def run_pipeline(unified_path: str | Path = UNIFIED_PATH, rebuild: bool = True, start=None, end=None):
+    """Compute KPIs and the plan-vs-actual plot.
+
+    With rebuild=False the saved unified table at `unified_path` (CSV or
+    Parquet) is read instead, limited to INDEX_COLUMNS and the planned_end window.
+    """
+    if rebuild:
+        unified = build_unified_table(start=start, end=end)
+        save_unified(unified, unified_path)
+    else:
+        unified = load_unified(unified_path, columns=INDEX_COLUMNS, start=start, end=end)
     kpis = compute_kpis(unified)
-    plot_path = plot_plan_vs_actual(unified)
+    plot_path = plot_plan_vs_actual(OrderIndex.build(unified).buckets("day"))
     print("KPIs:", kpis)
     print(f"Plot saved to {plot_path}")
     return kpis, plot_path
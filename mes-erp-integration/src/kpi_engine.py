@@ -0,0 +1,165 @@
+"""Running KPI aggregates that can be updated, reverted and merged.
+
+`KpiState` keeps, per planned_end day (and optionally per extra columns such
+as a line or shift), the sums and counts behind the KPI means. Sums are held
+exactly: every value is split into integer mantissa parts per binary
+exponent, so adding rows, removing rows and merging states from other
+partitions or workers give the same result in any order, and the final mean
+is the exact mean rounded once. `kpi.compute_kpis` goes through the same
+state, so batch and incremental numbers agree to the last bit.
+"""
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+METRICS = ["plan_fulfillment", "delay_hours", "scrap_rate"]
+LOW_BITS = 32
+NS_PER_HOUR = 3600 * 10**9
+
+
+def _metric_values(rows: pd.DataFrame) -> dict:
+    """Per-row KPI inputs: ratios as float64 (NaN = not counted), delay in integer nanoseconds."""
+    produced = rows["produced_qty"].to_numpy(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fulfillment = produced / rows["planned_qty"].to_numpy(np.float64)
+        scrap = np.where(produced != 0, rows["defect_qty"].to_numpy(np.float64) / produced, np.nan)
+    delay = (rows["end_time"] - rows["planned_end"]).to_numpy("timedelta64[ns]")
+    return {"plan_fulfillment": fulfillment, "delay_hours": delay, "scrap_rate": scrap}
+
+
+def _parts(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split values into (exp, hi, lo) with value == (hi * 2**LOW_BITS + lo) * 2**exp exactly."""
+    if values.dtype.kind == "m":
+        ints, exp = values.view(np.int64), np.zeros(len(values), np.int64)
+    else:
+        mantissa, exp = np.frexp(values)
+        ints, exp = (mantissa * 2.0**53).astype(np.int64), exp.astype(np.int64) - 53
+    return exp, ints >> LOW_BITS, ints & (2**LOW_BITS - 1)
+
+
+class KpiState:
+    """Mergeable KPI sums per planned_end day plus the `by` columns."""
+
+    def __init__(self, by: list[str] = None):
+        self.by = list(by or [])
+        self.keys = ["day", *self.by, "metric"]
+        # exact sums: one row per key and exponent, hi/lo halves of the mantissa sum
+        self.sums = pd.DataFrame(columns=[*self.keys, "exp", "hi", "lo"])
+        # value counts: finite values and +/-inf (NaN is never counted, as in pandas' mean)
+        self.counts = pd.DataFrame(columns=[*self.keys, "n", "posinf", "neginf"])
+
+    def _frames(self, rows: pd.DataFrame, sign: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+        groups = {"day": rows["planned_end"].dt.floor("D").to_numpy(), **{col: rows[col].to_numpy() for col in self.by}}
+        sums, counts = [], []
+        for metric, values in _metric_values(rows).items():
+            if values.dtype.kind == "m":
+                finite, posinf, neginf = ~np.isnat(values), np.zeros(len(values), bool), np.zeros(len(values), bool)
+            else:
+                finite, posinf, neginf = np.isfinite(values), values == np.inf, values == -np.inf
+            keyed = pd.DataFrame(groups).assign(metric=metric)
+            counts.append(keyed.assign(n=finite * sign, posinf=posinf * sign, neginf=neginf * sign))
+            exp, hi, lo = _parts(values[finite])
+            sums.append(keyed[finite].assign(exp=exp, hi=hi * sign, lo=lo * sign))
+        return pd.concat(sums, ignore_index=True), pd.concat(counts, ignore_index=True)
+
+    def _combine(self, sums: list[pd.DataFrame], counts: list[pd.DataFrame]) -> "KpiState":
+        sums = pd.concat([frame for frame in sums if len(frame)], ignore_index=True)
+        counts = pd.concat([frame for frame in counts if len(frame)], ignore_index=True)
+        if len(sums):
+            sums = sums.groupby([*self.keys, "exp"], sort=False, dropna=False)[["hi", "lo"]].sum().reset_index()
+            self.sums = sums[(sums["hi"] != 0) | (sums["lo"] != 0)].reset_index(drop=True)
+        if len(counts):
+            counts = counts.groupby(self.keys, sort=False, dropna=False)[["n", "posinf", "neginf"]].sum().reset_index()
+            self.counts = counts[counts[["n", "posinf", "neginf"]].any(axis=1)].reset_index(drop=True)
+        return self
+
+    def update(self, rows: pd.DataFrame) -> "KpiState":
+        """Add unified order rows; cost is proportional to `rows`, not to the table."""
+        if not len(rows):
+            return self
+        sums, counts = self._frames(rows, 1)
+        return self._combine([self.sums, sums], [self.counts, counts])
+
+    def remove(self, rows: pd.DataFrame) -> "KpiState":
+        """Take back rows added earlier, e.g. the old version of an order that was re-joined."""
+        if not len(rows):
+            return self
+        sums, counts = self._frames(rows, -1)
+        return self._combine([self.sums, sums], [self.counts, counts])
+
+    def merge(self, other: "KpiState") -> "KpiState":
+        """Fold in a state built from another partition or worker."""
+        if other.by != self.by:
+            raise ValueError(f"Cannot merge KPI states grouped by {other.by} into {self.by}")
+        return self._combine([self.sums, other.sums], [self.counts, other.counts])
+
+    @staticmethod
+    def _day(ts, name: str):
+        ts = pd.Timestamp(ts)
+        if ts != ts.normalize():
+            raise ValueError(f"{name}={ts} is not midnight; KPI windows are whole planned_end days")
+        return ts
+
+    def _window(self, frame: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+        if start is not None:
+            frame = frame[frame["day"] >= self._day(start, "start")]
+        if end is not None:
+            frame = frame[frame["day"] < self._day(end, "end")]
+        return frame
+
+    @staticmethod
+    def _mean(metric: str, total: Fraction, n: int, posinf: int, neginf: int) -> float:
+        if posinf and neginf or not n + posinf + neginf:
+            return float("nan")
+        if posinf or neginf:
+            return float("inf") if posinf else float("-inf")
+        return float(total / (n * NS_PER_HOUR if metric == "delay_hours" else n))
+
+    def _means(self, by: list[str], start=None, end=None) -> dict:
+        """{group key tuple: {kpi: mean}} over the window; one () group when `by` is empty."""
+        sums, counts = self._window(self.sums, start, end), self._window(self.counts, start, end)
+        totals = {}
+        summed = sums.groupby([*by, "metric", "exp"], sort=False, dropna=False)[["hi", "lo"]].sum()
+        for key, hi, lo in zip(summed.index, summed["hi"].tolist(), summed["lo"].tolist()):
+            *group, metric, exp = key
+            slot = (tuple(group), metric)
+            totals[slot] = totals.get(slot, 0) + Fraction((hi << LOW_BITS) + lo) * Fraction(2) ** int(exp)
+        means = {}
+        counted = counts.groupby([*by, "metric"], sort=True, dropna=False)[["n", "posinf", "neginf"]].sum()
+        for key, n, posinf, neginf in zip(counted.index, *(counted[col].tolist() for col in counted)):
+            *group, metric = key if isinstance(key, tuple) else (key,)
+            total = totals.get((tuple(group), metric), Fraction(0))
+            means.setdefault(tuple(group), {})[metric] = self._mean(metric, total, n, posinf, neginf)
+        return {key: {f"{m}_mean": values.get(m, float("nan")) for m in METRICS} for key, values in means.items()}
+
+    def kpis(self, start=None, end=None) -> dict:
+        """KPI means over all orders, or those with start <= planned_end < end (whole days)."""
+        nan = {f"{metric}_mean": float("nan") for metric in METRICS}
+        return self._means([], start, end).get((), nan)
+
+    def kpis_by(self, by: str | list[str] = "day", start=None, end=None) -> pd.DataFrame:
+        """KPI means per group of `by` ("day" and/or the state's own `by` columns)."""
+        by = [by] if isinstance(by, str) else list(by)
+        means = self._means(by, start, end)
+        index = pd.MultiIndex.from_tuples(means, names=by) if len(by) > 1 else pd.Index(
+            [key[0] for key in means], name=by[0]
+        )
+        return pd.DataFrame(list(means.values()), index=index, columns=[f"{m}_mean" for m in METRICS])
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        self.sums.to_parquet(path / "sums.parquet", index=False)
+        self.counts.to_parquet(path / "counts.parquet", index=False)
+        (path / "by").write_text(",".join(self.by))
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> "KpiState":
+        path = Path(path)
+        state = cls(list(filter(None, (path / "by").read_text().split(","))))
+        state.sums = pd.read_parquet(path / "sums.parquet")
+        state.counts = pd.read_parquet(path / "counts.parquet")
+        return state
@@ -1,26 +1,78 @@
 from pathlib import Path
+from typing import Iterator
+
 import pandas as pd
 
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
+# Exports use one fixed ISO layout; an explicit format skips per-value inference.
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+CHUNK_ROWS = 1_000_000
 
-def load_mes(path: str | Path = DATA_DIR / "mes.csv") -> pd.DataFrame:
-    """Load MES execution data with parsed timestamps."""
-    df = pd.read_csv(path)
-    df["start_time"] = pd.to_datetime(df["start_time"])
-    df["end_time"] = pd.to_datetime(df["end_time"])
-    return df
+MES_DTYPES = {"order_id": "category", "produced_qty": "int32", "defect_qty": "int32"}
+MES_TIME_COLS = ["start_time", "end_time"]
+ERP_DTYPES = {"order_id": "category", "planned_qty": "int32"}
+ERP_TIME_COLS = ["planned_start", "planned_end"]
 
 
-def load_erp(path: str | Path = DATA_DIR / "erp.csv") -> pd.DataFrame:
-    """Load ERP planning data with parsed timestamps."""
-    df = pd.read_csv(path)
-    df["planned_start"] = pd.to_datetime(df["planned_start"])
-    df["planned_end"] = pd.to_datetime(df["planned_end"])
+def parse_times(df: pd.DataFrame, time_cols: list[str]) -> pd.DataFrame:
+    for col in time_cols:
+        df[col] = pd.to_datetime(df[col], format=TIME_FORMAT)
     return df
 
 
+def _iter_csv(path: str | Path, dtypes: dict, time_cols: list[str], chunksize: int) -> Iterator[pd.DataFrame]:
+    with pd.read_csv(path, dtype=dtypes, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield parse_times(chunk, time_cols)
+
+
+def iter_mes(path: str | Path = DATA_DIR / "mes.csv", chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Stream MES execution data in typed chunks of `chunksize` rows."""
+    return _iter_csv(path, MES_DTYPES, MES_TIME_COLS, chunksize)
+
+
+def iter_erp(path: str | Path = DATA_DIR / "erp.csv", chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Stream ERP planning data in typed chunks of `chunksize` rows."""
+    return _iter_csv(path, ERP_DTYPES, ERP_TIME_COLS, chunksize)
+
+
+def _is_parquet(path: str | Path) -> bool:
+    return Path(path).suffix == ".parquet"
+
+
+def _read(path: str | Path, dtypes: dict, time_cols: list[str], columns: list[str] = None,
+          filters: list = None) -> pd.DataFrame:
+    if _is_parquet(path):
+        # Parquet keeps its own types; only the requested columns/row groups are read.
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+        return df.astype({col: dtype for col, dtype in dtypes.items() if col in df})
+    df = pd.read_csv(path, usecols=columns, dtype=dtypes)
+    return parse_times(df, [col for col in time_cols if col in df])
+
+
+def load_mes(path: str | Path = DATA_DIR / "mes.csv", columns: list[str] = None) -> pd.DataFrame:
+    """Load MES execution data (CSV or Parquet) with parsed timestamps."""
+    return _read(path, MES_DTYPES, MES_TIME_COLS, columns)
+
+
+def load_erp(path: str | Path = DATA_DIR / "erp.csv", columns: list[str] = None, start=None, end=None) -> pd.DataFrame:
+    """Load ERP planning data (CSV or Parquet), optionally only plans with start <= planned_end < end."""
+    filters = []
+    if start is not None:
+        filters.append(("planned_end", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("planned_end", "<", pd.Timestamp(end)))
+    read_cols = None if columns is None else list(dict.fromkeys(columns + (["planned_end"] if filters else [])))
+    df = _read(path, ERP_DTYPES, ERP_TIME_COLS, read_cols, filters or None)
+    if filters and not _is_parquet(path):
+        df = df[df["planned_end"] >= pd.Timestamp(start)] if start is not None else df
+        df = df[df["planned_end"] < pd.Timestamp(end)] if end is not None else df
+        df = df.reset_index(drop=True)
+    return df[columns] if columns is not None else df
+
+
 if __name__ == "__main__":
     mes = load_mes()
     erp = load_erp()
@@ -0,0 +1,264 @@
+"""Time-indexed query layer over unified orders for the KPI dashboards.
+
+`OrderIndex` holds the unified table as plain numpy arrays sorted by
+planned_end, so that:
+
+- a planned_end window is two binary searches (`range`, `count`);
+- an order_id lookup is a binary search through an argsort of the ids
+  (`orders`);
+- hour / day / week buckets (`buckets`) come from prefix sums. Each bucket
+  costs two searches and a subtraction, however many orders it holds;
+- the most delayed or most scrapped orders (`top`) come from a precomputed
+  ranking. Narrow windows are sorted directly instead.
+
+Timestamps are int64 microseconds (NaT is the smallest int64, so it sorts
+first and falls outside every window). `save` writes one .npy file per
+array, and `load` memory-maps them, so a dashboard process only pages in
+what its queries touch.
+
+    index = OrderIndex.build(iter_unified(mes_path, erp_path))   # or OrderIndex.from_store(path)
+    index.save("results/order_index")
+    index = OrderIndex.load("results/order_index")
+    index.buckets("day", start="2024-09-01", end="2024-10-01")
+"""
+import json
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from integrate import RESULTS_DIR, add_derived_columns, load_unified
+
+INDEX_DIR = RESULTS_DIR / "order_index"
+META_FILE = "index.json"
+TIME_COLUMNS = ["planned_start", "planned_end", "start_time", "end_time"]
+QTY_COLUMNS = ["planned_qty", "produced_qty", "defect_qty"]
+# The unified table's base columns, in its order; derived columns are recomputed on the way out.
+COLUMNS = ["order_id", "planned_qty", "planned_start", "planned_end",
+           "produced_qty", "defect_qty", "start_time", "end_time"]
+US_PER_HOUR = 3600 * 10**6
+FREQS = {"hour": np.int64(US_PER_HOUR), "day": np.int64(24 * US_PER_HOUR), "week": np.int64(7 * 24 * US_PER_HOUR)}
+# 1970-01-01 was a Thursday; weeks start on Monday.
+WEEK_OFFSET = np.int64(3 * 24 * US_PER_HOUR)
+NAT = np.iinfo(np.int64).min
+# `top` rankings and the per-order metric each one sorts by.
+RANKINGS = {"delay": "delay_hours", "scrap": "scrap_rate"}
+
+
+def _id_bytes(ids) -> np.ndarray:
+    ids = np.asarray(pd.Series(ids).astype(str), dtype=object)
+    try:
+        return ids.astype("S")
+    except UnicodeEncodeError:
+        return np.array([value.encode("utf-8") for value in ids], dtype="S")
+
+
+def _us(values) -> np.ndarray:
+    return pd.Series(values).to_numpy("datetime64[us]").view(np.int64)
+
+
+def _timestamp_us(value) -> int:
+    return int(pd.Timestamp(value).to_datetime64().astype("datetime64[us]").view(np.int64))
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(values) + 1, dtype=values.dtype)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def _metrics(arrays: dict, lo: int = 0, hi: int = None) -> dict:
+    """Per-order plan fulfillment, delay (hours) and scrap rate of rows lo:hi; NaN where unknown."""
+    planned = np.asarray(arrays["planned_qty"][lo:hi], dtype=np.float64)
+    produced = np.asarray(arrays["produced_qty"][lo:hi], dtype=np.float64)
+    defects = np.asarray(arrays["defect_qty"][lo:hi], dtype=np.float64)
+    end_time = np.asarray(arrays["end_time"][lo:hi])
+    planned_end = np.asarray(arrays["planned_end"][lo:hi])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fulfillment = produced / planned
+        scrap = np.where(produced != 0, defects / produced, np.nan)
+    delay = np.where((end_time == NAT) | (planned_end == NAT), np.nan, (end_time - planned_end) / US_PER_HOUR)
+    return {"plan_fulfillment": fulfillment, "delay_hours": delay, "scrap_rate": scrap}
+
+
+def _ranked(values: np.ndarray) -> np.ndarray:
+    """Positions of the finite `values`, largest first; equal values keep position order."""
+    positions = np.flatnonzero(np.isfinite(values))
+    return positions[np.argsort(-values[positions], kind="stable")]
+
+
+class OrderIndex:
+    """Unified orders sorted by planned_end, with an order_id index, prefix sums and rankings."""
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        planned_end = arrays["planned_end"]
+        # Rows with no planned_end sort first and are outside every window.
+        self._first_dated = int(np.searchsorted(planned_end, NAT, side="right"))
+
+    def __len__(self) -> int:
+        return len(self.arrays["planned_end"])
+
+    @classmethod
+    def build(cls, unified: pd.DataFrame | Iterable[pd.DataFrame]) -> "OrderIndex":
+        """Index a unified DataFrame, or the chunks of `integrate.iter_unified` without holding them as frames."""
+        parts = {col: [] for col in COLUMNS}
+        for chunk in [unified] if isinstance(unified, pd.DataFrame) else unified:
+            parts["order_id"].append(_id_bytes(chunk["order_id"]))
+            for col in TIME_COLUMNS:
+                parts[col].append(_us(chunk[col]))
+            for col in QTY_COLUMNS:
+                parts[col].append(chunk[col].to_numpy(np.int32))
+        if not parts["order_id"]:
+            return cls.build(pd.DataFrame({col: [] for col in COLUMNS}))
+        columns = {col: np.concatenate(values) for col, values in parts.items()}
+
+        order = np.argsort(columns["planned_end"], kind="stable")
+        arrays = {col: values[order] for col, values in columns.items()}
+        del columns
+        arrays["id_order"] = np.argsort(arrays["order_id"])
+
+        for col in QTY_COLUMNS:
+            arrays[f"sum_{col}"] = _prefix(arrays[col].astype(np.int64))
+        metrics = _metrics(arrays)
+        for name, values in metrics.items():
+            valid = np.isfinite(values)
+            arrays[f"sum_{name}"] = _prefix(np.where(valid, values, 0.0))
+            arrays[f"n_{name}"] = _prefix(valid.astype(np.int64))
+        for by, name in RANKINGS.items():
+            arrays[f"by_{by}"] = _ranked(metrics[name])
+        return cls(arrays)
+
+    @classmethod
+    def from_store(cls, path: str | Path, start=None, end=None) -> "OrderIndex":
+        """Index the unified table saved at `path` (CSV or Parquet), optionally one planned_end window."""
+        return cls.build(load_unified(path, columns=COLUMNS, start=start, end=end))
+
+    def save(self, path: str | Path = INDEX_DIR) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, values in self.arrays.items():
+            np.save(path / f"{name}.npy", values)
+        (path / META_FILE).write_text(json.dumps({"rows": len(self), "arrays": sorted(self.arrays)}))
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path = INDEX_DIR, mmap_mode: str = "r") -> "OrderIndex":
+        path = Path(path)
+        meta = json.loads((path / META_FILE).read_text())
+        return cls({name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode) for name in meta["arrays"]})
+
+    def _bounds(self, start=None, end=None) -> tuple[int, int]:
+        planned_end = self.arrays["planned_end"]
+        lo = self._first_dated if start is None else max(
+            self._first_dated, int(np.searchsorted(planned_end, _timestamp_us(start), side="left")))
+        hi = len(self) if end is None else int(np.searchsorted(planned_end, _timestamp_us(end), side="left"))
+        return lo, max(lo, hi)
+
+    def _frame(self, positions) -> pd.DataFrame:
+        """Unified rows at `positions` (a slice or index array), with the derived KPI columns."""
+        frame = pd.DataFrame({"order_id": self.arrays["order_id"][positions].astype(str)})
+        for col in COLUMNS[1:]:
+            values = np.asarray(self.arrays[col][positions])
+            frame[col] = values.view("datetime64[us]") if col in TIME_COLUMNS else values
+        return add_derived_columns(frame)
+
+    def span(self) -> tuple:
+        """(first, last) planned_end, or (None, None) for an index without dated orders."""
+        if self._first_dated == len(self):
+            return None, None
+        planned_end = self.arrays["planned_end"]
+        return (pd.Timestamp(planned_end[self._first_dated], unit="us"), pd.Timestamp(planned_end[-1], unit="us"))
+
+    def count(self, start=None, end=None) -> int:
+        """Orders with start <= planned_end < end."""
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def range(self, start=None, end=None, limit: int = None) -> pd.DataFrame:
+        """Orders with start <= planned_end < end in planned_end order, the first `limit` if given."""
+        lo, hi = self._bounds(start, end)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return self._frame(slice(lo, hi))
+
+    def orders(self, order_ids) -> pd.DataFrame:
+        """Unified rows of `order_ids`, in the order asked; unknown ids are left out."""
+        ids, id_order = self.arrays["order_id"], self.arrays["id_order"]
+        wanted = _id_bytes(order_ids)
+        if len(ids) == 0 or len(wanted) == 0:
+            return self._frame(np.empty(0, dtype=np.int64))
+        pos = np.minimum(np.searchsorted(ids, wanted, sorter=id_order), len(ids) - 1)
+        rows = np.asarray(id_order[pos])
+        return self._frame(rows[ids[rows] == wanted])
+
+    def buckets(self, freq: str = "day", start=None, end=None) -> pd.DataFrame:
+        """Per hour / day / week of planned_end: order count, quantity totals and KPI means.
+
+        Buckets start on the hour, at midnight, or at Monday midnight. With a
+        window, the first and last buckets only count orders inside it. The
+        means leave out non-finite ratios and orders without an end_time.
+        Empty buckets are kept, with zero counts and NaN means.
+        """
+        if freq not in FREQS:
+            raise ValueError(f"Unknown bucket frequency {freq!r}, expected one of {sorted(FREQS)}")
+        columns = ["bucket", "orders", *QTY_COLUMNS, "plan_fulfillment", "delay_hours", "scrap_rate"]
+        lo, hi = self._bounds(start, end)
+        if lo == hi:
+            return pd.DataFrame(columns=columns)
+        planned_end, step = self.arrays["planned_end"], FREQS[freq]
+        offset = WEEK_OFFSET if freq == "week" else np.int64(0)
+        first = (int(planned_end[lo]) + offset) // step * step - offset
+        edges = np.arange(first, int(planned_end[hi - 1]) + step, step, dtype=np.int64)
+        # Row bounds of every bucket: bucket i is rows bounds[i]:bounds[i + 1].
+        inner = np.clip(np.searchsorted(planned_end, edges[1:], side="left"), lo, hi)
+        bounds = np.concatenate([[lo], inner, [hi]])
+
+        def total(name):
+            sums = self.arrays[name]
+            return np.asarray(sums[bounds[1:]] - sums[bounds[:-1]])
+
+        def mean(name):
+            n = total(f"n_{name}")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(n > 0, total(f"sum_{name}") / n, np.nan)
+
+        return pd.DataFrame({
+            "bucket": edges.view("datetime64[us]"),
+            "orders": np.diff(bounds),
+            **{col: total(f"sum_{col}") for col in QTY_COLUMNS},
+            "plan_fulfillment": mean("plan_fulfillment"),
+            "delay_hours": mean("delay_hours"),
+            "scrap_rate": mean("scrap_rate"),
+        }, columns=columns)
+
+    def top(self, n: int = 10, by: str = "delay", start=None, end=None) -> pd.DataFrame:
+        """The `n` most delayed (`by="delay"`) or highest-scrap (`by="scrap"`) orders in a planned_end window.
+
+        Orders without a value (no end_time, nothing produced) are never
+        returned; ties keep planned_end order.
+        """
+        if by not in RANKINGS:
+            raise ValueError(f"Unknown ranking {by!r}, expected one of {sorted(RANKINGS)}")
+        lo, hi = self._bounds(start, end)
+        ranked = self.arrays[f"by_{by}"]
+        width = hi - lo
+        if width == 0 or n <= 0:
+            return self._frame(np.empty(0, dtype=np.int64))
+        if width * width <= n * len(ranked):
+            # Narrow window: sorting it is cheaper than scanning the ranking for its members.
+            picked = lo + _ranked(_metrics(self.arrays, lo, hi)[RANKINGS[by]])[:n]
+        else:
+            # Wide window: about n * len / width ranked orders need a look before n fall inside it.
+            block = max(1024, 4 * n * len(ranked) // width)
+            found, hits = [], 0
+            for i in range(0, len(ranked), block):
+                chunk = np.asarray(ranked[i:i + block])
+                found.append(chunk[(chunk >= lo) & (chunk < hi)])
+                hits += len(found[-1])
+                if hits >= n:
+                    break
+            picked = np.concatenate(found)[:n]
+        return self._frame(picked)
+
@@ -0,0 +1,184 @@
+"""Storage backends for the unified order table.
+
+`get_store(path)` picks the backend from the path: `*.csv` is a single CSV
+file, anything else (e.g. `results/unified.parquet`) is a Parquet dataset
+partitioned by planned_end date (per day or per month). Both expose the same
+`write` / `read` interface; `read` takes a column list and a planned_end
+window, which the Parquet backend pushes down to skip whole partitions and
+row groups. `upsert` replaces individual orders; the Parquet backend rewrites
+only the partitions those orders fall in.
+"""
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PARTITION_COL = "planned_end_date"
+PARTITION_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+# Underscore-prefixed files are ignored by Parquet dataset discovery.
+FORMAT_FILE = "_partition_format"
+TIME_COLS = ["planned_start", "planned_end", "start_time", "end_time"]
+INT_COLS = ["planned_qty", "produced_qty", "defect_qty"]
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    for col in TIME_COLS:
+        if col in df and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format="ISO8601")
+    for col in INT_COLS:
+        if col in df:
+            df[col] = df[col].astype("int32")
+    return df
+
+
+def _window_mask(planned_end: pd.Series, start=None, end=None) -> pd.Series:
+    mask = pd.Series(True, index=planned_end.index)
+    if start is not None:
+        mask &= planned_end >= pd.Timestamp(start)
+    if end is not None:
+        mask &= planned_end < pd.Timestamp(end)
+    return mask
+
+
+class CsvStore:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def write(self, df: pd.DataFrame) -> Path:
+        df.to_csv(self.path, index=False)
+        return self.path
+
+    def read(self, columns: list[str] = None, start=None, end=None) -> pd.DataFrame:
+        """Read `columns` (default all) for orders with start <= planned_end < end."""
+        filtered = start is not None or end is not None
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(columns + (["planned_end"] if filtered else [])))
+        df = _typed(pd.read_csv(self.path, usecols=usecols, dtype={"order_id": "category"}))
+        if filtered:
+            df = df[_window_mask(df["planned_end"], start, end)].reset_index(drop=True)
+        return df[columns] if columns is not None else df
+
+    def read_orders(self, order_ids, planned_end: pd.Series = None) -> pd.DataFrame:
+        """Stored rows for `order_ids`; `planned_end` is only used by the Parquet backend."""
+        df = self.read()
+        return df[df["order_id"].astype(str).isin(np.asarray(order_ids))].reset_index(drop=True)
+
+    def upsert(self, rows: pd.DataFrame, replaced: pd.DataFrame) -> Path:
+        """Drop the stored orders listed in `replaced` (order_id, planned_end) and add `rows`."""
+        if not self.path.exists():
+            return self.write(rows)
+        df = self.read()
+        keep = ~df["order_id"].astype(str).isin(replaced["order_id"].to_numpy())
+        return self.write(pd.concat([df[keep], rows], ignore_index=True))
+
+
+class ParquetStore:
+    def __init__(self, root: str | Path, partition: str = None, compression: str = "zstd"):
+        """`partition` is "day" or "month"; None keeps the dataset's existing layout (default day)."""
+        self.root = Path(root)
+        self.partition = partition
+        self.compression = compression
+
+    def _partition_format(self) -> str:
+        format_file = self.root / FORMAT_FILE
+        existing = format_file.read_text() if format_file.exists() else None
+        if self.partition is None:
+            return existing or PARTITION_FORMATS["day"]
+        fmt = PARTITION_FORMATS[self.partition]
+        if existing is not None and existing != fmt:
+            raise ValueError(f"{self.root} is already partitioned with {existing!r}")
+        return fmt
+
+    def write(self, df: pd.DataFrame) -> Path:
+        """Write `df`, replacing only the planned_end dates it contains."""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        fmt = self._partition_format()
+        # Plain strings rather than a categorical, so partitions rewritten later share one schema.
+        df = _typed(df.copy()).astype({"order_id": str})
+        table = pa.Table.from_pandas(
+            df.assign(**{PARTITION_COL: df["planned_end"].dt.strftime(fmt)}), preserve_index=False
+        )
+        ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=self._partitioning(),
+            existing_data_behavior="delete_matching",
+            file_options=ds.ParquetFileFormat().make_write_options(compression=self.compression),
+        )
+        (self.root / FORMAT_FILE).write_text(fmt)
+        return self.root
+
+    def read(self, columns: list[str] = None, start=None, end=None) -> pd.DataFrame:
+        """Read `columns` (default all) for orders with start <= planned_end < end."""
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.root, format="parquet", partitioning=self._partitioning())
+        fmt = self._partition_format()
+        predicate = None
+        if start is not None:
+            start = pd.Timestamp(start)
+            predicate = (ds.field(PARTITION_COL) >= start.strftime(fmt)) & (ds.field("planned_end") >= start)
+        if end is not None:
+            end = pd.Timestamp(end)
+            upper = (ds.field(PARTITION_COL) <= end.strftime(fmt)) & (ds.field("planned_end") < end)
+            predicate = upper if predicate is None else predicate & upper
+        if columns is None:
+            columns = [name for name in dataset.schema.names if name != PARTITION_COL]
+        df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+        return df.astype({"order_id": "category"}) if "order_id" in df else df
+
+    def _partition_keys(self, planned_end: pd.Series) -> set:
+        return set(planned_end.dropna().dt.strftime(self._partition_format()))
+
+    def _read_partitions(self, keys: set, order_ids=None) -> pd.DataFrame:
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.root, format="parquet", partitioning=self._partitioning())
+        predicate = ds.field(PARTITION_COL).isin(sorted(keys))
+        if order_ids is not None:
+            predicate &= ds.field("order_id").isin(list(order_ids))
+        columns = [name for name in dataset.schema.names if name != PARTITION_COL]
+        return dataset.to_table(columns=columns, filter=predicate).to_pandas()
+
+    def read_orders(self, order_ids, planned_end: pd.Series = None) -> pd.DataFrame:
+        """Stored rows for `order_ids`, looking only in the partitions of their `planned_end` dates."""
+        keys = self._partition_keys(planned_end) if planned_end is not None else None
+        if not keys or not self.root.exists():
+            return pd.DataFrame(columns=["order_id", "planned_end"])
+        return self._read_partitions(keys, order_ids)
+
+    def upsert(self, rows: pd.DataFrame, replaced: pd.DataFrame) -> Path:
+        """Drop the stored orders listed in `replaced` (order_id, planned_end) and add `rows`.
+
+        Only partitions holding a replaced or a new row are read and rewritten.
+        """
+        keys = self._partition_keys(rows["planned_end"]) | self._partition_keys(replaced["planned_end"])
+        if not keys:
+            return self.root
+        if self.root.exists():
+            existing = self._read_partitions(keys)
+            keep = ~existing["order_id"].astype(str).isin(replaced["order_id"].to_numpy())
+            rows = pd.concat([existing[keep], rows], ignore_index=True)
+        if len(rows):
+            self.write(rows)
+        # write_dataset only replaces partitions it writes to; drop the ones left empty.
+        for key in keys - self._partition_keys(rows["planned_end"]):
+            shutil.rmtree(self.root / f"{PARTITION_COL}={key}", ignore_errors=True)
+        return self.root
+
+    @staticmethod
+    def _partitioning():
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        return ds.partitioning(pa.schema([(PARTITION_COL, pa.string())]), flavor="hive")
+
+
+def get_store(path: str | Path, partition: str = None):
+    path = Path(path)
+    return CsvStore(path) if path.suffix == ".csv" else ParquetStore(path, partition)
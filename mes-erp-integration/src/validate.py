@@ -1,5 +1,10 @@
 import logging
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
 import pandas as pd
 
 RESULTS_DIR = Path(__file__).resolve().parent.parent / "results"
@@ -13,28 +18,209 @@ logging.basicConfig(
 )
 
 
+class ValidationError(ValueError):
+    """Raised by a RuleEngine in "fail" mode when a chunk breaks a rule."""
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A row-level check: `check(df)` is a boolean mask of the rows that break it."""
+
+    name: str
+    message: str
+    column: str
+    check: Callable[[pd.DataFrame], pd.Series]
+
+
+MES_RULES = [
+    Rule("missing_order_id", "MES: missing order_id", "order_id", lambda df: df["order_id"].isna()),
+    Rule("negative_produced_qty", "MES: negative produced_qty", "produced_qty", lambda df: df["produced_qty"] < 0),
+    Rule("negative_defect_qty", "MES: negative defect_qty", "defect_qty", lambda df: df["defect_qty"] < 0),
+    Rule("end_before_start", "MES: end_time before start_time", "end_time", lambda df: df["end_time"] < df["start_time"]),
+]
+ERP_RULES = [
+    Rule("missing_order_id", "ERP: missing order_id", "order_id", lambda df: df["order_id"].isna()),
+    Rule("negative_planned_qty", "ERP: negative planned_qty", "planned_qty", lambda df: df["planned_qty"] < 0),
+    Rule("end_before_start", "ERP: planned_end before planned_start", "planned_end",
+         lambda df: df["planned_end"] < df["planned_start"]),
+]
+RULES = {"mes": MES_RULES, "erp": ERP_RULES}
+# An order has one plan, but may run as several MES executions (splits, reworks).
+UNIQUE_ORDER_IDS = {"erp"}
+MODES = ("report", "drop", "quarantine", "fail")
+VIOLATION_COLUMNS = ["source", "row", "order_id", "rule", "value"]
+
+
+class ViolationLog:
+    """Row-level violations (source, row, order_id, rule, value) streamed to one Parquet file."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._writer = None
+
+    def write(self, violations: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(violations[VIOLATION_COLUMNS], preserve_index=False)
+        # Rule and source names repeat on every row; dictionary encoding keeps them to a few bytes.
+        table = table.cast(pa.schema([
+            ("source", pa.dictionary(pa.int8(), pa.string())),
+            ("row", pa.int64()),
+            ("order_id", pa.string()),
+            ("rule", pa.dictionary(pa.int8(), pa.string())),
+            ("value", pa.string()),
+        ]))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RuleEngine:
+    """Evaluate one source's rules over a stream of chunks.
+
+    Every rule is a vectorized mask computed once per chunk. On top of the
+    declarative rules the engine flags order_ids already seen in this or an
+    earlier chunk in sources listed in UNIQUE_ORDER_IDS (a sorted array of
+    64-bit hashes, 8 bytes per order) and, given `known_ids` (the ERP
+    order_ids), MES rows without a plan.
+
+    `mode` decides what happens to offending rows: "report" keeps them,
+    "drop" removes them, "quarantine" removes them and appends them to
+    `quarantine_path`, "fail" raises ValidationError.
+    """
+
+    def __init__(self, source: str, mode: str = "report", violations: ViolationLog = None,
+                 quarantine_path: str | Path = None, known_ids: pd.Index = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown validation mode {mode!r}, expected one of {MODES}")
+        if mode == "quarantine" and quarantine_path is None:
+            raise ValueError("quarantine mode needs a quarantine_path")
+        label = source.upper()
+        self.source = source
+        self.mode = mode
+        self.violations = violations
+        self.quarantine_path = Path(quarantine_path) if quarantine_path is not None else None
+        self.rules = list(RULES[source])
+        if source in UNIQUE_ORDER_IDS:
+            self.rules.append(Rule("duplicate_order_id", f"{label}: duplicate order_id", "order_id", self._duplicates))
+        if known_ids is not None:
+            self._known = pd.Index(known_ids.astype(str)).unique()
+            self.rules.append(Rule("orphan_order_id", f"{label}: order_id without ERP plan", "order_id", self._orphans))
+        self._seen = np.empty(0, dtype=np.uint64)
+        self._quarantine = None
+        self.rows = 0
+        self.counts = dict.fromkeys((rule.name for rule in self.rules), 0)
+        self.seconds = dict.fromkeys(self.counts, 0.0)
+
+    def _duplicates(self, df: pd.DataFrame) -> np.ndarray:
+        # Hashing the column directly hashes each category once; values match across chunks.
+        hashes = pd.util.hash_pandas_object(df["order_id"], index=False).to_numpy()
+        repeated = pd.Series(hashes).duplicated().to_numpy()
+        if len(self._seen):
+            pos = np.minimum(np.searchsorted(self._seen, hashes), len(self._seen) - 1)
+            repeated = repeated | (self._seen[pos] == hashes)
+        # Both halves are sorted, so the stable sort (timsort) is a linear merge.
+        self._seen = np.sort(np.concatenate([self._seen, np.unique(hashes[~repeated])]), kind="stable")
+        return repeated & df["order_id"].notna().to_numpy()
+
+    def _orphans(self, df: pd.DataFrame) -> np.ndarray:
+        return (self._known.get_indexer(df["order_id"].astype(str)) < 0) & df["order_id"].notna().to_numpy()
+
+    def check(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Evaluate every rule on `chunk` and return the rows to pass on."""
+        bad = np.zeros(len(chunk), dtype=bool)
+        found = []
+        for rule in self.rules:
+            start = time.perf_counter()
+            mask = np.asarray(rule.check(chunk), dtype=bool)
+            self.seconds[rule.name] += time.perf_counter() - start
+            if mask.any():
+                self.counts[rule.name] += int(mask.sum())
+                bad |= mask
+                found.append((rule, mask))
+        offset, self.rows = self.rows, self.rows + len(chunk)
+        if not found:
+            return chunk
+        if self.violations is not None:
+            self.violations.write(pd.concat([self._rows(chunk, offset, rule, mask) for rule, mask in found]))
+        if self.mode == "fail":
+            summary = ", ".join(f"{rule.name}: {int(mask.sum())}" for rule, mask in found)
+            raise ValidationError(f"{self.source} rows {offset}-{self.rows - 1} break rules ({summary})")
+        if self.mode == "quarantine":
+            self._write_quarantine(chunk[bad], found, bad)
+        return chunk if self.mode == "report" else chunk[~bad]
+
+    def _rows(self, chunk: pd.DataFrame, offset: int, rule: Rule, mask: np.ndarray) -> pd.DataFrame:
+        hits = np.flatnonzero(mask)
+        return pd.DataFrame({
+            "source": self.source,
+            "row": offset + hits,
+            "order_id": chunk["order_id"].iloc[hits].astype(str).to_numpy(),
+            "rule": rule.name,
+            "value": chunk[rule.column].iloc[hits].astype(str).to_numpy(),
+        })
+
+    def _write_quarantine(self, rows: pd.DataFrame, found: list, bad: np.ndarray):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        names = np.full(len(rows), "", dtype=object)
+        for rule, mask in found:
+            hit = mask[bad]
+            names[hit] = np.where(names[hit] == "", rule.name, names[hit] + "," + rule.name)
+        rows = rows.astype({"order_id": str}).assign(rules=names)
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+        if self._quarantine is None:
+            self._quarantine = pq.ParquetWriter(self.quarantine_path, table.schema, compression="zstd")
+        self._quarantine.write_table(table.cast(self._quarantine.schema))
+
+    def messages(self) -> list[str]:
+        """One legacy error string per rule that was broken at least once."""
+        return [rule.message for rule in self.rules if self.counts[rule.name]]
+
+    def stats(self) -> dict:
+        return {
+            rule: {"violations": self.counts[rule], "seconds": round(self.seconds[rule], 4)}
+            for rule in self.counts
+        }
+
+    def close(self):
+        if self._quarantine is not None:
+            self._quarantine.close()
+            self._quarantine = None
+
+
+def _check_frame(df: pd.DataFrame, source: str) -> list[str]:
+    engine = RuleEngine(source)
+    engine.check(df)
+    return engine.messages()
+
+
 def validate_mes(df: pd.DataFrame) -> list[str]:
-    errors = []
-    if df["order_id"].isna().any():
-        errors.append("MES: missing order_id")
-    if (df["produced_qty"] < 0).any():
-        errors.append("MES: negative produced_qty")
-    if (df["defect_qty"] < 0).any():
-        errors.append("MES: negative defect_qty")
-    if (df["end_time"] < df["start_time"]).any():
-        errors.append("MES: end_time before start_time")
-    return errors
+    return _check_frame(df, "mes")
 
 
 def validate_erp(df: pd.DataFrame) -> list[str]:
-    errors = []
-    if df["order_id"].isna().any():
-        errors.append("ERP: missing order_id")
-    if (df["planned_qty"] < 0).any():
-        errors.append("ERP: negative planned_qty")
-    if (df["planned_end"] < df["planned_start"]).any():
-        errors.append("ERP: planned_end before planned_start")
-    return errors
+    return _check_frame(df, "erp")
+
+
+def validate_stream(
+    chunks: Iterator[pd.DataFrame],
+    validator: Callable[[pd.DataFrame], list[str]],
+    errors: list[str],
+) -> Iterator[pd.DataFrame]:
+    """Validate chunks as they stream past, appending each distinct error to `errors` once."""
+    for chunk in chunks:
+        for err in validator(chunk):
+            if err not in errors:
+                errors.append(err)
+        yield chunk
 
 
 def log_errors(errors: list[str]) -> None:
@@ -45,6 +231,14 @@ def log_errors(errors: list[str]) -> None:
         logging.error(err)
 
 
+def log_engines(*engines: RuleEngine) -> None:
+    """Log the broken rules of each engine, then per-rule violation counts and timings."""
+    log_errors([msg for engine in engines for msg in engine.messages()])
+    for engine in engines:
+        for rule, stat in engine.stats().items():
+            logging.info("%s %s: %d violations in %.4fs", engine.source, rule, stat["violations"], stat["seconds"])
+
+
 if __name__ == "__main__":
     from load import load_mes, load_erp
 
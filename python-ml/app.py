@@ -1,11 +1,127 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Union
+import asyncio
+import os
+import time
 import uvicorn
+import columnar
+from batcher import MicroBatcher
+from drift import DriftMonitor
+from executor import make_executor
+from metrics import REQUEST_SECONDS, STAGE_SECONDS, SlowCallProfiler, render
 from ml_service import MLService
+from model_budget import Budget
+from prediction_cache import PredictionCache, parse_quantization
+from sensitivity import SensitivityEngine, iter_ndjson
 
-app = FastAPI(title="AI Production ML Service", version="1.0.0")
+# ML_CACHE_SIZE=0 disables the prediction cache.
+CACHE_SIZE = int(os.environ.get("ML_CACHE_SIZE", "100000"))
+cache = PredictionCache(
+    max_entries=CACHE_SIZE,
+    ttl_seconds=float(os.environ.get("ML_CACHE_TTL_S", "300")),
+    quantization=parse_quantization(os.environ.get("ML_CACHE_QUANTIZE", "")),
+) if CACHE_SIZE > 0 else None
+
+# Drift of incoming traffic vs the training data is checked every ML_DRIFT_INTERVAL_S (0 disables it).
+DRIFT_INTERVAL_S = float(os.environ.get("ML_DRIFT_INTERVAL_S", "60"))
+monitor = DriftMonitor(
+    min_rows=int(os.environ.get("ML_DRIFT_MIN_ROWS", "500")),
+    psi_alert=float(os.environ.get("ML_DRIFT_PSI_ALERT", "0.2")),
+) if DRIFT_INTERVAL_S > 0 else None
+
+# ML_PROFILE_SAMPLE > 0 cProfiles that fraction of scoring calls and keeps the slowest ML_PROFILE_KEEP dumps.
+PROFILE_SAMPLE = float(os.environ.get("ML_PROFILE_SAMPLE", "0"))
+profiler = SlowCallProfiler(
+    os.environ.get("ML_PROFILE_DIR", "profiles"), PROFILE_SAMPLE, int(os.environ.get("ML_PROFILE_KEEP", "20"))
+) if PROFILE_SAMPLE > 0 else None
+
+# ML_FAST_BOOT=1 answers /health/live at once and loads the model in the background; model routes
+# return 503 until /health/ready does, and an empty registry waits for POST /train instead of
+# training on boot. ML_FAST_BOOT=0 loads (or trains) the model before the server starts.
+FAST_BOOT = os.environ.get("ML_FAST_BOOT", "1") == "1"
+# Synthetic rows scored once after loading so the first real request does not pay first-use costs.
+WARMUP_ROWS = int(os.environ.get("ML_WARMUP_ROWS", "256"))
+BOOT_START = time.perf_counter()
+boot = {"state": "starting", "version": None, "error": None, "load_s": None, "ready_s": None}
+
+ml_service = MLService(
+    model_dir=os.environ.get("ML_MODEL_DIR", "models"), backend=os.environ.get("ML_BACKEND", "sklearn"),
+    cache=cache, monitor=monitor, profiler=profiler, auto_train=not FAST_BOOT, load=not FAST_BOOT,
+)
+sensitivity = SensitivityEngine(ml_service, max_surfaces=int(os.environ.get("ML_SENSITIVITY_CACHE", "64")))
+# "inline" scores in threads of this process, "process" in ML_WORKERS worker processes.
+executor = make_executor(
+    os.environ.get("ML_EXECUTOR", "inline"), ml_service, int(os.environ.get("ML_WORKERS", "0")) or None,
+    WARMUP_ROWS,
+)
+
+# /train defaults: model family and the budget every candidate must meet (empty = unlimited).
+TRAIN_MODEL = os.environ.get("ML_TRAIN_MODEL", "random_forest")
+TRAIN_P99_MS = float(os.environ["ML_TRAIN_P99_MS"]) if os.environ.get("ML_TRAIN_P99_MS") else None
+TRAIN_MAX_MB = float(os.environ["ML_TRAIN_MAX_MB"]) if os.environ.get("ML_TRAIN_MAX_MB") else None
+
+# Set ML_BATCH_WINDOW_MS=0 to score every /predict call on its own.
+BATCH_WINDOW_MS = float(os.environ.get("ML_BATCH_WINDOW_MS", "2"))
+MAX_BATCH_SIZE = int(os.environ.get("ML_MAX_BATCH_SIZE", "256"))
+batcher = (
+    MicroBatcher(executor.predict_batch, BATCH_WINDOW_MS, MAX_BATCH_SIZE, executor.max_concurrency)
+    if BATCH_WINDOW_MS > 0 else None
+)
+
+
+def mark_ready(version: str):
+    boot.update(state="ready", version=version, error=None)
+    if boot["ready_s"] is None:
+        boot["ready_s"] = time.perf_counter() - BOOT_START
+
+
+async def load_model():
+    """Load and warm the current model, then start the executor; records progress in `boot`."""
+    boot["state"] = "loading"
+    start = time.perf_counter()
+    try:
+        version = await asyncio.to_thread(ml_service.load, WARMUP_ROWS)
+        await executor.start()
+    except Exception as e:
+        boot.update(state="failed", error=str(e))
+        raise
+    boot["load_s"] = time.perf_counter() - start
+    if version is None:
+        boot["state"] = "no_model"
+    else:
+        mark_ready(version)
+
+
+async def check_drift():
+    while True:
+        await asyncio.sleep(DRIFT_INTERVAL_S)
+        await asyncio.to_thread(monitor.check)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if FAST_BOOT:
+        boot_task = asyncio.create_task(load_model())
+    else:
+        await load_model()
+    if batcher is not None:
+        await batcher.start()
+    drift_task = asyncio.create_task(check_drift()) if monitor is not None else None
+    yield
+    if FAST_BOOT:
+        boot_task.cancel()
+    if drift_task is not None:
+        drift_task.cancel()
+    if batcher is not None:
+        await batcher.stop()
+    executor.shutdown()
+
+
+app = FastAPI(title="AI Production ML Service", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,7 +131,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-ml_service = MLService()
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded.
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.method,
+                                route.path if route else "unmatched", status)
 
 
 class PredictionInput(BaseModel):
@@ -42,61 +171,246 @@ class TemperatureCurvePoint(BaseModel):
     defect_probability: float
 
 
+def require_model():
+    if boot["state"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Model not ready ({boot['state']})",
+                            headers={"Retry-After": "1"})
+
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "model_loaded": ml_service.is_loaded()}
+    return {"status": "healthy", "model_loaded": ml_service.is_loaded(), **boot}
+
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving HTTP; says nothing about the model."""
+    return {"status": "alive"}
+
 
+@app.get("/health/ready")
+def readiness():
+    """200 once a model is loaded and warmed, 503 while loading or with an empty registry."""
+    if boot["state"] != "ready":
+        raise HTTPException(status_code=503, detail=boot)
+    return boot
 
-@app.post("/predict", response_model=PredictionOutput)
-def predict(input_data: PredictionInput):
+
+@app.post("/predict", response_model=PredictionOutput, dependencies=[Depends(require_model)])
+async def predict(input_data: PredictionInput):
     try:
-        result = ml_service.predict(
-            temperature=input_data.temperature,
-            line_speed=input_data.line_speed,
-            shift=input_data.shift,
-            operator_experience=input_data.operator_experience,
-            machine_age=input_data.machine_age
-        )
-        return PredictionOutput(**result)
+        with STAGE_SECONDS.time("parse"):
+            row = input_data.model_dump()
+        if batcher is not None:
+            result = await batcher.submit(row)
+        else:
+            result = (await executor.predict_batch({col: [value] for col, value in row.items()}))[0]
+        with STAGE_SECONDS.time("serialize"):
+            return PredictionOutput(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/predict/batch", response_model=List[PredictionOutput])
-def batch_predict(inputs: List[PredictionInput]):
-    results = []
-    for inp in inputs:
-        result = ml_service.predict(
-            temperature=inp.temperature,
-            line_speed=inp.line_speed,
-            shift=inp.shift,
-            operator_experience=inp.operator_experience,
-            machine_age=inp.machine_age
-        )
-        results.append(PredictionOutput(**result))
-    return results
+@app.get("/predict/batcher")
+def batcher_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+
+@app.post("/predict/batch", response_model=List[PredictionOutput], dependencies=[Depends(require_model)])
+async def batch_predict(inputs: List[PredictionInput]):
+    try:
+        with STAGE_SECONDS.time("parse"):
+            columns = {
+                "temperature": [inp.temperature for inp in inputs],
+                "line_speed": [inp.line_speed for inp in inputs],
+                "shift": [inp.shift for inp in inputs],
+                "operator_experience": [inp.operator_experience for inp in inputs],
+                "machine_age": [inp.machine_age for inp in inputs],
+            }
+        return await executor.predict_batch(columns)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/predict/columnar", dependencies=[Depends(require_model)])
+async def columnar_predict(request: Request):
+    """Bulk scoring without JSON rows or pydantic models; see columnar.py for the formats.
+
+    The request's Content-Type picks the format (raw little-endian arrays,
+    Arrow IPC stream or NDJSON) and the response uses the same one.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    headers = {"X-Model-Version": ml_service.version or ""}
+    if content_type == columnar.NDJSON:
+        # Score each chunk while the rest of the body is still arriving. The answer goes out
+        # at the end: a streaming response would compete with the body for the receive channel.
+        parts = []
+        async for lines in columnar.iter_ndjson_chunks(request.stream()):
+            try:
+                columns = columnar.ndjson_columns(lines)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            parts.append(columnar.encode_ndjson(*await executor.predict_proba(columns)))
+        return Response("".join(parts), media_type=columnar.NDJSON, headers=headers)
 
+    codecs = {
+        columnar.RAW: (columnar.decode_raw, columnar.encode_raw),
+        columnar.ARROW: (columnar.decode_arrow, columnar.encode_arrow),
+    }
+    if content_type not in codecs:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be one of {[*codecs, columnar.NDJSON]}")
+    decode, encode = codecs[content_type]
+    body = await request.body()
+    with STAGE_SECONDS.time("parse"):
+        try:
+            columns = decode(body)
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Cannot decode {content_type} body: {e}")
+    defect_prob, confidence = await executor.predict_proba(columns)
+    with STAGE_SECONDS.time("serialize"):
+        return Response(encode(defect_prob, confidence), media_type=content_type, headers=headers)
 
-@app.get("/feature-importance", response_model=List[FeatureImportance])
+
+@app.get("/feature-importance", response_model=List[FeatureImportance], dependencies=[Depends(require_model)])
 def get_feature_importance():
     importance = ml_service.get_feature_importance()
     return [FeatureImportance(feature=f, importance=i) for f, i in importance.items()]
 
 
-@app.get("/temperature-curve", response_model=List[TemperatureCurvePoint])
+@app.get("/temperature-curve", response_model=List[TemperatureCurvePoint],
+         dependencies=[Depends(require_model)])
 def get_temperature_curve():
     data = ml_service.get_temperature_curve_data()
     return [TemperatureCurvePoint(**point) for point in data]
 
 
+class SensitivityAxis(BaseModel):
+    feature: str
+    values: Optional[List[Union[float, str]]] = None
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: int = 50
+
+
+class SensitivityInput(BaseModel):
+    axes: List[SensitivityAxis]
+    baseline: Optional[dict] = None
+
+
+class CurvesInput(BaseModel):
+    baseline: Optional[dict] = None
+    steps: int = 50
+
+
+@app.post("/sensitivity", dependencies=[Depends(require_model)])
+async def sensitivity_surface(request: SensitivityInput):
+    """Stream a what-if grid as NDJSON: a header with the axes, then one line per first-axis value."""
+    axes = [axis.model_dump() for axis in request.axes]
+    try:
+        surface = await asyncio.to_thread(sensitivity.surface, axes, request.baseline)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return StreamingResponse(iter_ndjson(surface), media_type="application/x-ndjson")
+
+
+@app.post("/sensitivity/curves", dependencies=[Depends(require_model)])
+async def sensitivity_curves(request: CurvesInput):
+    try:
+        return await asyncio.to_thread(sensitivity.curves, request.baseline, request.steps)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/sensitivity/cache")
+def sensitivity_stats():
+    return sensitivity.stats()
+
+
 @app.post("/train")
-def train_model(data_path: str = "../ai-process-optimization/data/production_data.csv"):
+async def train_model(data_path: str = "../ai-process-optimization/data/production_data.csv",
+                      model: str = TRAIN_MODEL, p99_ms: Optional[float] = TRAIN_P99_MS,
+                      max_mb: Optional[float] = TRAIN_MAX_MB):
+    if boot["state"] in ("starting", "loading"):
+        raise HTTPException(status_code=503, detail="Service is still booting", headers={"Retry-After": "1"})
+    budget = Budget(p99_ms, int(max_mb * 2**20) if max_mb is not None else None)
     try:
-        result = ml_service.train(data_path)
+        result = await executor.train(data_path, model, budget)
+        mark_ready(result["version"])
         return result
+    except ValueError as e:
+        # Unknown model or no candidate within budget.
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/cache")
+def cache_stats():
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.delete("/cache")
+def clear_cache():
+    if cache is not None:
+        cache.clear()
+    return {"cleared": cache is not None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Request, stage, batch-size, model-load and train histograms in Prometheus text format."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/profiles")
+def profiles():
+    if profiler is None:
+        return {"enabled": False}
+    return {"enabled": True, **profiler.stats()}
+
+
+@app.get("/drift")
+def drift_status():
+    """Last scheduled drift report, recent alerts and the size of the current window."""
+    if monitor is None:
+        return {"enabled": False}
+    return {"enabled": True, "interval_s": DRIFT_INTERVAL_S, **monitor.stats()}
+
+
+@app.post("/drift/check")
+def drift_check():
+    """Score the current window now instead of waiting for the schedule."""
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Drift monitoring is disabled")
+    return monitor.check()
+
+
+@app.get("/models")
+def list_models():
+    return ml_service.list_models()
+
+
+@app.post("/models/{version}/promote")
+async def promote_model(version: str):
+    try:
+        await asyncio.to_thread(ml_service.promote, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"current": version}
+
+
+@app.post("/models/rollback")
+async def rollback_model():
+    try:
+        version = await asyncio.to_thread(ml_service.rollback)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"current": version}
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5001)
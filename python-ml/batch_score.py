@@ -0,0 +1,233 @@
+"""Score a historian export (CSV or Parquet) in chunks across a process pool.
+
+    python batch_score.py history.parquet scores/ --workers 8 --keep timestamp
+
+The parent process reads the source in chunks of `chunk_rows` rows and hands
+them to `workers` processes. Each worker loads the model once, pinned to one
+registry version for the whole job. At most `max_in_flight` chunks are read
+but not yet written, so memory stays flat however large the source.
+
+Each worker writes its chunk's results to a hidden temporary file. The parent
+renames it to `part-<chunk>.parquet` and records the chunk in
+`_checkpoint.json`. With `ordered`, parts are committed in input order, so the
+finished parts are always a prefix of the input. Without it, each part is
+committed as soon as it is done. Parts sort by name in input order, so
+`pd.read_parquet(out_dir)` reads the scores back in input order either way.
+
+Rerunning the same command after a crash skips the committed chunks and
+scores the rest with the same model version.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from feature_schema import FEATURE_COLUMNS
+from ml_service import MLService
+from model_registry import ModelRegistry
+from out_of_core import iter_chunks
+
+CHUNK_ROWS = 200_000
+CHECKPOINT_FILE = "_checkpoint.json"
+
+
+def part_path(out_dir: Path, index: int) -> Path:
+    return out_dir / f"part-{index:06d}.parquet"
+
+
+def _tmp_path(out_dir: Path, index: int) -> Path:
+    # A leading dot keeps half-written parts out of pyarrow's view of the directory.
+    return out_dir / f".part-{index:06d}.parquet.tmp"
+
+
+@dataclass
+class Checkpoint:
+    """What the job is and which chunks are already committed."""
+    source: str
+    source_bytes: int
+    source_mtime_ns: int
+    chunk_rows: int
+    version: str
+    keep: list
+    done: list = field(default_factory=list)
+    rows: int = 0
+    complete: bool = False
+
+    def same_job(self, other: "Checkpoint") -> bool:
+        job = ("source", "source_bytes", "source_mtime_ns", "chunk_rows", "version", "keep")
+        return all(getattr(self, name) == getattr(other, name) for name in job)
+
+    def save(self, out_dir: Path):
+        tmp = out_dir / f".{CHECKPOINT_FILE}.tmp"
+        tmp.write_text(json.dumps(asdict(self)))
+        os.replace(tmp, out_dir / CHECKPOINT_FILE)
+
+    @classmethod
+    def load(cls, out_dir: Path):
+        path = out_dir / CHECKPOINT_FILE
+        return cls(**json.loads(path.read_text())) if path.exists() else None
+
+
+# Per-process state of scoring workers.
+_worker_service: MLService = None
+
+
+def _init_worker(model_dir: str, backend: str, version: str):
+    global _worker_service
+    _worker_service = MLService(model_dir=model_dir, backend=backend, auto_train=False, load=False)
+    _worker_service.load(version=version)
+    # The pool is the parallelism; a forest's own n_jobs=-1 threads would oversubscribe the cores.
+    model = _worker_service.model.named_steps["model"]
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=1)
+
+
+def _score_chunk(offset: int, columns: dict, kept: dict, tmp_path: str) -> int:
+    defect_prob, confidence = _worker_service.predict_proba(columns)
+    n = len(defect_prob)
+    pq.write_table(pa.table({
+        "row": np.arange(offset, offset + n, dtype=np.int64),
+        **kept,
+        "defect_probability": defect_prob,
+        "predicted_defect": defect_prob >= 0.5,
+        "confidence": confidence,
+    }), tmp_path)
+    return n
+
+
+def score_file(source, out_dir, model_dir: str = "models", backend: str = "sklearn", workers: int = None,
+               chunk_rows: int = CHUNK_ROWS, max_in_flight: int = None, ordered: bool = False, keep=(),
+               version: str = None, restart: bool = False, log=print) -> dict:
+    """Score every row of `source` into Parquet parts under `out_dir`; return a summary of the run.
+
+    Resumes from `out_dir`'s checkpoint unless `restart`. Raises ValueError if
+    the checkpoint belongs to a different source, chunking, model version or
+    kept columns.
+    """
+    source, out_dir = Path(source), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    keep = list(keep)
+
+    previous = None if restart else Checkpoint.load(out_dir)
+    if restart:
+        for path in [*out_dir.glob("part-*.parquet"), out_dir / CHECKPOINT_FILE]:
+            path.unlink(missing_ok=True)
+    for path in out_dir.glob(".part-*.parquet.tmp"):
+        path.unlink()
+    if version is None:
+        # A resumed job keeps the version it started with, even if another has been promoted since.
+        version = previous.version if previous else ModelRegistry(Path(model_dir) / "registry").current()
+    if version is None:
+        raise ValueError(f"No model version in {model_dir}; train one first")
+    stat = source.stat()
+    checkpoint = Checkpoint(str(source.resolve()), stat.st_size, stat.st_mtime_ns, chunk_rows, version, keep)
+    if previous is not None:
+        if not previous.same_job(checkpoint):
+            raise ValueError(f"{out_dir / CHECKPOINT_FILE} is for a different job; pass restart=True "
+                             f"(--restart) or use another output directory")
+        checkpoint = previous
+        checkpoint.complete = False
+    done = {index for index in checkpoint.done if part_path(out_dir, index).exists()}
+    checkpoint.done = sorted(done)
+    checkpoint.rows = sum(pq.ParquetFile(part_path(out_dir, index)).metadata.num_rows for index in done)
+    if previous is not None:
+        log(f"resuming: {len(done)} chunks ({checkpoint.rows:,} rows) already scored with {version}")
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    in_flight = deque()  # (chunk index, future), in submission order
+    start = last_log = time.perf_counter()
+    scored = skipped = 0
+
+    def commit(index: int, rows: int):
+        nonlocal scored, last_log
+        os.replace(_tmp_path(out_dir, index), part_path(out_dir, index))
+        checkpoint.done.append(index)
+        checkpoint.rows += rows
+        checkpoint.save(out_dir)
+        scored += rows
+        if time.perf_counter() - last_log >= 10:
+            last_log = time.perf_counter()
+            log(f"{checkpoint.rows:,} rows scored, {scored / (last_log - start):,.0f} rows/s")
+
+    def drain(limit: int):
+        """Commit finished chunks until fewer than `limit` are in flight."""
+        while len(in_flight) >= limit:
+            if ordered:
+                index, future = in_flight.popleft()
+                commit(index, future.result())
+                continue
+            finished, _ = wait([future for _, future in in_flight], return_when=FIRST_COMPLETED)
+            for item in [item for item in in_flight if item[1] in finished]:
+                in_flight.remove(item)
+                commit(item[0], item[1].result())
+
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(str(model_dir), backend, version)) as pool:
+        try:
+            offset = 0
+            for index, chunk in enumerate(iter_chunks(source, chunk_rows, columns=FEATURE_COLUMNS + keep)):
+                n = len(chunk)
+                if index in done:
+                    skipped += n
+                else:
+                    drain(max_in_flight)
+                    columns = {col: chunk[col].to_numpy() for col in FEATURE_COLUMNS}
+                    kept = {col: chunk[col].to_numpy() for col in keep}
+                    future = pool.submit(_score_chunk, offset, columns, kept, str(_tmp_path(out_dir, index)))
+                    in_flight.append((index, future))
+                offset += n
+            drain(1)
+        except BaseException:
+            for _, future in in_flight:
+                future.cancel()
+            raise
+
+    checkpoint.done.sort()
+    checkpoint.complete = True
+    checkpoint.save(out_dir)
+    seconds = time.perf_counter() - start
+    return {
+        "version": version,
+        "rows": checkpoint.rows,
+        "scored_rows": scored,
+        "skipped_rows": skipped,
+        "parts": len(checkpoint.done),
+        "seconds": round(seconds, 2),
+        "rows_per_sec": round(scored / seconds) if seconds else 0,
+        # ru_maxrss is in KiB on Linux; the children figure is the largest single worker.
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "worker_peak_rss_mib": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a CSV / Parquet file of production rows")
+    parser.add_argument("source", help="CSV or Parquet file with the feature columns")
+    parser.add_argument("out_dir", help="directory for part-*.parquet and the checkpoint")
+    parser.add_argument("--model-dir", default=os.environ.get("ML_MODEL_DIR", "models"))
+    parser.add_argument("--backend", default=os.environ.get("ML_BACKEND", "sklearn"), choices=("sklearn", "compiled"))
+    parser.add_argument("--version", help="registry version to score with (default: current, or the checkpoint's)")
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes (default: all cores)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="chunks read but not yet written (default: 2 x workers)")
+    parser.add_argument("--ordered", action="store_true", help="commit parts in input order")
+    parser.add_argument("--keep", action="append", default=[], help="input column to copy to the output")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and earlier parts")
+    args = parser.parse_args()
+    summary = score_file(args.source, args.out_dir, args.model_dir, args.backend, args.workers, args.chunk_rows,
+                         args.max_in_flight, args.ordered, args.keep, args.version, args.restart)
+    print(json.dumps(summary, indent=2))
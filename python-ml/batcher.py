@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from ml_service import FEATURE_COLUMNS
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into one vectorized call.
+
+    The first queued request opens a window of `max_wait_ms`; everything that
+    arrives before it closes (up to `max_batch_size` rows) is scored together
+    by the coroutine `score_fn`, which takes a column mapping and returns one
+    result per row. Up to `max_in_flight` batches are scored concurrently.
+
+    `stop()` lets the batches in flight finish; requests not yet scored fail
+    with RuntimeError.
+    """
+
+    def __init__(self, score_fn: Callable[[dict], Awaitable[list]], max_wait_ms: float = 2.0,
+                 max_batch_size: int = 256, max_in_flight: int = 1):
+        self.score_fn = score_fn
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        # The loop holds tasks weakly; keep each scoring task until it is done.
+        self._tasks: set[asyncio.Task] = set()
+        self._collecting: list = []
+        self.batches = 0
+        self.rows = 0
+        self.max_observed_batch = 0
+        # batch-size histogram with power-of-two upper bounds
+        self.size_buckets = {}
+        bound = 1
+        while bound < max_batch_size:
+            self.size_buckets[bound] = 0
+            bound *= 2
+        self.size_buckets[max_batch_size] = 0
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        pending, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._fail(pending, RuntimeError("MicroBatcher stopped"))
+
+    async def submit(self, row: dict) -> dict:
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self) -> list:
+        # Collected in place so stop() can fail a batch cancelled halfway.
+        self._collecting = batch = []
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot first so requests keep queueing meanwhile.
+            await self._slots.acquire()
+            batch = await self._collect()
+            self._collecting = []
+            self._record(len(batch))
+            task = asyncio.create_task(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, batch: list):
+        try:
+            rows = [row for row, _ in batch]
+            columns = {col: [row[col] for row in rows] for col in FEATURE_COLUMNS}
+            results = await self.score_fn(columns)
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        finally:
+            self._slots.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch: list, error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _record(self, size: int):
+        self.batches += 1
+        self.rows += size
+        self.max_observed_batch = max(self.max_observed_batch, size)
+        for bound in self.size_buckets:
+            if size <= bound:
+                self.size_buckets[bound] += 1
+                break
+
+    def stats(self) -> dict:
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch_size": self.max_batch_size,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_observed_batch_size": self.max_observed_batch,
+            "batch_size_histogram": {f"le_{bound}": count for bound, count in self.size_buckets.items()},
+        }
@@ -0,0 +1,552 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from batcher import MicroBatcher
+from feature_schema import FEATURE_COLUMNS, NUMERIC_FEATURES, FastTransform, make_preprocessor, pipeline_frame
+from executor import InlineExecutor, make_executor
+from ml_service import MLService
+from prediction_cache import PredictionCache
+
+DATA_PATH = Path(__file__).parent.parent / "ai-process-optimization" / "data" / "production_data.csv"
+
+
+def make_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic production rows shaped like production_data.csv."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "temperature": rng.normal(82, 8, n).round(2),
+        "line_speed": rng.normal(85, 10, n).round(2),
+        "shift": rng.choice(["Day", "Night"], n),
+        "operator_experience": rng.uniform(0, 20, n).round(1),
+        "machine_age": rng.uniform(0, 120, n).round(1),
+    })
+
+
+def _rows_per_sec(fn, n: int, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def bench_batch(service: MLService, sizes=(1, 100, 10_000, 100_000), loop_limit: int = 1_000):
+    """Compare the per-row predict loop against predict_batch."""
+    print(f"{'rows':>8} {'loop rows/s':>14} {'batch rows/s':>14} {'speedup':>9}")
+    for n in sizes:
+        df = make_rows(n)
+        records = df.to_dict("records")
+        batch = _rows_per_sec(lambda: service.predict_batch(df), n)
+        if n <= loop_limit:
+            loop = _rows_per_sec(lambda: [service.predict(**r) for r in records], n, repeats=1)
+            print(f"{n:>8} {loop:>14,.0f} {batch:>14,.0f} {batch / loop:>8.1f}x")
+        else:
+            print(f"{n:>8} {'-':>14} {batch:>14,.0f} {'-':>9}")
+
+
+def _latency_ms(fn, repeats: int) -> np.ndarray:
+    samples = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return samples * 1000
+
+
+def bench_backends(service: MLService, repeats: int = 500, batch_rows: int = 10_000):
+    """Single-row p50/p99 latency and batch throughput, sklearn vs compiled."""
+    compiled = MLService(model_dir=str(service.model_dir), backend="compiled")
+    df = make_rows(batch_rows)
+    expected = service.model.predict_proba(df)
+    diff = np.abs(compiled.compiled.predict_proba(df) - expected).max()
+    print(f"max |compiled - sklearn| over {batch_rows:,} rows: {diff:.2e}")
+
+    row = df.iloc[0].to_dict()
+    print(f"{'backend':>9} {'p50 ms':>8} {'p99 ms':>8} {'batch rows/s':>14}")
+    for name, svc in (("sklearn", service), ("compiled", compiled)):
+        lat = _latency_ms(lambda: svc.predict(**row), repeats)
+        rate = _rows_per_sec(lambda: svc.predict_batch(df), batch_rows)
+        print(f"{name:>9} {np.percentile(lat, 50):>8.3f} {np.percentile(lat, 99):>8.3f} {rate:>14,.0f}")
+
+
+def bench_batcher(service: MLService, requests: int = 2_000, concurrency: int = 200,
+                  windows_ms=(0.5, 2.0, 5.0), max_batch_size: int = 256):
+    """Concurrent single-row submits through MicroBatcher at several windows."""
+    rows = make_rows(requests).to_dict("records")
+
+    async def run(window_ms):
+        batcher = MicroBatcher(InlineExecutor(service).predict_batch, window_ms, max_batch_size)
+        await batcher.start()
+        latencies = []
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(row):
+            async with gate:
+                start = time.perf_counter()
+                await batcher.submit(row)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(row) for row in rows))
+        elapsed = time.perf_counter() - start
+        await batcher.stop()
+        return elapsed, np.array(latencies) * 1000, batcher.stats()
+
+    direct = _rows_per_sec(lambda: [service.predict(**r) for r in rows[:200]], 200, repeats=1)
+    print(f"unbatched: {direct:,.0f} req/s")
+    print(f"{'window ms':>9} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11}")
+    for window_ms in windows_ms:
+        elapsed, lat, stats = asyncio.run(run(window_ms))
+        print(f"{window_ms:>9} {requests / elapsed:>10,.0f} {np.percentile(lat, 50):>8.1f} "
+              f"{np.percentile(lat, 99):>8.1f} {stats['mean_batch_size']:>11.1f}")
+
+
+def bench_train_load(service: MLService, kinds=("inline", "process"), workers: int = 2,
+                     rate_per_sec: int = 10, data_path: str = None):
+    """/predict p99 at a steady request rate, idle vs while a retrain runs."""
+    data_path = data_path or str(DATA_PATH)
+    row = {col: [value] for col, value in make_rows(1).iloc[0].items()}
+
+    async def run(kind):
+        executor = make_executor(kind, service, workers)
+        await executor.start()
+
+        async def load(stop: asyncio.Event) -> np.ndarray:
+            latencies, pending = [], []
+
+            async def one():
+                start = time.perf_counter()
+                await executor.predict_batch(row)
+                latencies.append(time.perf_counter() - start)
+
+            while not stop.is_set():
+                pending.append(asyncio.create_task(one()))
+                await asyncio.sleep(1 / rate_per_sec)
+            await asyncio.gather(*pending)
+            return np.array(latencies) * 1000
+
+        idle_stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(3, idle_stop.set)
+        idle = await load(idle_stop)
+
+        train_stop = asyncio.Event()
+        train_task = asyncio.create_task(executor.train(data_path))
+        train_task.add_done_callback(lambda _: train_stop.set())
+        busy = await load(train_stop)
+        await train_task
+        executor.shutdown()
+        return idle, busy
+
+    print(f"{'executor':>9} {'idle p50':>9} {'idle p99':>9} {'train p50':>10} {'train p99':>10}")
+    for kind in kinds:
+        idle, busy = asyncio.run(run(kind))
+        print(f"{kind:>9} {np.percentile(idle, 50):>9.1f} {np.percentile(idle, 99):>9.1f} "
+              f"{np.percentile(busy, 50):>10.1f} {np.percentile(busy, 99):>10.1f}")
+
+
+def bench_cache(service: MLService, requests: int = 2_000, distinct: int = 200):
+    """Single-row predict on a stable line (few distinct readings), cache off vs on."""
+    pool = make_rows(distinct).to_dict("records")
+    rng = np.random.default_rng(1)
+    # Sensor jitter below the 0.1 degC quantization step.
+    rows = [dict(pool[i], temperature=pool[i]["temperature"] + rng.uniform(-0.04, 0.04))
+            for i in rng.integers(0, distinct, requests)]
+    cached = MLService(model_dir=str(service.model_dir), backend=service.backend,
+                       cache=PredictionCache(quantization={"temperature": 0.1}))
+    for name, svc in (("no cache", service), ("cache", cached)):
+        rate = _rows_per_sec(lambda: [svc.predict(**r) for r in rows], requests, repeats=1)
+        print(f"{name:>9}: {rate:>10,.0f} req/s")
+    print(cached.cache.stats())
+
+
+def _legacy_outliers(df: pd.DataFrame, numeric_cols, whisker_width: float = 1.5) -> pd.DataFrame:
+    # The per-column copy-and-refilter loop outliers.remove_outliers_iqr replaced, kept for comparison.
+    cleaned = df.copy()
+    for col in numeric_cols:
+        q1, q3 = cleaned[col].quantile(0.25), cleaned[col].quantile(0.75)
+        iqr = q3 - q1
+        cleaned = cleaned[(cleaned[col] >= q1 - whisker_width * iqr) & (cleaned[col] <= q3 + whisker_width * iqr)]
+    return cleaned.reset_index(drop=True)
+
+
+def bench_outliers(service: MLService = None, rows: int = 10_000_000, chunk_rows: int = 1_000_000):
+    """IQR filtering of `rows` training rows: legacy loop vs sequential mask vs single pass vs streaming."""
+    from outliers import iqr_bounds, remove_outliers_iqr, streaming_iqr_bounds
+
+    cols = NUMERIC_FEATURES
+    df = make_rows(rows)
+    chunks = lambda: (df.iloc[i:i + chunk_rows] for i in range(0, rows, chunk_rows))
+
+    def streamed():
+        bounds = streaming_iqr_bounds(chunks(), cols)
+        return pd.concat([remove_outliers_iqr(chunk, cols, bounds=bounds) for chunk in chunks()], ignore_index=True)
+
+    print(f"{rows:,} rows")
+    print(f"{'method':>22} {'seconds':>8} {'rows kept':>12}")
+    for name, fn in (
+        ("legacy loop", lambda: _legacy_outliers(df, cols)),
+        ("sequential=True", lambda: remove_outliers_iqr(df, cols, sequential=True)),
+        ("single pass", lambda: remove_outliers_iqr(df, cols)),
+        (f"streaming, {chunk_rows // 1_000_000}M chunks", streamed),
+    ):
+        start = time.perf_counter()
+        kept = len(fn())
+        print(f"{name:>22} {time.perf_counter() - start:>8.2f} {kept:>12,}")
+    exact = np.array(iqr_bounds(df, cols))
+    approx = np.array(streaming_iqr_bounds(chunks(), cols))
+    print(f"max streaming whisker error: {np.abs(approx - exact).max():.4f} "
+          f"(whisker spans {np.array2string(exact[1] - exact[0], precision=1)})")
+
+
+def bench_models(service: MLService, data_path: str = None):
+    """AUC, single-row latency and artifact size of every candidate of every model family."""
+    from sklearn.model_selection import train_test_split
+
+    from model_budget import MODEL_FAMILIES, fit_within_budget, format_table
+    from outliers import remove_outliers_iqr
+
+    df = remove_outliers_iqr(pd.read_csv(data_path or DATA_PATH), NUMERIC_FEATURES)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df.drop(columns=["defect"]), df["defect"], test_size=0.2, random_state=42, stratify=df["defect"]
+    )
+    rows = []
+    for model in MODEL_FAMILIES:
+        rows += fit_within_budget(model, make_preprocessor, X_train, y_train, X_test, y_test)[2]
+    print(format_table(rows))
+
+
+def bench_sensitivity(service: MLService, steps: int = 200, loop_points: int = 200):
+    """A steps x steps temperature x line_speed surface: per-point predict loop vs SensitivityEngine."""
+    from sensitivity import SensitivityEngine, iter_ndjson
+
+    engine = SensitivityEngine(service)
+    axes = [{"feature": "temperature", "steps": steps}, {"feature": "line_speed", "steps": steps}]
+    temps, speeds = np.linspace(60, 110, steps), np.linspace(60, 120, steps)
+    rows = [dict(temperature=t, line_speed=v, shift="Day", operator_experience=5.0, machine_age=25.0)
+            for t in temps for v in speeds][:loop_points]
+    loop = _rows_per_sec(lambda: [service.predict(**r) for r in rows], loop_points, repeats=1)
+    print(f"predict loop: {loop:,.0f} points/s, {steps * steps / loop:.1f} s projected for {steps * steps:,} points")
+    for label in ("cold", "cached"):
+        start = time.perf_counter()
+        body = "".join(iter_ndjson(engine.surface(axes)))
+        print(f"{label:>6}: {time.perf_counter() - start:.3f} s for {steps * steps:,} points, {len(body) / 1e6:.2f} MB NDJSON")
+
+
+def bench_drift(service: MLService, requests: int = 2_000, stream_rows: int = 10_000_000,
+                chunk_rows: int = 100_000):
+    """Per-request cost of DriftMonitor.observe, and memory while a long stream passes through it."""
+    import tracemalloc
+
+    from drift import DriftMonitor
+
+    monitored = MLService(model_dir=str(service.model_dir), backend=service.backend, monitor=DriftMonitor())
+    serving = monitored._current()
+    row = {col: [value] for col, value in make_rows(1).iloc[0].items()}
+    observe = _latency_ms(lambda: monitored.monitor.observe(row, serving), requests)
+    print(f"observe, 1 row: p50 {np.percentile(observe, 50) * 1000:.0f} us, p99 {np.percentile(observe, 99) * 1000:.0f} us")
+    for name, svc in (("unmonitored", service), ("monitored", monitored)):
+        lat = _latency_ms(lambda: svc.predict_batch(row), requests)
+        print(f"{name:>12} predict: p50 {np.percentile(lat, 50):.3f} ms, p99 {np.percentile(lat, 99):.3f} ms")
+
+    chunk = make_rows(chunk_rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(stream_rows // chunk_rows):
+        monitored.monitor.observe(chunk, serving)
+        if i == 0:
+            baseline = tracemalloc.get_traced_memory()[0]
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{stream_rows:,} rows observed in {elapsed:.1f} s ({stream_rows / elapsed:,.0f} rows/s); "
+          f"retained memory after first chunk {baseline / 1024:.0f} KiB, after all {current / 1024:.0f} KiB")
+    report = monitored.monitor.check()
+    print(f"check: {report['status']}, max PSI {max(f['psi'] for f in report['features'].values()):.3f}")
+
+
+def _wait_for(url: str, start: float, timeout: float, data: bytes = None) -> float:
+    """Seconds since `start` until `url` answers 200 (POST when `data` is given)."""
+    while time.perf_counter() - start < timeout:
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout):
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f} s")
+
+
+def bench_boot(service: MLService = None, port: int = 5081, timeout: float = 300.0):
+    """Time from launching uvicorn to first healthy, ready and first /predict, fast boot off vs on.
+
+    With an empty model directory, fast boot reports no_model and the first
+    prediction waits for an explicit POST /train.
+    """
+    row = json.dumps({"temperature": 85, "line_speed": 90, "shift": "Day",
+                      "operator_experience": 5, "machine_age": 30}).encode()
+    base = f"http://127.0.0.1:{port}"
+    print(f"{'models':>8} {'fast boot':>10} {'healthy s':>10} {'ready s':>8} {'predict s':>10}")
+    for registry in ("trained", "empty"):
+        for fast in ("0", "1"):
+            with tempfile.TemporaryDirectory() as empty:
+                model_dir = "models" if registry == "trained" else empty
+                env = {**os.environ, "ML_FAST_BOOT": fast, "ML_MODEL_DIR": model_dir, "ML_DRIFT_INTERVAL_S": "0"}
+                start = time.perf_counter()
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                    cwd=Path(__file__).parent, env=env,
+                )
+                try:
+                    healthy = _wait_for(f"{base}/health/live", start, timeout)
+                    if registry == "empty" and fast == "1":
+                        _wait_for(f"{base}/train", start, timeout, data=b"")
+                    ready = _wait_for(f"{base}/health/ready", start, timeout)
+                    predict = _wait_for(f"{base}/predict", start, timeout, data=row)
+                finally:
+                    server.terminate()
+                    server.wait()
+            print(f"{registry:>8} {'on' if fast == '1' else 'off':>10} {healthy:>10.2f} {ready:>8.2f} {predict:>10.2f}")
+
+
+def bench_columnar(service: MLService = None, sizes=(1_000, 100_000), repeats: int = 3):
+    """Rows/s through the app: JSON /predict/batch vs /predict/columnar in raw, Arrow and NDJSON.
+
+    Runs the app in-process with the prediction cache off, so every format scores every row.
+    """
+    os.environ.setdefault("ML_CACHE_SIZE", "0")
+    os.environ.setdefault("ML_DRIFT_INTERVAL_S", "0")
+    import pyarrow as pa
+    from fastapi.testclient import TestClient
+
+    import app
+    import columnar
+
+    def arrow_body(df):
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    print(f"{'rows':>8} {'format':>8} {'rows/s':>12} {'vs JSON':>8}")
+    with TestClient(app.app) as client:
+        while client.get("/health/ready").status_code != 200:
+            time.sleep(0.05)
+        for n in sizes:
+            df = make_rows(n)
+            records = df.to_dict("records")
+            bodies = {
+                "raw": (columnar.RAW, columnar.pack_raw(df)),
+                "arrow": (columnar.ARROW, arrow_body(df)),
+                "ndjson": (columnar.NDJSON, df.to_json(orient="records", lines=True).encode()),
+            }
+
+            def post_json():
+                response = client.post("/predict/batch", json=records)
+                assert len(response.json()) == n
+
+            def post(content_type, body):
+                response = client.post("/predict/columnar", content=body, headers={"Content-Type": content_type})
+                assert response.status_code == 200, response.text
+
+            json_rate = _rows_per_sec(post_json, n, repeats)
+            print(f"{n:>8,} {'json':>8} {json_rate:>12,.0f} {1:>7.1f}x")
+            for name, (content_type, body) in bodies.items():
+                rate = _rows_per_sec(lambda: post(content_type, body), n, repeats)
+                print(f"{n:>8,} {name:>8} {rate:>12,.0f} {rate / json_rate:>7.1f}x")
+
+
+def make_labelled_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    """make_rows plus a `defect` label that rises with temperature, speed, night shift and machine age."""
+    df = make_rows(n, seed)
+    logit = (-3.2 + 0.08 * (df["temperature"] - 82) + 0.05 * (df["line_speed"] - 85)
+             + 0.5 * (df["shift"] == "Night") - 0.06 * df["operator_experience"] + 0.008 * df["machine_age"])
+    rng = np.random.default_rng(seed + 1)
+    return df.assign(defect=(rng.random(n) < 1 / (1 + np.exp(-logit))).astype(np.int64))
+
+
+def _in_memory_prep(path: str, out_dir: str) -> dict:
+    # What MLService.train does before fitting: read everything, drop outliers, split.
+    start = time.perf_counter()
+    MLService(model_dir=out_dir, auto_train=False, load=False)._training_split(path)
+    from out_of_core import peak_rss_bytes
+    return {"wall_s": time.perf_counter() - start, "peak_rss_bytes": peak_rss_bytes()}
+
+
+def _out_of_core(path: str, out_dir: str, chunk_rows: int) -> dict:
+    from out_of_core import train_out_of_core
+    return train_out_of_core(path, make_preprocessor, Path(out_dir) / "split", chunk_rows)[1]
+
+
+def bench_out_of_core(service: MLService = None, sizes=(2_000_000, 50_000_000), chunk_rows: int = 1_000_000,
+                      in_memory_limit: int = 10_000_000):
+    """Peak RSS and wall time of out-of-core training on synthetic CSVs, vs loading the data in memory.
+
+    Every run is a fresh spawned process, so peak RSS is its own. The in-memory
+    column only prepares the data (read, outlier filter, split) and is skipped
+    above `in_memory_limit` rows.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    print(f"{'rows':>11} {'mode':>12} {'wall s':>8} {'peak RSS MiB':>13} {'AUC':>6}  phases")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "history.csv")
+            for i, start in enumerate(range(0, rows, chunk_rows)):
+                chunk = make_labelled_rows(min(chunk_rows, rows - start), seed=i)
+                chunk.to_csv(path, mode="a", header=i == 0, index=False)
+            runs = [("in-memory", _in_memory_prep, (path, tmp))] if rows <= in_memory_limit else []
+            runs.append(("out-of-core", _out_of_core, (path, tmp, chunk_rows)))
+            for mode, fn, args in runs:
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    stats = pool.submit(fn, *args).result()
+                phases = ", ".join(f"{k[:-2]} {stats[k]:.1f}" for k in ("split_s", "preprocess_s", "fit_s", "evaluate_s")
+                                   if k in stats)
+                auc = f"{stats['auc']:.3f}" if "auc" in stats else "-"
+                print(f"{rows:>11,} {mode:>12} {stats['wall_s']:>8.1f} {stats['peak_rss_bytes'] / 2**20:>13,.0f} "
+                      f"{auc:>6}  {phases}", flush=True)
+
+
+def _in_memory_score(path: str, model_dir: str) -> dict:
+    # The ad-hoc way: read the whole file and score it in one process.
+    start = time.perf_counter()
+    service = MLService(model_dir=model_dir, auto_train=False, load=False)
+    service.load()
+    service.predict_proba(pd.read_parquet(path, columns=FEATURE_COLUMNS))
+    from out_of_core import peak_rss_bytes
+    return {"seconds": time.perf_counter() - start, "peak_rss_mib": peak_rss_bytes() / 2**20}
+
+
+def _batch_score(path: str, out_dir: str, model_dir: str, workers: int) -> dict:
+    from batch_score import score_file
+    return score_file(path, out_dir, model_dir, workers=workers, log=lambda message: None)
+
+
+def bench_batch_score(service: MLService, sizes=(1_000_000, 10_000_000, 100_000_000), chunk_rows: int = 1_000_000,
+                      in_memory_limit: int = 10_000_000):
+    """batch_score.py throughput and peak RSS on synthetic Parquet files, vs scoring the file in memory.
+
+    Every run is a fresh spawned process, so peak RSS is its own; the worker
+    column is the largest scoring process.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    service.load()
+    workers = sorted({1, os.cpu_count() or 1})
+    print(f"model {service.version}, {os.cpu_count()} CPUs")
+    print(f"{'rows':>12} {'mode':>12} {'wall s':>8} {'rows/s':>11} {'peak RSS MiB':>13} {'worker MiB':>11}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "history.parquet")
+            with pq.ParquetWriter(path, pa.Schema.from_pandas(make_rows(1), preserve_index=False)) as writer:
+                for i, start in enumerate(range(0, rows, chunk_rows)):
+                    chunk = make_rows(min(chunk_rows, rows - start), seed=i)
+                    writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False))
+            runs = [("in-memory", _in_memory_score, (path, str(service.model_dir)))] if rows <= in_memory_limit else []
+            runs += [(f"{n} worker{'s' * (n > 1)}", _batch_score, (path, str(Path(tmp) / f"scores{n}"),
+                                                                  str(service.model_dir), n)) for n in workers]
+            for mode, fn, args in runs:
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    stats = pool.submit(fn, *args).result()
+                worker = f"{stats['worker_peak_rss_mib']:>11,.0f}" if "worker_peak_rss_mib" in stats else f"{'-':>11}"
+                print(f"{rows:>12,} {mode:>12} {stats['seconds']:>8.1f} {rows / stats['seconds']:>11,.0f} "
+                      f"{stats['peak_rss_mib']:>13,.0f} {worker}", flush=True)
+
+
+def _edge_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    """make_rows with missing values, unknown / None / NaN shifts and out-of-range readings mixed in."""
+    df = make_rows(n, seed)
+    rng = np.random.default_rng(seed + 1)
+    for col in NUMERIC_FEATURES:
+        df.loc[rng.random(n) < 0.05, col] = np.nan
+        df.loc[rng.random(n) < 0.01, col] *= 100
+    shift = df["shift"].astype(object)
+    shift[rng.random(n) < 0.03] = None
+    shift[rng.random(n) < 0.03] = np.nan
+    shift[rng.random(n) < 0.03] = "Weekend"
+    return df.assign(shift=shift)
+
+
+def check_parity(pipeline, rows: int = 100_000) -> dict:
+    """Max |difference| between FastTransform and the pipeline's ColumnTransformer, and the resulting
+    probabilities, on rows with NaNs, unknown categories and out-of-range values. Raises on any mismatch."""
+    df = _edge_rows(rows)
+    preprocessor = pipeline.named_steps["preprocess"]
+    fast = FastTransform.from_preprocessor(preprocessor)
+    columns = {col: df[col].to_numpy() for col in FEATURE_COLUMNS}
+    # The frame the sklearn serving path builds; in it a None shift is NaN (imputed), as in FastTransform.
+    frame = pipeline_frame(columns)
+    expected = preprocessor.transform(frame)
+    got = fast.transform(columns)
+    assert got.shape == expected.shape, (got.shape, expected.shape)
+    transform_gap = np.abs(got - expected).max()
+    assert transform_gap == 0, transform_gap
+    assert np.array_equal(fast.transform(columns, dtype=np.float32), expected.astype(np.float32))
+    # One row at a time, as /predict sends them.
+    for i in range(0, rows, rows // 50):
+        single = {col: values[i:i + 1] for col, values in columns.items()}
+        assert np.array_equal(fast.transform(single), expected[i:i + 1]), i
+    model = pipeline.named_steps["model"]
+    proba_gap = np.abs(model.predict_proba(got) - pipeline.predict_proba(frame)).max()
+    assert proba_gap == 0, proba_gap
+    return {"rows": rows, "transform_max_abs_diff": float(transform_gap), "proba_max_abs_diff": float(proba_gap)}
+
+
+def bench_schema(service: MLService, sizes=(1, 100, 10_000, 1_000_000), repeats: int = 200):
+    """feature_schema.FastTransform vs the fitted ColumnTransformer: parity, then time per call."""
+    pipeline = service.model
+    print(f"parity: {check_parity(pipeline)}")
+    preprocessor = pipeline.named_steps["preprocess"]
+    fast = FastTransform.from_preprocessor(preprocessor)
+    print(f"{'rows':>10} {'ColumnTransformer':>18} {'FastTransform':>14} {'speedup':>8}")
+    for n in sizes:
+        df = make_rows(n)
+        columns = {col: df[col].to_numpy() for col in FEATURE_COLUMNS}
+        out = np.empty((n, fast.n_features))
+        count = max(1, repeats // max(1, n // 1_000))
+        # The serving path builds the frame from columns on every call, so that is timed too.
+        slow = np.median(_latency_ms(lambda: preprocessor.transform(pd.DataFrame(columns)[FEATURE_COLUMNS]), count))
+        quick = np.median(_latency_ms(lambda: fast.transform(columns, out=out), count))
+        print(f"{n:>10,} {slow:>15.3f} ms {quick:>11.3f} ms {slow / quick:>7.1f}x")
+
+
+BENCHMARKS = {
+    "batch": bench_batch,
+    "backends": bench_backends,
+    "batcher": bench_batcher,
+    "boot": bench_boot,
+    "drift": bench_drift,
+    "cache": bench_cache,
+    "columnar": bench_columnar,
+    "models": bench_models,
+    "out_of_core": bench_out_of_core,
+    "outliers": bench_outliers,
+    "schema": bench_schema,
+    "batch_score": bench_batch_score,
+    "sensitivity": bench_sensitivity,
+    "train_load": bench_train_load,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="python-ml inference benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    args = parser.parse_args()
+    BENCHMARKS[args.name](MLService())
@@ -0,0 +1,130 @@
+"""Columnar wire formats for /predict/columnar.
+
+Large batches skip JSON and per-row pydantic models: the body is decoded
+straight into column arrays for `MLService.predict_proba`, and the answer is
+encoded the same way it came in.
+
+raw (application/octet-stream), n rows, little-endian, no header:
+    request:  temperature, line_speed, operator_experience, machine_age as
+              float64[n] each, then shift codes as uint8[n] (SHIFT_CODES)
+    response: defect_probability float64[n], confidence float64[n],
+              predicted_defect uint8[n]
+arrow (application/vnd.apache.arrow.stream):
+    an IPC stream with the five feature columns in, one with the three
+    result columns out
+ndjson (application/x-ndjson):
+    one feature object per line in, one result object per line out; chunks
+    of the body are scored as they arrive
+"""
+import json
+
+import numpy as np
+
+from feature_schema import CATEGORICAL_FEATURE, NUMERIC_FEATURES
+
+RAW = "application/octet-stream"
+ARROW = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+SHIFT_CODES = np.array(["Day", "Night"], dtype=object)
+RAW_ROW_BYTES = 8 * len(NUMERIC_FEATURES) + 1
+RAW_RESULT_BYTES = 8 + 8 + 1
+NDJSON_CHUNK_ROWS = 8_192
+
+
+def decode_raw(body: bytes) -> dict:
+    if len(body) % RAW_ROW_BYTES:
+        raise ValueError(f"Raw body of {len(body)} bytes is not a whole number of {RAW_ROW_BYTES}-byte rows")
+    n = len(body) // RAW_ROW_BYTES
+    numeric = np.frombuffer(body, dtype="<f8", count=n * len(NUMERIC_FEATURES)).reshape(len(NUMERIC_FEATURES), n)
+    codes = np.frombuffer(body, dtype=np.uint8, offset=n * len(NUMERIC_FEATURES) * 8)
+    if n and codes.max() >= len(SHIFT_CODES):
+        raise ValueError(f"Shift codes must be below {len(SHIFT_CODES)} ({', '.join(SHIFT_CODES)})")
+    columns = dict(zip(NUMERIC_FEATURES, numeric))
+    columns[CATEGORICAL_FEATURE] = SHIFT_CODES[codes]
+    return columns
+
+
+def encode_raw(defect_prob: np.ndarray, confidence: np.ndarray) -> bytes:
+    return b"".join((
+        np.ascontiguousarray(defect_prob, dtype="<f8").tobytes(),
+        np.ascontiguousarray(confidence, dtype="<f8").tobytes(),
+        (defect_prob >= 0.5).astype(np.uint8).tobytes(),
+    ))
+
+
+def pack_raw(columns) -> bytes:
+    """Client side of `decode_raw`: feature columns (shift as strings) to a raw request body."""
+    shifts = np.asarray(columns[CATEGORICAL_FEATURE], dtype=str)
+    codes = np.searchsorted(SHIFT_CODES.astype(str), shifts)
+    if not np.array_equal(SHIFT_CODES[np.minimum(codes, len(SHIFT_CODES) - 1)].astype(str), shifts):
+        raise ValueError(f"Shift values must be one of {list(SHIFT_CODES)}")
+    return b"".join([np.asarray(columns[col], dtype="<f8").tobytes() for col in NUMERIC_FEATURES]
+                    + [codes.astype(np.uint8).tobytes()])
+
+
+def unpack_raw(body: bytes) -> dict:
+    """Client side of `encode_raw`."""
+    n = len(body) // RAW_RESULT_BYTES
+    return {
+        "defect_probability": np.frombuffer(body, dtype="<f8", count=n),
+        "confidence": np.frombuffer(body, dtype="<f8", count=n, offset=8 * n),
+        "predicted_defect": np.frombuffer(body, dtype=np.uint8, offset=16 * n).astype(bool),
+    }
+
+
+def decode_arrow(body: bytes) -> dict:
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(body).read_all()
+    missing = [col for col in (*NUMERIC_FEATURES, CATEGORICAL_FEATURE) if col not in table.column_names]
+    if missing:
+        raise ValueError(f"Arrow stream lacks columns {missing}")
+    columns = {col: table[col].to_numpy().astype(np.float64, copy=False) for col in NUMERIC_FEATURES}
+    columns[CATEGORICAL_FEATURE] = table[CATEGORICAL_FEATURE].to_numpy(zero_copy_only=False).astype(object)
+    return columns
+
+
+def encode_arrow(defect_prob: np.ndarray, confidence: np.ndarray) -> bytes:
+    import pyarrow as pa
+
+    table = pa.table({
+        "defect_probability": defect_prob,
+        "predicted_defect": defect_prob >= 0.5,
+        "confidence": confidence,
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ndjson_columns(lines: list) -> dict:
+    rows = [json.loads(line) for line in lines]
+    try:
+        columns = {col: np.array([row[col] for row in rows], dtype=np.float64) for col in NUMERIC_FEATURES}
+        columns[CATEGORICAL_FEATURE] = np.array([row[CATEGORICAL_FEATURE] for row in rows], dtype=object)
+    except KeyError as e:
+        raise ValueError(f"NDJSON row lacks {e}") from None
+    return columns
+
+
+async def iter_ndjson_chunks(chunks, chunk_rows: int = NDJSON_CHUNK_ROWS):
+    """Group an async byte stream into lists of up to `chunk_rows` non-empty lines."""
+    pending, lines = b"", []
+    async for chunk in chunks:
+        *complete, pending = (pending + chunk).split(b"\n")
+        lines.extend(line for line in complete if line.strip())
+        while len(lines) >= chunk_rows:
+            yield lines[:chunk_rows]
+            lines = lines[chunk_rows:]
+    if pending.strip():
+        lines.append(pending)
+    if lines:
+        yield lines
+
+
+def encode_ndjson(defect_prob: np.ndarray, confidence: np.ndarray) -> str:
+    return "".join(
+        f'{{"defect_probability": {p!r}, "predicted_defect": {"true" if p >= 0.5 else "false"}, "confidence": {c!r}}}\n'
+        for p, c in zip(defect_prob.tolist(), confidence.tolist())
+    )
@@ -0,0 +1,120 @@
+"""Array-backed RandomForest pipeline evaluator that only needs NumPy.
+
+`CompiledForest.from_pipeline` flattens a fitted preprocess + RandomForest
+pipeline into a handful of arrays: imputer medians, scaler mean/scale, the
+shift categories and every tree's nodes concatenated into one table. Scoring
+walks all trees for a block of rows at once, one tree level per step.
+"""
+from pathlib import Path
+
+import numpy as np
+
+from feature_schema import FastTransform
+
+
+class CompiledForest:
+    def __init__(self, medians, means, scales, categories, shift_fill,
+                 roots, left, right, feature, threshold, leaf_proba, max_depth, classes):
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.categories = np.asarray(categories, dtype=object)
+        self.shift_fill = str(shift_fill)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.leaf_proba = np.asarray(leaf_proba, dtype=np.float64)
+        self.max_depth = int(max_depth)
+        self.classes = np.asarray(classes)
+        self.preprocess = FastTransform(self.medians, self.means, self.scales, self.categories, self.shift_fill)
+        # Keep the (rows x trees) working set around a million nodes.
+        self.block_rows = max(1, (1 << 20) // len(self.roots))
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledForest":
+        preprocessor = pipeline.named_steps["preprocess"]
+        model = pipeline.named_steps["model"]
+        if not hasattr(model, "estimators_"):
+            raise ValueError(f"Cannot compile {type(model).__name__}: only tree ensembles are supported")
+
+        fast = FastTransform.from_preprocessor(preprocessor)
+        roots, left, right, feature, threshold, leaf_proba = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            is_leaf = tree.children_left == -1
+            own = np.arange(tree.node_count) + offset
+            # Leaves point back at themselves so extra steps are no-ops.
+            left.append(np.where(is_leaf, own, tree.children_left + offset))
+            right.append(np.where(is_leaf, own, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            value = tree.value[:, 0, :]
+            leaf_proba.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            medians=fast.medians,
+            means=fast.means,
+            scales=fast.scales,
+            categories=fast.categories,
+            shift_fill=fast.shift_fill,
+            roots=roots,
+            left=np.concatenate(left),
+            right=np.concatenate(right),
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            leaf_proba=np.concatenate(leaf_proba),
+            max_depth=max_depth,
+            classes=model.classes_,
+        )
+
+    def save(self, path) -> Path:
+        """Write one .npy per array so they can be memory-mapped on load."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "medians": self.medians, "means": self.means, "scales": self.scales,
+            "categories": self.categories.astype(str), "shift_fill": np.array(self.shift_fill),
+            "roots": self.roots, "left": self.left, "right": self.right, "feature": self.feature,
+            "threshold": self.threshold, "leaf_proba": self.leaf_proba,
+            "max_depth": np.array(self.max_depth), "classes": self.classes,
+        }
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array, allow_pickle=False)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode=None) -> "CompiledForest":
+        path = Path(path)
+        arrays = {p.stem: np.load(p, mmap_mode=mmap_mode, allow_pickle=False) for p in path.glob("*.npy")}
+        arrays["shift_fill"] = arrays["shift_fill"].item()
+        arrays["max_depth"] = arrays["max_depth"].item()
+        return cls(**arrays)
+
+    def transform(self, columns) -> np.ndarray:
+        # Trees compare float32 features, exactly like sklearn does.
+        return self.preprocess.transform(columns, dtype=np.float32)
+
+    def predict_proba_matrix(self, X: np.ndarray) -> np.ndarray:
+        n_trees = len(self.roots)
+        n_features = X.shape[1]
+        proba = np.empty((X.shape[0], self.leaf_proba.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], self.block_rows):
+            block = np.ascontiguousarray(X[start:start + self.block_rows])
+            flat = block.ravel()
+            row_base = (np.arange(block.shape[0], dtype=np.intp) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (block.shape[0], n_trees))
+            for _ in range(self.max_depth):
+                values = flat[row_base + self.feature[nodes]]
+                nodes = np.where(values <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+            proba[start:start + block.shape[0]] = self.leaf_proba[nodes].mean(axis=1)
+        return proba
+
+    def predict_proba(self, columns) -> np.ndarray:
+        return self.predict_proba_matrix(self.transform(columns))
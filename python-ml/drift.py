@@ -0,0 +1,199 @@
+"""Input drift monitoring: live feature histograms against a training-time reference.
+
+`ReferenceProfile.from_frame` runs at training time. Per numeric feature it
+keeps equal-frequency bin edges and the training counts in those bins (plus
+a NaN bucket), and per categorical feature the category counts. It is saved
+beside the model in the registry.
+
+`DriftMonitor.observe` bins every scored batch into the same buckets with
+one searchsorted + bincount per feature, so memory is a fixed set of count
+arrays however much traffic passes. `check` (run on a schedule by the app)
+compares the current window to the reference with PSI and a binned
+two-sample KS statistic, records alerts and starts a new window.
+"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from feature_schema import CATEGORICAL_FEATURE, NUMERIC_FEATURES
+
+REFERENCE_FILE = "drift_reference.json"
+OTHER = "__other__"
+# Proportion floor so empty buckets do not blow up the PSI logarithm.
+PSI_EPSILON = 1e-4
+
+
+class ReferenceProfile:
+    def __init__(self, edges: dict, counts: dict, categories: dict, rows: int, source: str = ""):
+        self.edges = {col: np.asarray(values, dtype=np.float64) for col, values in edges.items()}
+        self.counts = {col: np.asarray(values, dtype=np.int64) for col, values in counts.items()}
+        # {feature: {category: count}}; live values outside these fall into OTHER.
+        self.categories = categories
+        self.rows = int(rows)
+        self.source = source
+
+    @classmethod
+    def from_frame(cls, df, bins: int = 20, source: str = "") -> "ReferenceProfile":
+        edges, counts = {}, {}
+        for col in NUMERIC_FEATURES:
+            values = df[col].to_numpy(dtype=np.float64)
+            finite = values[~np.isnan(values)]
+            edges[col] = np.unique(np.quantile(finite, np.arange(1, bins) / bins)) if len(finite) else np.empty(0)
+            counts[col] = bin_counts(values, edges[col])
+        categories = {
+            CATEGORICAL_FEATURE: {str(k): int(v) for k, v in df[CATEGORICAL_FEATURE].value_counts().items()}
+        }
+        return cls(edges, counts, categories, len(df), source)
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps({
+            "edges": {col: values.tolist() for col, values in self.edges.items()},
+            "counts": {col: values.tolist() for col, values in self.counts.items()},
+            "categories": self.categories,
+            "rows": self.rows,
+            "source": self.source,
+        }))
+        return path
+
+    @classmethod
+    def load(cls, path) -> "ReferenceProfile":
+        return cls(**json.loads(Path(path).read_text()))
+
+
+def bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Counts per bin: len(edges) + 1 value bins, then one NaN bucket."""
+    values = np.asarray(values, dtype=np.float64)
+    idx = np.searchsorted(edges, values, side="right")
+    idx[np.isnan(values)] = len(edges) + 1
+    return np.bincount(idx, minlength=len(edges) + 2)
+
+
+def psi(reference: np.ndarray, live: np.ndarray) -> float:
+    """Population stability index between two count vectors over the same buckets."""
+    p = np.maximum(reference / max(reference.sum(), 1), PSI_EPSILON)
+    q = np.maximum(live / max(live.sum(), 1), PSI_EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def ks_statistic(reference: np.ndarray, live: np.ndarray) -> float:
+    """Largest CDF gap at the bin edges (NaN bucket excluded)."""
+    ref, cur = reference[:-1], live[:-1]
+    if not ref.sum() or not cur.sum():
+        return 0.0
+    return float(np.abs(np.cumsum(ref) / ref.sum() - np.cumsum(cur) / cur.sum()).max())
+
+
+def ks_critical(n: int, m: int, alpha: float) -> float:
+    """Two-sample KS rejection threshold at level `alpha` (asymptotic)."""
+    return math.sqrt(-math.log(alpha / 2) / 2) * math.sqrt((n + m) / (n * m))
+
+
+class DriftMonitor:
+    """Constant-memory live histograms for the serving model's reference profile.
+
+    The window resets whenever the serving version changes (bins belong to its
+    reference) and after every check that had at least `min_rows` rows.
+    """
+
+    def __init__(self, min_rows: int = 500, psi_alert: float = 0.2, ks_alpha: float = 0.01,
+                 history: int = 100):
+        self.min_rows = min_rows
+        self.psi_alert = psi_alert
+        self.ks_alpha = ks_alpha
+        self.version = None
+        self.reference: ReferenceProfile = None
+        self.window_rows = 0
+        self.total_rows = 0
+        self.last_report: dict = None
+        self.alerts = deque(maxlen=history)
+        self._numeric: dict = {}
+        self._categories: dict = {}
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.window_rows = 0
+        self._numeric = {col: np.zeros(len(edges) + 2, np.int64) for col, edges in self.reference.edges.items()}
+        self._categories = {col: dict.fromkeys([*known, OTHER], 0) for col, known in self.reference.categories.items()}
+
+    def observe(self, columns, serving) -> None:
+        """Add a scored batch (column mapping or DataFrame) to the window of `serving`'s reference."""
+        reference = getattr(serving, "reference", None)
+        if reference is None:
+            return
+        n = len(columns[NUMERIC_FEATURES[0]])
+        numeric = {col: bin_counts(columns[col], edges) for col, edges in reference.edges.items()}
+        categories = {}
+        for col, known in reference.categories.items():
+            values = np.asarray(columns[col], dtype=object)
+            counts = {category: int(np.count_nonzero(values == category)) for category in known}
+            counts[OTHER] = n - sum(counts.values())
+            categories[col] = counts
+        with self._lock:
+            if serving.version != self.version:
+                self.version, self.reference = serving.version, reference
+                self._reset()
+            for col, counts in numeric.items():
+                self._numeric[col] += counts
+            for col, counts in categories.items():
+                live = self._categories[col]
+                for value, count in counts.items():
+                    live[value] += count
+            self.window_rows += n
+            self.total_rows += n
+
+    def check(self) -> dict:
+        """Score the current window against the reference; start a new window if it was large enough."""
+        with self._lock:
+            if self.reference is None:
+                # Nothing scored yet, or the serving model has no reference profile.
+                return {"status": "no data", "total_rows": self.total_rows}
+            if self.window_rows < self.min_rows:
+                return {"status": "collecting", "window_rows": self.window_rows, "min_rows": self.min_rows}
+            numeric = {col: counts.copy() for col, counts in self._numeric.items()}
+            categories = {col: dict(counts) for col, counts in self._categories.items()}
+            rows, reference, version = self.window_rows, self.reference, self.version
+            self._reset()
+
+        critical = ks_critical(reference.rows, rows, self.ks_alpha)
+        features = {}
+        for col, live in numeric.items():
+            ref = reference.counts[col]
+            features[col] = {"psi": psi(ref, live), "ks": ks_statistic(ref, live), "ks_critical": critical,
+                             "nan_rate": float(live[-1] / rows)}
+        for col, live in categories.items():
+            ref = np.array([reference.categories[col].get(k, 0) for k in live], dtype=np.float64)
+            cur = np.array(list(live.values()), dtype=np.float64)
+            features[col] = {"psi": psi(ref, cur), "distribution": {k: v / rows for k, v in live.items()}}
+
+        now = time.time()
+        alerts = [
+            {"time": now, "version": version, "feature": col, "psi": stats["psi"], "ks": stats.get("ks")}
+            for col, stats in features.items()
+            if stats["psi"] > self.psi_alert or stats.get("ks", 0.0) > stats.get("ks_critical", math.inf)
+        ]
+        report = {"status": "drift" if alerts else "ok", "time": now, "version": version,
+                  "window_rows": rows, "features": features}
+        with self._lock:
+            self.last_report = report
+            self.alerts.extend(alerts)
+        return report
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "reference_rows": self.reference.rows if self.reference else None,
+                "reference_source": self.reference.source if self.reference else None,
+                "window_rows": self.window_rows,
+                "total_rows": self.total_rows,
+                "psi_alert": self.psi_alert,
+                "ks_alpha": self.ks_alpha,
+                "last_report": self.last_report,
+                "alerts": list(self.alerts),
+            }
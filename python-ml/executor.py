@@ -0,0 +1,185 @@
+"""Where MLService work runs: in-process threads or a pool of worker processes.
+
+Both executors expose the same async interface so the FastAPI handlers never
+block the event loop on inference or training.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from metrics import BATCH_ROWS
+from ml_service import MLService, take_rows
+from model_budget import Budget
+
+
+def _activate(service: MLService):
+    """Point `service` at the registry's current version and load it now."""
+    service._load_model()
+    return service.version
+
+
+class InlineExecutor:
+    """Run scoring and training on the app's own MLService in worker threads."""
+
+    def __init__(self, service: MLService):
+        self.service = service
+        self.max_concurrency = 1
+
+    async def start(self):
+        pass
+
+    async def predict_batch(self, columns) -> list:
+        return await asyncio.to_thread(self.service.predict_batch, columns)
+
+    async def predict_proba(self, columns) -> tuple:
+        return await asyncio.to_thread(self.service.predict_proba, columns)
+
+    async def train(self, data_path: str, model: str = "random_forest", budget: Budget = None) -> dict:
+        return await asyncio.to_thread(self.service.train, data_path, model=model, budget=budget)
+
+    async def publish(self):
+        """Serve whatever version the registry now marks as current."""
+        await asyncio.to_thread(_activate, self.service)
+
+    def shutdown(self):
+        pass
+
+
+# Per-process state of inference workers.
+_worker_service: MLService = None
+
+
+def _init_worker(model_dir: str, backend: str, warmup_rows: int):
+    global _worker_service
+    _worker_service = MLService(model_dir=model_dir, backend=backend, auto_train=False, load=False)
+    _worker_service.load(warmup_rows)  # load now rather than on the first request
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _sync(version: str):
+    # Serve exactly the version the parent looked up, whatever the registry marks as current by now.
+    if version is not None and _worker_service.version != version:
+        _worker_service.load(version=version)
+
+
+def _score(columns, version: str) -> list:
+    _sync(version)
+    return _worker_service.predict_batch(columns)
+
+
+def _score_proba(columns, version: str) -> tuple:
+    _sync(version)
+    return _worker_service._defect_proba(columns)
+
+
+def _init_trainer():
+    # Leave CPU headroom for the inference workers while a forest is fitted.
+    os.nice(10)
+
+
+def _train(model_dir: str, backend: str, data_path: str, model: str, budget: Budget) -> dict:
+    return MLService(model_dir=model_dir, backend=backend, load=False).train(data_path, model=model, budget=budget)
+
+
+class ProcessPoolInference:
+    """Score in `workers` processes that each hold one loaded model.
+
+    Training runs in a separate single-process pool that registers and
+    promotes the new version. Every request carries the version the parent
+    serves at that moment (the one its cache entries are keyed on), and a
+    worker holding another version loads that one before scoring.
+    """
+
+    def __init__(self, service: MLService, workers: int = None, warmup_rows: int = 0):
+        self.service = service
+        self.workers = workers or os.cpu_count() or 1
+        self.warmup_rows = warmup_rows
+        self.max_concurrency = self.workers
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self._pool: ProcessPoolExecutor = None
+        self._trainer: ProcessPoolExecutor = None
+        self._train_lock = asyncio.Lock()
+
+    async def start(self):
+        model_dir, backend = str(self.service.model_dir), self.service.backend
+        self._pool = ProcessPoolExecutor(
+            self.workers, mp_context=self._context, initializer=_init_worker,
+            initargs=(model_dir, backend, self.warmup_rows)
+        )
+        self._trainer = ProcessPoolExecutor(1, mp_context=self._context, initializer=_init_trainer)
+        # Bring every worker up (and its model loaded) before taking traffic.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)))
+        await asyncio.to_thread(_activate, self.service)
+
+    async def _dispatch(self, columns, version: str) -> list:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _score, columns, version)
+
+    async def predict_batch(self, columns) -> list:
+        # One snapshot per request: the cache key and the worker's model are the same version.
+        serving = self.service._current()
+        version = serving.version if serving else None
+        # The drift monitor and prediction cache live in this process, in front of the workers.
+        if self.service.monitor is not None:
+            self.service.monitor.observe(columns, serving)
+        cache = self.service.cache
+        if cache is None:
+            return await self._dispatch(columns, version)
+        keys, results, miss = cache.lookup(columns, version)
+        if miss:
+            subset = columns if len(miss) == len(keys) else take_rows(columns, miss)
+            cache.fill(keys, results, miss, await self._dispatch(subset, version), version)
+        return results
+
+    async def predict_proba(self, columns) -> tuple:
+        """Split the rows evenly over the workers and concatenate their (probability, confidence) arrays."""
+        n = len(columns["temperature"])
+        if n == 0:
+            return np.empty(0), np.empty(0)
+        BATCH_ROWS.observe(n)
+        serving = self.service._current()
+        if self.service.monitor is not None:
+            self.service.monitor.observe(columns, serving)
+        loop = asyncio.get_running_loop()
+        step = -(-n // self.workers)
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(self._pool, _score_proba,
+                                 {col: values[start:start + step] for col, values in columns.items()},
+                                 serving.version if serving else None)
+            for start in range(0, n, step)
+        ))
+        return np.concatenate([p for p, _ in parts]), np.concatenate([c for _, c in parts])
+
+    async def train(self, data_path: str, model: str = "random_forest", budget: Budget = None) -> dict:
+        async with self._train_lock:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._trainer, _train, str(self.service.model_dir), self.service.backend, data_path, model, budget
+            )
+            await self.publish()
+            return result
+
+    async def publish(self):
+        """Serve the registry's current version here; workers follow with the next request they get."""
+        await asyncio.to_thread(_activate, self.service)
+
+    def shutdown(self):
+        for pool in (self._pool, self._trainer):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_executor(kind: str, service: MLService, workers: int = None, warmup_rows: int = 0):
+    if kind == "inline":
+        return InlineExecutor(service)
+    if kind == "process":
+        return ProcessPoolInference(service, workers, warmup_rows)
+    raise ValueError(f"Unknown executor {kind!r}, expected 'inline' or 'process'")
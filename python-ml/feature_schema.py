@@ -0,0 +1,157 @@
+"""The model's input features: names, dtypes, valid ranges and categories, and their preprocessing.
+
+Training (python-ml and ai-process-optimization) and serving both build
+their preprocessor with `make_preprocessor`, so the two cannot drift apart.
+Serving then replaces the fitted ColumnTransformer with `FastTransform`:
+the same impute + scale + one-hot, precomputed into a few arrays and
+written into one preallocated matrix, without pandas.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class NumericFeature:
+    name: str
+    unit: str
+    # Physically plausible range; values outside are reported by `validate`, not clipped.
+    low: float
+    high: float
+    dtype: str = "float64"
+
+
+@dataclass(frozen=True)
+class CategoricalFeature:
+    name: str
+    categories: tuple
+    dtype: str = "object"
+
+
+NUMERIC = (
+    NumericFeature("temperature", "°C", 20.0, 200.0),
+    NumericFeature("line_speed", "unit/min", 0.0, 300.0),
+    NumericFeature("operator_experience", "year", 0.0, 50.0),
+    NumericFeature("machine_age", "month", 0.0, 600.0),
+)
+CATEGORICAL = CategoricalFeature("shift", ("Day", "Night"))
+TARGET = "defect"
+
+NUMERIC_FEATURES = [feature.name for feature in NUMERIC]
+CATEGORICAL_FEATURE = CATEGORICAL.name
+# Column order of the raw input, as in production_data.csv.
+FEATURE_COLUMNS = ["temperature", "line_speed", "shift", "operator_experience", "machine_age"]
+DTYPES = {feature.name: feature.dtype for feature in (*NUMERIC, CATEGORICAL)}
+
+
+def make_preprocessor():
+    """Median impute + standard scale the numeric features, mode impute + one-hot the shift (dense)."""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    numeric = Pipeline(steps=[
+        ("imputer", SimpleImputer(strategy="median")),
+        ("scaler", StandardScaler()),
+    ])
+    categorical = Pipeline(steps=[
+        ("imputer", SimpleImputer(strategy="most_frequent")),
+        ("encoder", OneHotEncoder(handle_unknown="ignore", sparse_output=False)),
+    ])
+    return ColumnTransformer(transformers=[
+        ("num", numeric, NUMERIC_FEATURES),
+        ("cat", categorical, [CATEGORICAL_FEATURE]),
+    ])
+
+
+def feature_names(preprocessor) -> list:
+    """Output column names of a fitted `make_preprocessor()`: numeric features, then shift_<category>."""
+    categories = preprocessor.named_transformers_["cat"].named_steps["encoder"].categories_[0]
+    return NUMERIC_FEATURES + [f"{CATEGORICAL_FEATURE}_{category}" for category in categories]
+
+
+def pipeline_frame(columns):
+    """`columns` (a mapping or DataFrame) as the DataFrame the fitted pipeline scores.
+
+    SimpleImputer only takes NaN as missing in an object column (it tests
+    `X != X`), and whether a None shift reaches it as None or NaN depends on
+    the pandas version. A None shift is set to NaN here, so it is imputed.
+    """
+    import pandas as pd
+
+    frame = columns if isinstance(columns, pd.DataFrame) else pd.DataFrame(columns)
+    shift = frame[CATEGORICAL_FEATURE]
+    return frame[FEATURE_COLUMNS].assign(**{CATEGORICAL_FEATURE: shift.where(shift.notna(), np.nan)})
+
+
+def validate(columns) -> dict:
+    """Per feature, the number of missing, out-of-range and unknown-category values."""
+    report = {}
+    for feature in NUMERIC:
+        values = np.asarray(columns[feature.name], dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            outside = (values < feature.low) | (values > feature.high)
+        report[feature.name] = {"missing": int(np.isnan(values).sum()), "out_of_range": int(outside.sum())}
+    values = np.asarray(columns[CATEGORICAL_FEATURE], dtype=object)
+    missing = np.array([value is None or value != value for value in values], dtype=bool)
+    known = np.isin(values[~missing].astype(str), CATEGORICAL.categories)
+    report[CATEGORICAL_FEATURE] = {"missing": int(missing.sum()), "unknown": int((~known).sum())}
+    return report
+
+
+class FastTransform:
+    """A fitted `make_preprocessor()` as arrays: one pass from raw columns to the model matrix."""
+
+    def __init__(self, medians, means, scales, categories, shift_fill):
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.categories = np.asarray(categories, dtype=object)
+        self.shift_fill = str(shift_fill)
+        self.n_features = len(NUMERIC_FEATURES) + len(self.categories)
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor) -> "FastTransform":
+        """Raises ValueError if `preprocessor` is not a fitted `make_preprocessor()`."""
+        try:
+            columns = [list(cols) for _, _, cols in preprocessor.transformers_[:2]]
+            numeric = preprocessor.named_transformers_["num"].named_steps
+            categorical = preprocessor.named_transformers_["cat"].named_steps
+            scaler = numeric["scaler"]
+            fast = cls(
+                medians=numeric["imputer"].statistics_,
+                means=scaler.mean_ if scaler.with_mean else np.zeros(len(NUMERIC_FEATURES)),
+                scales=scaler.scale_ if scaler.with_std else np.ones(len(NUMERIC_FEATURES)),
+                categories=categorical["encoder"].categories_[0],
+                shift_fill=categorical["imputer"].statistics_[0],
+            )
+        except (AttributeError, KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"Not a fitted feature_schema preprocessor: {e}") from None
+        if columns != [NUMERIC_FEATURES, [CATEGORICAL_FEATURE]]:
+            raise ValueError(f"Preprocessor columns {columns} do not match the schema")
+        return fast
+
+    def transform(self, columns, out: np.ndarray = None, dtype=np.float64) -> np.ndarray:
+        """Impute, scale and one-hot `columns` (a mapping or DataFrame) into `out` (rows x n_features).
+
+        Scaling is done in float64 whatever `dtype` is, so a float32 matrix
+        holds exactly what sklearn's float64 output would round to. A None or
+        NaN shift is imputed, as in the frame `pipeline_frame` builds.
+        """
+        shift = np.asarray(columns[CATEGORICAL_FEATURE], dtype=object)
+        n, n_num = len(shift), len(NUMERIC_FEATURES)
+        if out is None:
+            out = np.empty((n, self.n_features), dtype=dtype)
+        for j, name in enumerate(NUMERIC_FEATURES):
+            values = np.asarray(columns[name], dtype=np.float64)
+            missing = np.isnan(values)
+            if missing.any():
+                values = np.where(missing, self.medians[j], values)
+            out[:, j] = (values - self.means[j]) / self.scales[j]
+        missing = np.array([value is None or value != value for value in shift], dtype=bool)
+        if missing.any():
+            shift = np.where(missing, self.shift_fill, shift)
+        for k, category in enumerate(self.categories):
+            np.equal(shift, category, out=out[:, n_num + k], casting="unsafe")
+        return out
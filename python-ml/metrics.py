@@ -0,0 +1,158 @@
+"""In-process latency/size histograms in Prometheus text format, plus sampled profiles of slow calls.
+
+Histograms keep one count per fixed bucket (non-cumulative, summed when
+rendered), so an observation is a bisect and two additions under a lock.
+The module-level metrics below are shared by MLService and the app;
+`render()` produces the /metrics body.
+
+With the process executor, scoring stages are recorded inside the worker
+processes and do not appear here; request, batch-size and train metrics
+are recorded in the app process either way.
+"""
+import cProfile
+import heapq
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+# Seconds: 50 us .. 10 s.
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds: model loads and training runs.
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(labels)
+        # label values -> [bucket counts (+Inf last), sum]
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels) -> "_Timer":
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    # A plain class rather than @contextmanager: this sits on every request, several times.
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+STAGE_SECONDS = Histogram(
+    "ml_stage_seconds",
+    "Time per scoring stage: parse, frame, preprocess, model, results, serialize",
+    LATENCY_BUCKETS, ("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "ml_http_request_seconds", "HTTP request duration by route and status", LATENCY_BUCKETS,
+    ("method", "route", "status"),
+)
+BATCH_ROWS = Histogram("ml_batch_rows", "Rows per predict_batch call", SIZE_BUCKETS)
+MODEL_LOAD_SECONDS = Histogram("ml_model_load_seconds", "Time to load a model version for serving", SLOW_BUCKETS)
+TRAIN_SECONDS = Histogram("ml_train_seconds", "Training run duration by model family", SLOW_BUCKETS, ("model",))
+ALL = [REQUEST_SECONDS, STAGE_SECONDS, BATCH_ROWS, MODEL_LOAD_SECONDS, TRAIN_SECONDS]
+
+
+def render() -> str:
+    return "\n".join(line for histogram in ALL for line in histogram.render()) + "\n"
+
+
+class SlowCallProfiler:
+    """Profile a random `sample_rate` of calls and keep the `keep` slowest as .prof dumps in `directory`.
+
+    One call is profiled at a time; open the dumps with pstats or snakeviz.
+    """
+
+    def __init__(self, directory, sample_rate: float = 0.01, keep: int = 20):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._slowest: list = []  # min-heap of (seconds, path)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self.profiled = 0
+
+    @contextmanager
+    def maybe_profile(self, label: str):
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            self._busy.release()
+            self._record(profile, elapsed, label)
+
+    def _record(self, profile: cProfile.Profile, elapsed: float, label: str):
+        with self._lock:
+            self.profiled += 1
+            if len(self._slowest) >= self.keep and elapsed <= self._slowest[0][0]:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{elapsed * 1000:09.3f}ms-{label}-{time.time_ns()}.prof"
+            profile.dump_stats(path)
+            heapq.heappush(self._slowest, (elapsed, str(path)))
+            if len(self._slowest) > self.keep:
+                Path(heapq.heappop(self._slowest)[1]).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        return {
+            "sample_rate": self.sample_rate,
+            "profiled": self.profiled,
+            "kept": [{"ms": seconds * 1000, "path": path} for seconds, path in slowest],
+        }
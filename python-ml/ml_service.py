@@ -1,118 +1,333 @@
-import pandas as pd
+from __future__ import annotations
+
 import numpy as np
 import joblib
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.impute import SimpleImputer
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import roc_auc_score, classification_report
+from typing import TYPE_CHECKING, Optional
+
+from compiled_forest import CompiledForest
+from drift import REFERENCE_FILE, ReferenceProfile
+from feature_schema import (
+    FEATURE_COLUMNS, NUMERIC_FEATURES, TARGET, FastTransform, feature_names, make_preprocessor, pipeline_frame,
+    validate,
+)
+from metrics import BATCH_ROWS, MODEL_LOAD_SECONDS, STAGE_SECONDS, TRAIN_SECONDS
+from model_budget import Budget
+from model_registry import ModelRegistry, file_sha256
+
+# pandas and scikit-learn are imported where they are used: together they take
+# ~1.5 s to import, which would otherwise sit on the service's startup path.
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+BACKENDS = ("sklearn", "compiled")
+DEFAULT_DATA_PATH = Path(__file__).parent.parent / "ai-process-optimization" / "data" / "production_data.csv"
+
+
+def synthetic_rows(n: int) -> dict:
+    """`n` plausible feature rows spread over the usual operating ranges, for warming a model up."""
+    grid = np.linspace(0.0, 1.0, n)
+    return {
+        "temperature": 60 + 50 * grid,
+        "line_speed": 120 - 60 * grid,
+        "shift": np.where(np.arange(n) % 2 == 0, "Day", "Night").astype(object),
+        "operator_experience": 20 * grid[::-1],
+        "machine_age": 120 * grid,
+    }
+
+
+def take_rows(columns, idx) -> dict:
+    """Select rows `idx` from a column mapping (or DataFrame)."""
+    return {col: np.asarray(columns[col])[idx] for col in FEATURE_COLUMNS}
+
+
+@dataclass(frozen=True)
+class ServingModel:
+    """Everything one request needs, swapped as a single reference."""
+    version: str
+    pipeline: Pipeline
+    compiled: Optional[CompiledForest] = None
+    # The fitted preprocessor as arrays; None for pipelines that do not follow feature_schema.
+    fast: Optional[FastTransform] = None
+    feature_importance: dict = field(default_factory=dict)
+    # Training-data profile for drift monitoring; only loaded when a monitor is attached.
+    reference: Optional[ReferenceProfile] = None
 
 
 class MLService:
-    def __init__(self, model_dir: str = "models"):
+    def __init__(self, model_dir: str = "models", backend: str = "sklearn", cache=None, monitor=None,
+                 profiler=None, auto_train: bool = True, load: bool = True):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
         self.model_dir = Path(model_dir)
         self.model_dir.mkdir(exist_ok=True)
-        self.model: Pipeline = None
-        self.feature_importance: dict = {}
-        self._load_model()
+        self.backend = backend
+        # Optional PredictionCache in front of predict/predict_batch.
+        self.cache = cache
+        # Optional DriftMonitor fed with every batch predict_batch receives.
+        self.monitor = monitor
+        # Optional metrics.SlowCallProfiler sampling predict_batch calls.
+        self.profiler = profiler
+        self.registry = ModelRegistry(self.model_dir / "registry")
+        self._serving: Optional[ServingModel] = None
+        self._pending_version: Optional[str] = None
+        self._swap_lock = threading.Lock()
+        # Train on the bundled data when the registry is empty (off for fast boot).
+        self.auto_train = auto_train
+        if load:
+            self._load_model()
+
+    @property
+    def model(self) -> Optional[Pipeline]:
+        serving = self._current()
+        return serving.pipeline if serving else None
+
+    @property
+    def compiled(self) -> Optional[CompiledForest]:
+        serving = self._current()
+        return serving.compiled if serving else None
+
+    @property
+    def feature_importance(self) -> dict:
+        serving = self._current()
+        return serving.feature_importance if serving else {}
+
+    @property
+    def version(self) -> Optional[str]:
+        serving = self._current()
+        return serving.version if serving else None
 
     def is_loaded(self) -> bool:
-        return self.model is not None
+        return self._serving is not None or self._pending_version is not None
 
     def _load_model(self):
-        rf_path = self.model_dir / "random_forest.pkl"
-        if rf_path.exists():
-            self.model = joblib.load(rf_path)
-            self._extract_feature_importance()
-        else:
+        """Point the service at the registry's current version; the artifact loads on first use."""
+        legacy_path = self.model_dir / "random_forest.pkl"
+        if self.registry.current() is None and legacy_path.exists():
+            # Adopt a model saved before the registry existed.
+            version = self.registry.register(joblib.load(legacy_path), {"source": str(legacy_path)})
+            self.registry.promote(version)
+
+        version = self.registry.current()
+        if version is not None:
+            if self._serving is None or self._serving.version != version:
+                self._pending_version = version
+        elif self.auto_train and DEFAULT_DATA_PATH.exists():
             # Train initial model if not exists
-            data_path = Path(__file__).parent.parent / "ai-process-optimization" / "data" / "production_data.csv"
-            if data_path.exists():
-                self.train(str(data_path))
-
-    def _make_preprocessor(self):
-        numeric_features = ["temperature", "line_speed", "operator_experience", "machine_age"]
-        categorical_features = ["shift"]
-
-        numeric_transformer = Pipeline(steps=[
-            ("imputer", SimpleImputer(strategy="median")),
-            ("scaler", StandardScaler())
-        ])
-
-        categorical_transformer = Pipeline(steps=[
-            ("imputer", SimpleImputer(strategy="most_frequent")),
-            ("encoder", OneHotEncoder(handle_unknown="ignore", sparse_output=False))
-        ])
-
-        return ColumnTransformer(transformers=[
-            ("num", numeric_transformer, numeric_features),
-            ("cat", categorical_transformer, categorical_features)
-        ])
-
-    def _get_feature_names(self, preprocessor):
-        numeric_features = ["temperature", "line_speed", "operator_experience", "machine_age"]
-        cat_encoder = preprocessor.named_transformers_["cat"].named_steps["encoder"]
-        cat_features = cat_encoder.get_feature_names_out(["shift"]).tolist()
-        return numeric_features + cat_features
-
-    def _extract_feature_importance(self):
-        if self.model is None:
-            return
+            self.train(str(DEFAULT_DATA_PATH))
+
+    def load(self, warmup_rows: int = 0, version: str = None) -> Optional[str]:
+        """Load the registry's current version (or `version`) now and optionally score a synthetic batch.
+
+        The warm-up pays for first-use costs (imports, lazy initialisation,
+        thread pools) before real traffic arrives. Returns the loaded version.
+        """
+        if version is None:
+            self._load_model()
+        else:
+            if version not in self.registry.versions():
+                raise KeyError(f"Unknown model version {version!r}")
+            with self._swap_lock:
+                self._serving = self._build_serving(version)
+                self._pending_version = None
+        serving = self._current()
+        if serving is not None and warmup_rows > 0:
+            self._defect_proba(synthetic_rows(warmup_rows), serving)
+            self._defect_proba(synthetic_rows(1), serving)
+        return serving.version if serving else None
+
+    def _current(self) -> Optional[ServingModel]:
+        if self._pending_version is not None:
+            with self._swap_lock:
+                if self._pending_version is not None:
+                    self._serving = self._build_serving(self._pending_version)
+                    self._pending_version = None
+        return self._serving
+
+    def _build_serving(self, version: str) -> ServingModel:
+        start = time.perf_counter()
+        # Memory-mapped, so workers on one host share the artifact's pages.
+        pipeline = self.registry.load(version, mmap_mode="r")
+        compiled = None
+        # Only forests compile; other models are scored by sklearn on either backend.
+        if self.backend == "compiled" and hasattr(pipeline.named_steps["model"], "estimators_"):
+            compiled_dir = self.registry.path(version) / "compiled"
+            if not compiled_dir.exists():
+                self.export_compiled(version, pipeline)
+            compiled = CompiledForest.load(compiled_dir, mmap_mode="r")
         try:
-            preprocessor = self.model.named_steps["preprocess"]
-            model = self.model.named_steps["model"]
-            feature_names = self._get_feature_names(preprocessor)
+            fast = FastTransform.from_preprocessor(pipeline.named_steps["preprocess"])
+        except ValueError:
+            fast = None
+        reference = self._reference(version) if self.monitor is not None else None
+        serving = ServingModel(version, pipeline, compiled, fast, self._extract_feature_importance(pipeline),
+                               reference)
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - start)
+        return serving
+
+    def _reference(self, version: str) -> Optional[ReferenceProfile]:
+        """The version's drift reference; built from its training data for versions that predate it."""
+        path = self.registry.path(version) / REFERENCE_FILE
+        if path.exists():
+            return ReferenceProfile.load(path)
+        data_path = Path(self.registry.metadata(version).get("data_path", DEFAULT_DATA_PATH))
+        if not data_path.exists():
+            return None
+        X_train = self._training_split(str(data_path))[0]
+        reference = ReferenceProfile.from_frame(X_train, source=str(data_path))
+        reference.save(path)
+        return reference
+
+    def export_compiled(self, version: str = None, pipeline: Pipeline = None) -> CompiledForest:
+        """Flatten a registered pipeline into NumPy arrays stored beside its pickle."""
+        version = version or self.version
+        pipeline = pipeline if pipeline is not None else self.registry.load(version)
+        compiled = CompiledForest.from_pipeline(pipeline)
+        compiled.save(self.registry.path(version) / "compiled")
+        return compiled
+
+    def promote(self, version: str) -> str:
+        """Make `version` the serving model; in-flight requests finish on the old one.
+
+        This is the one way to change the serving model: executor workers
+        follow the version each request is sent with (see executor).
+        """
+        self.registry.promote(version)
+        return self._serve(version)
+
+    def rollback(self) -> str:
+        """Serve the version that was serving before the current one again."""
+        return self._serve(self.registry.rollback())
+
+    def _serve(self, version: str) -> str:
+        serving = self._build_serving(version)
+        with self._swap_lock:
+            self._serving = serving
+            self._pending_version = None
+        return version
+
+    def list_models(self) -> dict:
+        return {
+            "current": self.registry.current(),
+            "versions": [self.registry.metadata(v) for v in self.registry.versions()],
+        }
+
+    def _extract_feature_importance(self, pipeline: Pipeline) -> dict:
+        try:
+            preprocessor = pipeline.named_steps["preprocess"]
+            model = pipeline.named_steps["model"]
             if hasattr(model, "feature_importances_"):
-                self.feature_importance = dict(zip(feature_names, model.feature_importances_.tolist()))
+                return dict(zip(feature_names(preprocessor), model.feature_importances_.tolist()))
         except Exception:
             pass
+        return {}
 
-    def _remove_outliers_iqr(self, df, numeric_cols, whisker_width=1.5):
-        df_clean = df.copy()
-        for col in numeric_cols:
-            Q1 = df_clean[col].quantile(0.25)
-            Q3 = df_clean[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower = Q1 - whisker_width * IQR
-            upper = Q3 + whisker_width * IQR
-            df_clean = df_clean[(df_clean[col] >= lower) & (df_clean[col] <= upper)]
-        return df_clean
+    def _defect_proba(self, columns, serving: Optional[ServingModel] = None) -> tuple:
+        # Take one snapshot so a concurrent promote cannot mix two models.
+        serving = serving or self._current()
+        if serving is None:
+            # Mock probabilities if no model
+            prob = np.clip((np.asarray(columns["temperature"], dtype=float) - 70) / 50, 0.05, 0.95)
+            return prob, np.maximum(prob, 1 - prob)
+
+        if serving.compiled is not None:
+            with STAGE_SECONDS.time("preprocess"):
+                X = serving.compiled.transform(columns)
+            with STAGE_SECONDS.time("model"):
+                proba = serving.compiled.predict_proba_matrix(X)
+        elif serving.fast is not None:
+            with STAGE_SECONDS.time("preprocess"):
+                X = serving.fast.transform(columns)
+            with STAGE_SECONDS.time("model"):
+                proba = serving.pipeline.named_steps["model"].predict_proba(X)
+        else:
+            # Same as pipeline.predict_proba, split so each step is timed.
+            with STAGE_SECONDS.time("frame"):
+                input_df = pipeline_frame(columns)
+            with STAGE_SECONDS.time("preprocess"):
+                X = serving.pipeline.named_steps["preprocess"].transform(input_df)
+            with STAGE_SECONDS.time("model"):
+                proba = serving.pipeline.named_steps["model"].predict_proba(X)
+        defect_prob = proba[:, 1] if proba.shape[1] > 1 else proba[:, 0]
+        confidence = proba.max(axis=1)
+        return defect_prob, confidence
 
     def predict(self, temperature: float, line_speed: float, shift: str,
                 operator_experience: float, machine_age: float) -> dict:
-        if self.model is None:
-            # Return mock prediction if no model
-            prob = min(0.95, max(0.05, (temperature - 70) / 50))
-            return {
-                "defect_probability": float(prob),
-                "predicted_defect": prob >= 0.5,
-                "confidence": float(max(prob, 1 - prob))
-            }
+        columns = {
+            "temperature": [temperature],
+            "line_speed": [line_speed],
+            "shift": [shift],
+            "operator_experience": [operator_experience],
+            "machine_age": [machine_age]
+        }
+        return self.predict_batch(columns)[0]
 
-        input_df = pd.DataFrame([{
-            "temperature": temperature,
-            "line_speed": line_speed,
-            "shift": shift,
-            "operator_experience": operator_experience,
-            "machine_age": machine_age
-        }])
+    def predict_batch(self, data) -> list:
+        """Score many rows with a single predict_proba call.
 
-        proba = self.model.predict_proba(input_df)[0]
-        defect_prob = proba[1] if len(proba) > 1 else proba[0]
-        predicted = defect_prob >= 0.5
-        confidence = max(proba)
+        `data` is a DataFrame or a mapping of column name -> sequence; results
+        are returned in input order.
+        """
+        import pandas as pd
 
-        return {
-            "defect_probability": float(defect_prob),
-            "predicted_defect": bool(predicted),
-            "confidence": float(confidence)
-        }
+        columns = data if isinstance(data, pd.DataFrame) else {col: data[col] for col in FEATURE_COLUMNS}
+        if len(columns["temperature"]) == 0:
+            return []
+        BATCH_ROWS.observe(len(columns["temperature"]))
+        if self.profiler is None:
+            return self._predict_batch(columns)
+        with self.profiler.maybe_profile(f"batch{len(columns['temperature'])}"):
+            return self._predict_batch(columns)
+
+    def predict_proba(self, columns) -> tuple:
+        """(defect probability, confidence) arrays for a mapping of column arrays.
+
+        The bulk path behind /predict/columnar: no per-row result dicts and
+        no prediction cache, whose per-row keys would cost more than scoring.
+        """
+        n = len(columns["temperature"])
+        if n == 0:
+            return np.empty(0), np.empty(0)
+        BATCH_ROWS.observe(n)
+        if self.monitor is not None:
+            self.monitor.observe(columns, self._current())
+        if self.profiler is None:
+            return self._defect_proba(columns)
+        with self.profiler.maybe_profile(f"proba{n}"):
+            return self._defect_proba(columns)
+
+    def _predict_batch(self, columns) -> list:
+        # One snapshot, so a concurrent promote cannot cache one model's result under another's version.
+        serving = self._current()
+        if self.monitor is not None:
+            self.monitor.observe(columns, serving)
+        if self.cache is None:
+            return self._score(columns, serving)
+
+        version = serving.version if serving else None
+        keys, results, miss = self.cache.lookup(columns, version)
+        if miss:
+            subset = columns if len(miss) == len(keys) else take_rows(columns, miss)
+            self.cache.fill(keys, results, miss, self._score(subset, serving), version)
+        return results
+
+    def _score(self, columns, serving: Optional[ServingModel] = None) -> list:
+        defect_prob, confidence = self._defect_proba(columns, serving)
+        with STAGE_SECONDS.time("results"):
+            predicted = defect_prob >= 0.5
+            return [
+                {"defect_probability": p, "predicted_defect": d, "confidence": c}
+                for p, d, c in zip(defect_prob.tolist(), predicted.tolist(), confidence.tolist())
+            ]
 
     def get_feature_importance(self) -> dict:
-        if not self.feature_importance:
+        feature_importance = self.feature_importance
+        if not feature_importance:
             # Return mock importance if no model
             return {
                 "temperature": 0.35,
@@ -122,56 +337,149 @@ class MLService:
                 "shift_Day": 0.07,
                 "shift_Night": 0.06
             }
-        return self.feature_importance
+        return feature_importance
 
-    def train(self, data_path: str) -> dict:
-        df = pd.read_csv(data_path)
-        numeric_cols = ["temperature", "line_speed", "operator_experience", "machine_age"]
-        df_clean = self._remove_outliers_iqr(df, numeric_cols)
+    def _training_split(self, data_path: str) -> tuple:
+        import pandas as pd
+        from sklearn.model_selection import train_test_split
 
-        X = df_clean.drop(columns=["defect"])
-        y = df_clean["defect"]
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
+        from outliers import remove_outliers_iqr
+
+        df = pd.read_csv(data_path, usecols=FEATURE_COLUMNS + [TARGET])
+        df_clean = remove_outliers_iqr(df, NUMERIC_FEATURES)
 
-        rf = Pipeline([
-            ("preprocess", self._make_preprocessor()),
-            ("model", RandomForestClassifier(
-                n_estimators=300, max_depth=12, min_samples_split=4,
-                random_state=42, n_jobs=-1
-            ))
-        ])
+        X = df_clean[FEATURE_COLUMNS]
+        y = df_clean[TARGET]
+        return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
-        rf.fit(X_train, y_train)
-        rf_proba = rf.predict_proba(X_test)[:, 1]
-        auc = roc_auc_score(y_test, rf_proba)
-        report = classification_report(y_test, rf.predict(X_test))
+    def train(self, data_path: str, promote: bool = True, model: str = "random_forest",
+              budget: Budget = None) -> dict:
+        """Fit `model` (a model_budget.MODEL_FAMILIES key) and register the best candidate within `budget`.
 
-        model_path = self.model_dir / "random_forest.pkl"
-        joblib.dump(rf, model_path)
-        self.model = rf
-        self._extract_feature_importance()
+        The result lists every candidate's AUC, latency and size next to the
+        currently serving model, measured on the same holdout rows.
+        `model="streaming_forest"` trains out of core instead (see out_of_core.py).
+        """
+        from sklearn.metrics import classification_report
+
+        from model_budget import fit_within_budget, profile
+        from out_of_core import MODEL_NAME as STREAMING_MODEL
+
+        start = time.perf_counter()
+        if model == STREAMING_MODEL:
+            return self._train_out_of_core(data_path, promote, budget, start)
+        X_train, X_test, y_train, y_test = self._training_split(data_path)
+        pipeline, stats, candidates = fit_within_budget(
+            model, make_preprocessor, X_train, y_train, X_test, y_test, budget
+        )
+        report = classification_report(y_test, pipeline.predict(X_test))
+        current = self._current()
+        reference = None
+        if current is not None:
+            reference = {"candidate": f"serving {current.version}", **profile(current.pipeline, X_test, y_test)}
+
+        version = self._register(pipeline, {
+            "model": type(pipeline.named_steps["model"]).__name__,
+            "family": model,
+            "candidate": stats["candidate"],
+            "auc": stats["auc"],
+            "p99_ms": stats["p99_ms"],
+            "size_bytes": stats["size_bytes"],
+            "data_path": str(data_path),
+            "data_sha256": file_sha256(data_path),
+            "train_rows": int(len(X_train)),
+            "features": FEATURE_COLUMNS,
+        }, X_train, promote)
+        TRAIN_SECONDS.observe(time.perf_counter() - start, model)
 
         return {
-            "model_path": str(model_path),
-            "auc_score": float(auc),
+            "version": version,
+            "model_path": str(self.registry.path(version) / "model.pkl"),
+            "promoted": promote,
+            "model": model,
+            "candidate": stats["candidate"],
+            "auc_score": stats["auc"],
+            "p99_ms": stats["p99_ms"],
+            "size_bytes": stats["size_bytes"],
+            "candidates": candidates,
+            "reference": reference,
+            # Missing / out-of-range / unknown-category counts against feature_schema.
+            "input_report": validate(X_train),
             "classification_report": report
         }
 
+    def _register(self, pipeline, metadata: dict, reference_rows, promote: bool) -> str:
+        version = self.registry.register(pipeline, metadata)
+        ReferenceProfile.from_frame(reference_rows, source=metadata["data_path"]).save(
+            self.registry.path(version) / REFERENCE_FILE
+        )
+        if promote:
+            self.promote(version)
+        return version
+
+    def _train_out_of_core(self, data_path: str, promote: bool, budget: Optional[Budget], start: float) -> dict:
+        """Stream `data_path` in chunks into a bagged forest; memory stays at about one chunk."""
+        from model_budget import profile
+        from out_of_core import MODEL_NAME, StreamingSplit, iter_inliers, train_out_of_core
+
+        # The split copies the whole history; it is only needed until the holdout rows are read.
+        with tempfile.TemporaryDirectory(prefix="split-", dir=self.model_dir) as split_dir:
+            pipeline, stats, sample = train_out_of_core(data_path, make_preprocessor, split_dir)
+            # Latency and size are profiled on the first holdout rows; the AUC is the streamed one.
+            split = StreamingSplit.load(stats.pop("split"))
+            holdout = next(iter_inliers(split.test_path, split.bounds, 20_000), None)
+        # A bare StopIteration cannot cross the executor's Future and would hang the request.
+        if holdout is None:
+            raise ValueError(f"The holdout split of {data_path} has no inlier rows")
+        X_test, y_test = holdout
+        stats = {**stats, **profile(pipeline, X_test, y_test), "auc": stats["auc"], "candidate": MODEL_NAME}
+        rejected = (budget or Budget()).violations(stats)
+        if rejected:
+            raise ValueError(f"{MODEL_NAME} does not meet the budget ({', '.join(rejected)})")
+        current = self._current()
+        reference = None
+        if current is not None:
+            reference = {"candidate": f"serving {current.version}", **profile(current.pipeline, X_test, y_test)}
+
+        version = self._register(pipeline, {
+            "model": type(pipeline.named_steps["model"]).__name__,
+            "family": MODEL_NAME,
+            "candidate": MODEL_NAME,
+            "auc": stats["auc"],
+            "p99_ms": stats["p99_ms"],
+            "size_bytes": stats["size_bytes"],
+            "data_path": str(data_path),
+            "data_sha256": file_sha256(data_path),
+            "train_rows": stats["train_rows"],
+            "features": FEATURE_COLUMNS,
+        }, sample, promote)
+        TRAIN_SECONDS.observe(time.perf_counter() - start, MODEL_NAME)
+        return {
+            "version": version,
+            "model_path": str(self.registry.path(version) / "model.pkl"),
+            "promoted": promote,
+            "model": MODEL_NAME,
+            "candidate": MODEL_NAME,
+            "auc_score": stats["auc"],
+            "p99_ms": stats["p99_ms"],
+            "size_bytes": stats["size_bytes"],
+            "candidates": [{**stats, "accepted": True, "rejected_for": []}],
+            "reference": reference,
+            "classification_report": (f"accuracy {stats['accuracy']:.3f}, defect precision "
+                                      f"{stats['precision']:.3f}, recall {stats['recall']:.3f} "
+                                      f"on {stats['test_rows']:,} streamed holdout rows"),
+        }
+
     def get_temperature_curve_data(self) -> list:
         temps = np.linspace(60, 110, 20)
-        results = []
-        for temp in temps:
-            pred = self.predict(
-                temperature=float(temp),
-                line_speed=85.0,
-                shift="Day",
-                operator_experience=5.0,
-                machine_age=25.0
-            )
-            results.append({
-                "temperature": float(temp),
-                "defect_probability": pred["defect_probability"]
-            })
-        return results
+        defect_prob, _ = self._defect_proba({
+            "temperature": temps,
+            "line_speed": np.full(len(temps), 85.0),
+            "shift": np.full(len(temps), "Day", dtype=object),
+            "operator_experience": np.full(len(temps), 5.0),
+            "machine_age": np.full(len(temps), 25.0),
+        })
+        return [
+            {"temperature": t, "defect_probability": p}
+            for t, p in zip(temps.tolist(), defect_prob.tolist())
+        ]
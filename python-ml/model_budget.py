@@ -0,0 +1,119 @@
+"""Model families for training and the latency / size budget their candidates must meet.
+
+Every candidate of the requested family is fitted, then profiled on the
+holdout rows: ROC AUC, single-row `predict_proba` latency (the /predict path
+on the sklearn backend) and the size of the uncompressed joblib artifact the
+registry stores. Candidates over budget are rejected and the best remaining
+AUC wins.
+
+Candidates are factories, so importing this module does not pull in
+scikit-learn (the service's fast boot relies on that).
+"""
+import io
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional
+
+import joblib
+import numpy as np
+
+
+def _forest(**params):
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(random_state=42, **params)
+
+
+def _boosting(**params):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    return HistGradientBoostingClassifier(learning_rate=0.05, early_stopping=False, random_state=42, **params)
+
+
+MODEL_FAMILIES = {
+    # The original serving model.
+    "random_forest": {
+        "rf_300x12": partial(_forest, n_estimators=300, max_depth=12, min_samples_split=4, n_jobs=-1),
+    },
+    "hist_gradient_boosting": {
+        f"hgb_{iters}x{leaves}": partial(_boosting, max_iter=iters, max_leaf_nodes=leaves)
+        for iters, leaves in ((30, 7), (50, 7), (100, 7), (100, 15))
+    },
+    # Few shallow trees; also served by the compiled backend.
+    "compact_forest": {
+        f"rf_{trees}x{depth}": partial(_forest, n_estimators=trees, max_depth=depth, min_samples_leaf=10, n_jobs=1)
+        for trees, depth in ((20, 6), (50, 6), (50, 8))
+    },
+}
+
+
+@dataclass(frozen=True)
+class Budget:
+    """Per-candidate limits; None means unlimited."""
+    p99_ms: Optional[float] = None
+    max_bytes: Optional[int] = None
+
+    def violations(self, stats: dict) -> list:
+        out = []
+        if self.p99_ms is not None and stats["p99_ms"] > self.p99_ms:
+            out.append(f"p99 {stats['p99_ms']:.2f} ms > {self.p99_ms:g} ms")
+        if self.max_bytes is not None and stats["size_bytes"] > self.max_bytes:
+            out.append(f"size {stats['size_bytes']:,} B > {self.max_bytes:,} B")
+        return out
+
+
+def artifact_bytes(pipeline) -> int:
+    buffer = io.BytesIO()
+    joblib.dump(pipeline, buffer)
+    return buffer.tell()
+
+
+def profile(pipeline, X_test, y_test, repeats: int = 200) -> dict:
+    """Holdout AUC, single-row latency percentiles and artifact size of a fitted pipeline."""
+    from sklearn.metrics import roc_auc_score
+
+    auc = roc_auc_score(y_test, pipeline.predict_proba(X_test)[:, 1])
+    # Slice the rows up front so only predict_proba is timed.
+    rows = [X_test.iloc[[i % len(X_test)]] for i in range(repeats)]
+    pipeline.predict_proba(rows[0])
+    latencies = np.empty(repeats)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        pipeline.predict_proba(row)
+        latencies[i] = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies * 1000, [50, 99])
+    return {"auc": float(auc), "p50_ms": float(p50), "p99_ms": float(p99), "size_bytes": artifact_bytes(pipeline)}
+
+
+def fit_within_budget(model: str, make_preprocessor, X_train, y_train, X_test, y_test,
+                      budget: Budget = None, repeats: int = 200) -> tuple:
+    """Fit and profile every candidate of `model`; return (best pipeline within budget, its stats, all stats).
+
+    Raises ValueError if no candidate meets the budget.
+    """
+    from sklearn.pipeline import Pipeline
+
+    if model not in MODEL_FAMILIES:
+        raise ValueError(f"Unknown model {model!r}, expected one of {sorted(MODEL_FAMILIES)}")
+    budget = budget or Budget()
+    best, table = None, []
+    for name, make_estimator in MODEL_FAMILIES[model].items():
+        pipeline = Pipeline([("preprocess", make_preprocessor()), ("model", make_estimator())])
+        pipeline.fit(X_train, y_train)
+        stats = {"candidate": name, **profile(pipeline, X_test, y_test, repeats)}
+        rejected = budget.violations(stats)
+        table.append({**stats, "accepted": not rejected, "rejected_for": rejected})
+        if not rejected and (best is None or stats["auc"] > best[1]["auc"]):
+            best = (pipeline, stats)
+    if best is None:
+        reasons = "; ".join(f"{row['candidate']}: {', '.join(row['rejected_for'])}" for row in table)
+        raise ValueError(f"No {model} candidate meets the budget ({reasons})")
+    return best[0], best[1], table
+
+
+def format_table(rows: list) -> str:
+    lines = [f"{'candidate':>22} {'AUC':>6} {'p50 ms':>7} {'p99 ms':>7} {'size KiB':>9}  status"]
+    for row in rows:
+        status = "ok" if row.get("accepted", True) else "rejected: " + ", ".join(row["rejected_for"])
+        lines.append(f"{row['candidate']:>22} {row['auc']:>6.3f} {row['p50_ms']:>7.2f} {row['p99_ms']:>7.2f} "
+                     f"{row['size_bytes'] / 1024:>9,.0f}  {status}")
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+"""Versioned on-disk model store with atomic promote and rollback.
+
+Layout under `root`:
+
+    v0001/model.pkl        uncompressed joblib dump (memory-mappable arrays)
+    v0001/metadata.json    AUC, training-data hash, features, timestamp, ...
+    v0001/compiled/        optional CompiledForest arrays (.npy)
+    state.json             {"current": "v0002", "history": ["v0001", "v0002"]}
+
+New versions are written to a temporary directory and renamed into place, and
+state.json is replaced atomically, so readers never see a half-written model.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import joblib
+
+
+def file_sha256(path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, version: str) -> Path:
+        return self.root / version
+
+    def versions(self) -> list:
+        return sorted(p.name for p in self.root.glob("v*") if (p / "metadata.json").exists())
+
+    def metadata(self, version: str) -> dict:
+        return json.loads((self.path(version) / "metadata.json").read_text())
+
+    def _read_state(self) -> dict:
+        state_path = self.root / "state.json"
+        if not state_path.exists():
+            return {"current": None, "history": []}
+        return json.loads(state_path.read_text())
+
+    def _write_state(self, state: dict):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".state-")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(state, fh, indent=2)
+        os.replace(tmp, self.root / "state.json")
+
+    def current(self) -> Optional[str]:
+        return self._read_state()["current"]
+
+    def register(self, pipeline, metadata: dict) -> str:
+        """Persist a fitted pipeline as a new version; does not promote it."""
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=".staging-"))
+        # No compression: compressed pickles cannot be memory-mapped.
+        joblib.dump(pipeline, staging / "model.pkl")
+        while True:
+            existing = self.versions()
+            version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+            meta = {
+                "version": version,
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                **metadata,
+            }
+            (staging / "metadata.json").write_text(json.dumps(meta, indent=2))
+            try:
+                staging.rename(self.path(version))
+                return version
+            except OSError:
+                # Another process took this version number; try the next one.
+                if not self.path(version).exists():
+                    raise
+
+    def load(self, version: str, mmap_mode: Optional[str] = "r"):
+        return joblib.load(self.path(version) / "model.pkl", mmap_mode=mmap_mode)
+
+    def promote(self, version: str) -> str:
+        if version not in self.versions():
+            raise KeyError(f"Unknown model version {version!r}")
+        with self._lock:
+            state = self._read_state()
+            history = [v for v in state["history"] if v != version] + [version]
+            self._write_state({"current": version, "history": history})
+        return version
+
+    def rollback(self) -> str:
+        """Re-promote the version that was serving before the current one."""
+        with self._lock:
+            state = self._read_state()
+            history = state["history"]
+            if len(history) < 2:
+                raise ValueError("No previous model version to roll back to")
+            history = history[:-1]
+            self._write_state({"current": history[-1], "history": history})
+            return history[-1]
@@ -0,0 +1,266 @@
+"""Training on production history larger than memory.
+
+Everything is streamed in chunks of `chunk_rows`; no pass holds more than
+one chunk plus fixed-size statistics.
+
+1. `write_split` reads the CSV / Parquet source once. It hashes every row
+   (or a key column) into a deterministic train/test split, appends the two
+   sides to Parquet files and feeds the IQR sketches from outliers.py.
+2. `PreprocessStats` accumulates, over the train inliers, the numeric
+   medians (t-digest), mean / variance (StandardScaler.partial_fit) and
+   shift counts, and turns them into the usual fitted ColumnTransformer.
+3. `fit_bagged_forest` grows a few trees per train chunk, each on a
+   bootstrap of at most `max_samples` rows of that chunk, and joins them
+   into one RandomForestClassifier, so serving (and the compiled backend)
+   sees an ordinary forest.
+4. `evaluate` scores the test side chunk by chunk; AUC comes from binned
+   score histograms, so memory stays constant however large the holdout.
+"""
+import json
+import resource
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from feature_schema import CATEGORICAL_FEATURE, FEATURE_COLUMNS, NUMERIC_FEATURES, TARGET
+from outliers import QuantileSketch, iqr_mask, sketch_iqr_bounds
+
+MODEL_NAME = "streaming_forest"
+CHUNK_ROWS = 1_000_000
+SPLIT_BUCKETS = 10_000
+AUC_BINS = 10_000
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def iter_chunks(path, chunk_rows: int = CHUNK_ROWS, columns=None):
+    """DataFrames of up to `chunk_rows` rows from a CSV or Parquet file."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        # Pre-buffering keeps a few MiB per row group read for the life of the reader; without it memory is flat.
+        for batch in pq.ParquetFile(path, pre_buffer=False).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        dtypes = {col: np.float64 for col in NUMERIC_FEATURES}
+        yield from pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows)
+
+
+def holdout_mask(chunk: pd.DataFrame, test_fraction: float = 0.2, key: str = None, seed: int = 42) -> np.ndarray:
+    """True for rows in the test split.
+
+    The split depends only on the row's content (or its `key` column), never
+    on its position, so it is the same for any chunking or file order.
+    """
+    values = chunk[key] if key else chunk
+    hashes = pd.util.hash_pandas_object(values, index=False, hash_key=f"{seed:016d}")
+    return (hashes.to_numpy() % SPLIT_BUCKETS) < int(test_fraction * SPLIT_BUCKETS)
+
+
+@dataclass
+class StreamingSplit:
+    train_path: str
+    test_path: str
+    train_rows: int
+    test_rows: int
+    # Per numeric feature IQR whiskers over the whole source, as remove_outliers_iqr uses.
+    lower: list
+    upper: list
+    source: str = ""
+
+    @property
+    def bounds(self) -> tuple:
+        return np.asarray(self.lower), np.asarray(self.upper)
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps(asdict(self), indent=2))
+        return path
+
+    @classmethod
+    def load(cls, path) -> "StreamingSplit":
+        return cls(**json.loads(Path(path).read_text()))
+
+
+def write_split(path, out_dir, chunk_rows: int = CHUNK_ROWS, test_fraction: float = 0.2, key: str = None,
+                whisker_width: float = 1.5) -> StreamingSplit:
+    """One pass over `path`: hash split into out_dir/{train,test}.parquet and sketch the IQR bounds."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {"train": out_dir / "train.parquet", "test": out_dir / "test.parquet"}
+    writers, rows = {}, {"train": 0, "test": 0}
+    sketches = [QuantileSketch() for _ in NUMERIC_FEATURES]
+    try:
+        for chunk in iter_chunks(path, chunk_rows, FEATURE_COLUMNS + [TARGET] + ([key] if key else [])):
+            values = chunk[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+            for j, sketch in enumerate(sketches):
+                sketch.update(values[:, j])
+            is_test = holdout_mask(chunk, test_fraction, key)
+            for side, mask in (("train", ~is_test), ("test", is_test)):
+                table = pa.Table.from_pandas(chunk[mask], preserve_index=False)
+                if side not in writers:
+                    writers[side] = pq.ParquetWriter(paths[side], table.schema)
+                writers[side].write_table(table.cast(writers[side].schema))
+                rows[side] += int(mask.sum())
+    finally:
+        for writer in writers.values():
+            writer.close()
+    lower, upper = sketch_iqr_bounds(sketches, whisker_width)
+    split = StreamingSplit(str(paths["train"]), str(paths["test"]), rows["train"], rows["test"],
+                           lower.tolist(), upper.tolist(), str(path))
+    split.save(out_dir / "split.json")
+    return split
+
+
+def iter_inliers(path, bounds: tuple, chunk_rows: int = CHUNK_ROWS):
+    """(features, target) chunks of a split file with the IQR outliers dropped."""
+    for chunk in iter_chunks(path, chunk_rows):
+        chunk = chunk[iqr_mask(chunk, NUMERIC_FEATURES, bounds=bounds)]
+        if len(chunk):
+            yield chunk[FEATURE_COLUMNS], chunk[TARGET].to_numpy()
+
+
+class PreprocessStats:
+    """What the preprocessor's fit would learn, accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.medians = [QuantileSketch() for _ in NUMERIC_FEATURES]
+        # partial_fit ignores NaN, like the imputer it stands in for. The IQR filter
+        # already drops rows with a missing numeric value, so no imputed values are missed.
+        self.scaler = StandardScaler()
+        self.shifts = pd.Series(dtype=np.int64)
+
+    def update(self, X: pd.DataFrame) -> None:
+        values = X[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+        for j, sketch in enumerate(self.medians):
+            sketch.update(values[:, j])
+        self.scaler.partial_fit(values)
+        self.shifts = self.shifts.add(X[CATEGORICAL_FEATURE].value_counts(), fill_value=0)
+
+    def fitted(self, make_preprocessor):
+        """A ColumnTransformer from `make_preprocessor()` carrying the streamed statistics.
+
+        It is fitted on one row per shift category, which sets up the encoder
+        and the transformer structure, and the numeric imputer / scaler and
+        the shift imputer then take the streamed values.
+        """
+        medians = np.array([sketch.quantile(0.5) for sketch in self.medians])
+        categories = sorted(self.shifts.index)
+        seed = pd.DataFrame(dict(zip(NUMERIC_FEATURES, medians))
+                            | {CATEGORICAL_FEATURE: categories}, index=range(len(categories)))
+        preprocessor = make_preprocessor().fit(seed[FEATURE_COLUMNS])
+        numeric = preprocessor.named_transformers_["num"].named_steps
+        numeric["imputer"].statistics_ = medians
+        scaler = numeric["scaler"]
+        for attr in ("mean_", "var_", "scale_", "n_samples_seen_"):
+            setattr(scaler, attr, getattr(self.scaler, attr))
+        categorical = preprocessor.named_transformers_["cat"].named_steps
+        categorical["imputer"].statistics_ = np.array([self.shifts.idxmax()], dtype=object)
+        return preprocessor
+
+
+def fit_bagged_forest(split: StreamingSplit, preprocessor, chunk_rows: int = CHUNK_ROWS,
+                      n_estimators: int = 300, max_depth: int = 12, max_samples: int = 200_000,
+                      seed: int = 42) -> RandomForestClassifier:
+    """One forest of `n_estimators` trees spread evenly over the train chunks."""
+    chunks = max(1, -(-split.train_rows // chunk_rows))
+    forest, trees = None, []
+    for i, (X, y) in enumerate(iter_inliers(split.train_path, split.bounds, chunk_rows)):
+        count = n_estimators * (i + 1) // chunks - n_estimators * i // chunks
+        if count == 0 or len(np.unique(y)) < 2:
+            continue
+        part = RandomForestClassifier(
+            n_estimators=count, max_depth=max_depth, min_samples_split=4,
+            max_samples=min(max_samples, len(y)), random_state=seed + i, n_jobs=-1,
+        ).fit(preprocessor.transform(X), y)
+        trees.extend(part.estimators_)
+        forest = forest or part
+    if forest is None:
+        raise ValueError(f"No train chunk of {split.train_path} has both classes")
+    forest.estimators_ = trees
+    forest.n_estimators = len(trees)
+    return forest
+
+
+def binned_auc(positives: np.ndarray, negatives: np.ndarray) -> float:
+    """ROC AUC from per-bin score counts; scores within one bin count as ties."""
+    negatives_below = np.cumsum(negatives) - negatives
+    pairs = positives.sum() * negatives.sum()
+    return float((positives * (negatives_below + 0.5 * negatives)).sum() / pairs) if pairs else float("nan")
+
+
+def evaluate(pipeline, split: StreamingSplit, chunk_rows: int = CHUNK_ROWS) -> dict:
+    """Holdout AUC and confusion counts at 0.5, streamed over the test split."""
+    positives = np.zeros(AUC_BINS, np.int64)
+    negatives = np.zeros(AUC_BINS, np.int64)
+    confusion = np.zeros((2, 2), np.int64)
+    for X, y in iter_inliers(split.test_path, split.bounds, chunk_rows):
+        proba = pipeline.predict_proba(X)[:, 1]
+        bins = np.minimum((proba * AUC_BINS).astype(np.int64), AUC_BINS - 1)
+        positives += np.bincount(bins[y == 1], minlength=AUC_BINS)
+        negatives += np.bincount(bins[y == 0], minlength=AUC_BINS)
+        np.add.at(confusion, (y.astype(np.int64), (proba >= 0.5).astype(np.int64)), 1)
+    (tn, fp), (fn, tp) = confusion
+    total = int(confusion.sum())
+    return {
+        "auc": binned_auc(positives, negatives),
+        "test_rows": total,
+        "accuracy": float((tn + tp) / total) if total else float("nan"),
+        "precision": float(tp / (tp + fp)) if tp + fp else 0.0,
+        "recall": float(tp / (tp + fn)) if tp + fn else 0.0,
+        "confusion": confusion.tolist(),
+    }
+
+
+def train_out_of_core(path, make_preprocessor, out_dir, chunk_rows: int = CHUNK_ROWS,
+                      test_fraction: float = 0.2, key: str = None, n_estimators: int = 300,
+                      max_samples: int = 200_000) -> tuple:
+    """Split, fit and evaluate a bagged forest on `path` in bounded memory.
+
+    Returns (fitted pipeline, stats, a sample of train rows). Stats hold the
+    holdout metrics, row counts, per-phase wall time and the process's peak RSS.
+    """
+    timings = {}
+    start = time.perf_counter()
+    split = write_split(path, out_dir, chunk_rows, test_fraction, key)
+    timings["split_s"] = time.perf_counter() - start
+
+    phase = time.perf_counter()
+    stats, sample, train_inliers = PreprocessStats(), None, 0
+    for X, _ in iter_inliers(split.train_path, split.bounds, chunk_rows):
+        stats.update(X)
+        train_inliers += len(X)
+        sample = X if sample is None else sample
+    if sample is None:
+        raise ValueError(f"No training rows left in {path} after the split and outlier filter")
+    preprocessor = stats.fitted(make_preprocessor)
+    timings["preprocess_s"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    forest = fit_bagged_forest(split, preprocessor, chunk_rows, n_estimators, max_samples=max_samples)
+    pipeline = Pipeline([("preprocess", preprocessor), ("model", forest)])
+    timings["fit_s"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    metrics = evaluate(pipeline, split, chunk_rows)
+    timings["evaluate_s"] = time.perf_counter() - phase
+    timings["wall_s"] = time.perf_counter() - start
+    return pipeline, {
+        **metrics,
+        "source_rows": split.train_rows + split.test_rows,
+        "train_rows": train_inliers,
+        "trees": forest.n_estimators,
+        "split": str(Path(out_dir) / "split.json"),
+        **timings,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }, sample
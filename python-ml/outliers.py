@@ -0,0 +1,134 @@
+"""IQR outlier filtering shared by training (ml_service, ai-process-optimization) and analysis.
+
+`remove_outliers_iqr` takes the quartiles of all numeric columns in one
+`np.quantile` call over a 2-D array and drops every row outside any column's
+whisker with a single combined mask. `sequential=True` keeps the historical
+behaviour where each column's quartiles are taken on the rows that survived
+the previous columns.
+
+For data larger than memory, `streaming_iqr_bounds` builds per-column
+`QuantileSketch`es (a merging t-digest) over chunks, and the returned bounds
+can then be applied chunk by chunk with `iqr_mask(chunk, cols, bounds=...)`.
+"""
+import numpy as np
+import pandas as pd
+
+QUARTILES = [0.25, 0.75]
+
+
+def _whiskers(q1: np.ndarray, q3: np.ndarray, whisker_width: float) -> tuple[np.ndarray, np.ndarray]:
+    iqr = q3 - q1
+    return q1 - whisker_width * iqr, q3 + whisker_width * iqr
+
+
+def _quartiles(values: np.ndarray) -> np.ndarray:
+    # pandas' quantile skips NaN; nanquantile is only needed (and slower) when there are any.
+    quantile = np.nanquantile if np.isnan(values).any() else np.quantile
+    return quantile(values, QUARTILES, axis=0)
+
+
+def iqr_bounds(df: pd.DataFrame, numeric_cols, whisker_width: float = 1.5) -> tuple[np.ndarray, np.ndarray]:
+    """Per-column (lower, upper) whiskers from one quantile pass over all columns."""
+    q1, q3 = _quartiles(df[list(numeric_cols)].to_numpy(dtype=np.float64))
+    return _whiskers(q1, q3, whisker_width)
+
+
+def iqr_mask(df: pd.DataFrame, numeric_cols, whisker_width: float = 1.5, sequential: bool = False,
+             bounds: tuple = None) -> np.ndarray:
+    """Boolean mask of the rows inside every column's whisker (NaN counts as outside).
+
+    `bounds` skips the quantile pass, e.g. for bounds from streaming_iqr_bounds.
+    """
+    values = df[list(numeric_cols)].to_numpy(dtype=np.float64)
+    if sequential:
+        keep = np.ones(len(values), dtype=bool)
+        for j in range(values.shape[1]):
+            column = values[keep, j]
+            lower, upper = _whiskers(*_quartiles(column), whisker_width)
+            keep[keep] = (column >= lower) & (column <= upper)
+        return keep
+    lower, upper = bounds if bounds is not None else _whiskers(*_quartiles(values), whisker_width)
+    with np.errstate(invalid="ignore"):
+        return ((values >= lower) & (values <= upper)).all(axis=1)
+
+
+def remove_outliers_iqr(df: pd.DataFrame, numeric_cols, whisker_width: float = 1.5,
+                        sequential: bool = False, bounds: tuple = None) -> pd.DataFrame:
+    """Remove rows with numeric values outside an IQR-based whisker."""
+    return df[iqr_mask(df, numeric_cols, whisker_width, sequential, bounds)].reset_index(drop=True)
+
+
+class QuantileSketch:
+    """Mergeable approximate quantiles in bounded memory (merging t-digest).
+
+    Values are kept as weighted centroids whose size follows the arcsine
+    scale function, so centroids are small near the tails and at most about
+    `compression / 2` of them exist. Updates are vectorized: the new values
+    are sorted together with the current centroids and re-clustered in one
+    pass.
+    """
+
+    def __init__(self, compression: float = 1000.0):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cum = np.cumsum(weights)
+        q_left = (cum - weights) / cum[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        weight = np.bincount(cluster, weights)
+        used = weight > 0
+        self.weights = weight[used]
+        self.means = np.bincount(cluster, weights * means)[used] / self.weights
+
+    def update(self, values) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.min, self.max = min(self.min, values.min()), max(self.max, values.max())
+            self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if len(other.weights):
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def quantile(self, q) -> np.ndarray:
+        if not len(self.weights):
+            return np.full(np.shape(q), np.nan)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        # Pin both ends to the exact extremes; interpolate between centroid centres inside.
+        xs = np.concatenate([[0.0], centers, [total]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q) * total, xs, ys)
+
+
+def streaming_iqr_bounds(chunks, numeric_cols, whisker_width: float = 1.5,
+                         compression: float = 1000.0) -> tuple[np.ndarray, np.ndarray]:
+    """Approximate iqr_bounds over an iterable of DataFrame chunks, one pass, bounded memory."""
+    numeric_cols = list(numeric_cols)
+    sketches = [QuantileSketch(compression) for _ in numeric_cols]
+    for chunk in chunks:
+        values = chunk[numeric_cols].to_numpy(dtype=np.float64)
+        for j, sketch in enumerate(sketches):
+            sketch.update(values[:, j])
+    return sketch_iqr_bounds(sketches, whisker_width)
+
+
+def sketch_iqr_bounds(sketches, whisker_width: float = 1.5) -> tuple[np.ndarray, np.ndarray]:
+    """Per-column (lower, upper) whiskers from one QuantileSketch per column."""
+    q1, q3 = np.array([sketch.quantile(QUARTILES) for sketch in sketches]).T
+    return _whiskers(q1, q3, whisker_width)
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from ml_service import FEATURE_COLUMNS
+
+
+def parse_quantization(spec: str) -> dict:
+    """Parse "temperature=0.1,line_speed=0.5" into {"temperature": 0.1, ...}."""
+    steps = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, step = part.partition("=")
+        if name not in FEATURE_COLUMNS or name == "shift":
+            raise ValueError(f"Cannot quantize {name!r}")
+        steps[name] = float(step)
+    return steps
+
+
+class PredictionCache:
+    """Bounded LRU cache of prediction results with a TTL.
+
+    Keys are feature tuples; numeric features listed in `quantization` are
+    bucketed to the given step first, so near-identical sensor readings share
+    one entry. Entries belong to one model version and are dropped as soon as
+    a lookup arrives for a different version.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: float = 300.0, quantization: dict = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.quantization = quantization or {}
+        self.version: Optional[str] = None
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def keys(self, columns) -> list:
+        parts = []
+        for col in FEATURE_COLUMNS:
+            values = np.asarray(columns[col])
+            step = self.quantization.get(col)
+            if step:
+                values = np.round(values.astype(np.float64) / step).astype(np.int64)
+            parts.append(values.tolist())
+        return list(zip(*parts))
+
+    def lookup(self, columns, version) -> tuple:
+        """Return (keys, results with None for misses, indices of the misses)."""
+        keys = self.keys(columns)
+        results = [None] * len(keys)
+        miss = []
+        now = time.monotonic()
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    miss.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    results[i] = entry[1]
+            self.hits += len(keys) - len(miss)
+            self.misses += len(miss)
+        return keys, results, miss
+
+    def fill(self, keys: list, results: list, miss: list, scored: list, version) -> list:
+        """Store freshly scored results for the missed rows and return the full list.
+
+        `version` is the model that scored them. If the cache has moved on to
+        another version since the lookup, they are returned but not stored.
+        """
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            store = version == self.version
+            for i, result in zip(miss, scored):
+                results[i] = result
+                if store:
+                    self._entries[keys[i]] = (expires_at, result)
+                    self._entries.move_to_end(keys[i])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "quantization": self.quantization,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
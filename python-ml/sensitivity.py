@@ -0,0 +1,173 @@
+"""What-if surfaces and per-feature curves around a baseline operating point.
+
+A request names up to a few features to sweep (`axes`); every other feature
+stays at the baseline. The full grid is built as column arrays in one go,
+scored in fixed-size chunks through the serving model, and the resulting
+probability array is cached per model version, so repeated or shared views
+cost nothing after the first request.
+"""
+import dataclasses
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ml_service import FEATURE_COLUMNS, MLService
+
+DEFAULT_BASELINE = {
+    "temperature": 85.0,
+    "line_speed": 85.0,
+    "shift": "Day",
+    "operator_experience": 5.0,
+    "machine_age": 25.0,
+}
+# Sweep range when an axis gives neither values nor start/stop.
+FEATURE_RANGES = {
+    "temperature": (60.0, 110.0),
+    "line_speed": (60.0, 120.0),
+    "operator_experience": (0.0, 20.0),
+    "machine_age": (0.0, 120.0),
+}
+SHIFTS = ["Day", "Night"]
+MAX_POINTS = 1_000_000
+CHUNK_ROWS = 65_536
+
+
+def axis_values(feature: str, values=None, start: float = None, stop: float = None, steps: int = 50) -> np.ndarray:
+    if feature not in FEATURE_COLUMNS:
+        raise ValueError(f"Unknown feature {feature!r}, expected one of {FEATURE_COLUMNS}")
+    if feature == "shift":
+        return np.asarray(values or SHIFTS, dtype=object)
+    if values is not None:
+        return np.asarray(values, dtype=np.float64)
+    if not 1 <= steps <= MAX_POINTS:
+        raise ValueError(f"steps must be between 1 and {MAX_POINTS:,}")
+    low, high = FEATURE_RANGES[feature]
+    return np.linspace(low if start is None else start, high if stop is None else stop, steps)
+
+
+def baseline_columns(baseline: dict, n: int) -> dict:
+    return {col: np.full(n, baseline[col], dtype=object if col == "shift" else np.float64) for col in FEATURE_COLUMNS}
+
+
+def build_grid(axes: list, baseline: dict) -> tuple:
+    """Columns for every point of the axes' cartesian product (first axis slowest), and the grid shape."""
+    shape = tuple(len(values) for _, values in axes)
+    n = int(np.prod(shape))
+    if n > MAX_POINTS:
+        raise ValueError(f"Grid of {n:,} points exceeds the limit of {MAX_POINTS:,}")
+    index = np.indices(shape).reshape(len(shape), n)
+    columns = baseline_columns(baseline, n)
+    for (feature, values), idx in zip(axes, index):
+        columns[feature] = values[idx]
+    return columns, shape
+
+
+class SensitivityEngine:
+    """Scores what-if grids on an MLService and keeps the last `max_surfaces` results per model version."""
+
+    def __init__(self, service: MLService, max_surfaces: int = 64, chunk_rows: int = CHUNK_ROWS):
+        self.service = service
+        self.max_surfaces = max_surfaces
+        self.chunk_rows = chunk_rows
+        self._surfaces: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _baseline(self, baseline: dict = None) -> dict:
+        unknown = set(baseline or {}) - set(FEATURE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown baseline features {sorted(unknown)}")
+        return {**DEFAULT_BASELINE, **(baseline or {})}
+
+    def _score(self, columns: dict, n: int, serving) -> np.ndarray:
+        if serving is not None and serving.compiled is not None:
+            # The compiled forest is built for single-row latency; on large grids sklearn's
+            # tree traversal is several times faster, and the two agree exactly.
+            serving = dataclasses.replace(serving, compiled=None)
+        out = np.empty(n)
+        for start in range(0, n, self.chunk_rows):
+            chunk = {col: values[start:start + self.chunk_rows] for col, values in columns.items()}
+            out[start:start + self.chunk_rows] = self.service._defect_proba(chunk, serving)[0]
+        return out
+
+    def _cached(self, key: tuple, compute):
+        with self._lock:
+            if key in self._surfaces:
+                self._surfaces.move_to_end(key)
+                self.hits += 1
+                return self._surfaces[key]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._surfaces[key] = value
+            while len(self._surfaces) > self.max_surfaces:
+                self._surfaces.popitem(last=False)
+        return value
+
+    def surface(self, axes: list, baseline: dict = None) -> dict:
+        """Defect probability over the grid of `axes` ({feature, values | start, stop, steps}) around `baseline`.
+
+        `defect_probability` has the grid's shape, one dimension per axis.
+        """
+        if not axes:
+            raise ValueError("At least one axis is required")
+        baseline = self._baseline(baseline)
+        axes = [(axis["feature"], axis_values(**axis)) for axis in axes]
+        if len({feature for feature, _ in axes}) < len(axes):
+            raise ValueError("Each feature can be swept on one axis only")
+        # One snapshot for the whole grid, so a promote mid-request cannot mix models.
+        serving = self.service._current()
+        version = serving.version if serving else None
+        key = (version, json.dumps([baseline, [(f, v.tolist()) for f, v in axes]], sort_keys=True))
+
+        def compute():
+            columns, shape = build_grid(axes, baseline)
+            return self._score(columns, len(columns["temperature"]), serving).reshape(shape)
+
+        return {
+            "version": version,
+            "baseline": baseline,
+            "axes": [{"feature": feature, "values": values.tolist()} for feature, values in axes],
+            "defect_probability": self._cached(key, compute),
+        }
+
+    def curves(self, baseline: dict = None, steps: int = 50) -> dict:
+        """One-feature sweeps of every feature around `baseline`, scored as a single grid."""
+        baseline = self._baseline(baseline)
+        serving = self.service._current()
+        version = serving.version if serving else None
+        axes = {col: axis_values(col, steps=steps) for col in FEATURE_COLUMNS}
+        key = (version, json.dumps([baseline, "curves", steps], sort_keys=True))
+
+        def compute():
+            # Stack the sweeps: each block varies one feature, the rest stay at the baseline.
+            n = sum(len(values) for values in axes.values())
+            columns = baseline_columns(baseline, n)
+            start = 0
+            for col, values in axes.items():
+                columns[col][start:start + len(values)] = values
+                start += len(values)
+            return self._score(columns, n, serving)
+
+        proba = self._cached(key, compute)
+        out, start = [], 0
+        for col, values in axes.items():
+            out.append({"feature": col, "values": values.tolist(),
+                        "defect_probability": proba[start:start + len(values)].tolist()})
+            start += len(values)
+        return {"version": version, "baseline": baseline, "curves": out}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"surfaces": len(self._surfaces), "hits": self.hits, "misses": self.misses}
+
+
+def iter_ndjson(surface: dict):
+    """Stream a surface as NDJSON: a header line, then one line per slice along the first axis."""
+    proba = surface["defect_probability"]
+    yield json.dumps({key: value for key, value in surface.items() if key != "defect_probability"}) + "\n"
+    for i, row in enumerate(proba if proba.ndim > 1 else [proba]):
+        yield json.dumps({"index": i, "defect_probability": row.tolist()}) + "\n"
@@ -0,0 +1,82 @@
+"""Parity of the three serving paths: the sklearn pipeline, FastTransform and CompiledForest.
+
+Run with `pytest python-ml`. The rows mix in what real requests carry: None
+and NaN shifts, an unknown shift, missing numerics and out-of-range readings.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+
+from compiled_forest import CompiledForest
+from feature_schema import FEATURE_COLUMNS, NUMERIC_FEATURES, FastTransform, make_preprocessor, pipeline_frame
+
+
+def _rows(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "temperature": rng.normal(82, 8, n).round(2),
+        "line_speed": rng.normal(85, 10, n).round(2),
+        "shift": rng.choice(["Day", "Night"], n).astype(object),
+        "operator_experience": rng.uniform(0, 20, n).round(1),
+        "machine_age": rng.uniform(0, 120, n).round(1),
+    })
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    X = _rows(2000, seed=0)
+    # Night shifts with hot lines are defective, plus noise, so the trees split on every feature.
+    y = ((X["temperature"] > 85) & (X["shift"] == "Night")) | (np.random.default_rng(1).random(len(X)) < 0.1)
+    X.loc[X.index[:50], "temperature"] = np.nan
+    return Pipeline([
+        ("preprocess", make_preprocessor()),
+        ("model", RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0)),
+    ]).fit(X[FEATURE_COLUMNS], y.astype(int))
+
+
+def _edge_columns() -> dict:
+    df = _rows(12, seed=2)
+    df.loc[1, "temperature"] = np.nan
+    df.loc[2, "line_speed"] = np.nan
+    df.loc[3, "temperature"] = 1000.0
+    df.loc[4, "machine_age"] = -50.0
+    shift = df["shift"].to_numpy()
+    shift[5], shift[6], shift[7], shift[8] = None, np.nan, "Weekend", ""
+    return {col: (shift if col == "shift" else df[col].to_numpy()) for col in FEATURE_COLUMNS}
+
+
+def test_fast_transform_matches_the_pipeline(pipeline):
+    columns = _edge_columns()
+    preprocessor = pipeline.named_steps["preprocess"]
+    expected = preprocessor.transform(pipeline_frame(columns))
+    fast = FastTransform.from_preprocessor(preprocessor)
+    assert np.array_equal(fast.transform(columns), expected)
+    assert np.array_equal(fast.transform(columns, dtype=np.float32), expected.astype(np.float32))
+    for i in range(len(expected)):
+        single = {col: values[i:i + 1] for col, values in columns.items()}
+        assert np.array_equal(fast.transform(single), expected[i:i + 1]), i
+
+
+def test_none_and_nan_shifts_are_imputed(pipeline):
+    columns = _edge_columns()
+    fast = FastTransform.from_preprocessor(pipeline.named_steps["preprocess"])
+    X = fast.transform(columns)
+    filled = {**columns, "shift": np.where([s is None or s != s for s in columns["shift"]], fast.shift_fill,
+                                           columns["shift"])}
+    assert np.array_equal(X, fast.transform(filled))
+    # An unknown shift is not imputed: it one-hot encodes to all zeros.
+    assert not X[7, len(NUMERIC_FEATURES):].any()
+
+
+@pytest.mark.parametrize("as_frame", [False, True])
+def test_probabilities_agree_on_every_path(pipeline, as_frame):
+    columns = _edge_columns()
+    # A DataFrame with an object shift column keeps None, unlike one built by newer pandas from a dict.
+    data = pd.DataFrame({col: pd.Series(values, dtype=object if col == "shift" else None)
+                         for col, values in columns.items()}) if as_frame else columns
+    expected = pipeline.predict_proba(pipeline_frame(data))
+    fast = FastTransform.from_preprocessor(pipeline.named_steps["preprocess"])
+    assert np.array_equal(pipeline.named_steps["model"].predict_proba(fast.transform(columns)), expected)
+    assert np.array_equal(CompiledForest.from_pipeline(pipeline).predict_proba(columns), expected)